@@ -0,0 +1,258 @@
+"""Alertas del administrador y lo que cada usuario ya leyó.
+
+``IndiceAlertas`` ordena las alertas de cada audiencia ('todos', 'usuarios',
+'empleadores') por fecha de envío y lleva cuántas hay en cada una.
+
+Lo leído no se guarda dentro de la alerta (la vieja lista ``leida_por``) sino en la
+colección ``alertas_leidas``, un registro por usuario con:
+
+- ``hasta_fecha``/``hasta_id``: marca de "descartar todas"; todo lo enviado hasta
+  ahí está leído.
+- ``leidas``: ids de las alertas posteriores a la marca que se leyeron una por una.
+
+Así las no leídas de un usuario se obtienen recorriendo solo las alertas posteriores
+a su marca, no todas las alertas con todos sus lectores; y cuántas son sale del tamaño
+de cada audiencia después de la marca, descontando solo las leídas una por una.
+
+La fecha de expiración se interpreta una sola vez, al indexar la alerta. Las consultas
+ya no devuelven alertas vencidas y ``ProgramadorVencimientos`` las elimina en segundo
+plano a su hora, así que ninguna petición revisa ni borra alertas.
+"""
+import heapq
+import sys
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from itertools import islice
+
+from almacenamiento import IndiceDerivado
+
+# Audiencias que ve cada tipo de cuenta
+AUDIENCIAS = {
+    'usuario': ('todos', 'usuarios'),
+    'empleador': ('todos', 'empleadores'),
+}
+
+def clave_alerta(alerta):
+    """Posición de la alerta: (fecha de envío, id)"""
+    return (alerta.get('fecha_envio') or '', alerta['id'])
+
+def estado_lectura(lectura):
+    """(marca, ids leídos después de la marca) de un registro de ``alertas_leidas`` (o None)"""
+    if not lectura:
+        return None, set()
+    marca = (lectura['hasta_fecha'], lectura['hasta_id']) if lectura.get('hasta_id') else None
+    return marca, set(lectura.get('leidas', ()))
+
+def vencimiento(alerta):
+    """Momento (como time.time()) en que vence la alerta; None si no vence o la fecha no se entiende"""
+    if not alerta.get('fecha_expiracion'):
+        return None
+    try:
+        return datetime.fromisoformat(alerta['fecha_expiracion']).timestamp()
+    except ValueError:
+        return None
+
+class ProgramadorVencimientos:
+    """Hilo en segundo plano que llama a ``vencer(id)`` cuando llega la hora de cada id.
+
+    Los vencimientos están en un heap con el más próximo arriba. Cambiar o cancelar uno
+    no lo busca dentro del heap: la entrada vieja se descarta cuando llega arriba.
+    Si se indica ``sincronizar``, se llama al menos cada ``ESPERA_MAXIMA`` segundos para
+    recibir lo que programaron otros procesos."""
+
+    ESPERA_MAXIMA = 60
+    REINTENTO = 60
+
+    def __init__(self, vencer, sincronizar=None):
+        self.vencer = vencer
+        self.sincronizar = sincronizar
+        self._condicion = threading.Condition()
+        self._heap = []       # [(momento, id)]
+        self._momentos = {}   # id -> momento vigente; las entradas del heap que no coinciden están de más
+        self._hilo = None
+
+    def programar(self, id_registro, momento):
+        """Programar (o con ``momento`` None, cancelar) el vencimiento de ``id_registro``"""
+        with self._condicion:
+            if momento is None:
+                self._momentos.pop(id_registro, None)
+                return
+            self._momentos[id_registro] = momento
+            heapq.heappush(self._heap, (momento, id_registro))
+            if self._heap[0] == (momento, id_registro):
+                self._condicion.notify()  # Es el próximo: el hilo tiene que despertar antes
+
+    def reiniciar(self, momentos):
+        """Reemplazar todos los vencimientos por ``{id: momento}`` y arrancar el hilo si hace falta"""
+        with self._condicion:
+            self._momentos = dict(momentos)
+            self._heap = [(momento, id_registro) for id_registro, momento in self._momentos.items()]
+            heapq.heapify(self._heap)
+            self._condicion.notify()
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._ejecutar, name='vencimientos', daemon=True)
+                self._hilo.start()
+
+    def _siguiente(self):
+        """Esperar al próximo vencimiento y devolver su id (None si toca sincronizar)"""
+        with self._condicion:
+            limite = time.time() + self.ESPERA_MAXIMA
+            while True:
+                while self._heap and self._momentos.get(self._heap[0][1]) != self._heap[0][0]:
+                    heapq.heappop(self._heap)
+                ahora = time.time()
+                if self._heap and self._heap[0][0] <= ahora:
+                    momento, id_registro = heapq.heappop(self._heap)
+                    del self._momentos[id_registro]
+                    return id_registro
+                if ahora >= limite:
+                    return None
+                self._condicion.wait(min(self._heap[0][0] if self._heap else limite, limite) - ahora)
+
+    def _ejecutar(self):
+        while True:
+            id_registro = self._siguiente()
+            try:
+                if id_registro is None:
+                    if self.sincronizar:
+                        self.sincronizar()
+                else:
+                    self.vencer(id_registro)
+            except Exception as e:
+                print(f"⚠️ Error en vencimientos ({id_registro}): {e}")
+                if id_registro is not None:
+                    self.programar(id_registro, time.time() + self.REINTENTO)
+
+class IndiceAlertas(IndiceDerivado):
+    """Alertas por audiencia, ordenadas por fecha de envío. Con ``programador``,
+    cada alerta con fecha de expiración queda programada para vencer."""
+
+    coleccion = 'alertas'
+
+    def __init__(self, programador=None):
+        super().__init__()
+        self.programador = programador
+        self.vencimientos = {}  # id -> momento en que vence
+        self.por_vencimiento = []  # [(momento, id)] ordenada
+        self.registros = {}     # id -> alerta tal como se indexó
+        self.por_audiencia = {}  # destinatario -> [(fecha_envio, id)] ordenada
+        self.lectores_previos = {}  # id -> {user_id} de la lista leida_por de alertas antiguas
+        self.leidas_previas = {}    # user_id -> {id}, lo mismo al revés
+
+    def _agregar(self, alerta, ordenar=True):
+        self.registros[alerta['id']] = alerta
+        lista = self.por_audiencia.setdefault(alerta.get('destinatario'), [])
+        if ordenar:
+            insort(lista, clave_alerta(alerta))
+        else:
+            lista.append(clave_alerta(alerta))
+        if alerta.get('leida_por'):
+            self.lectores_previos[alerta['id']] = set(alerta['leida_por'])
+            for user_id in alerta['leida_por']:
+                self.leidas_previas.setdefault(user_id, set()).add(alerta['id'])
+        momento = vencimiento(alerta)
+        if momento is not None:
+            self.vencimientos[alerta['id']] = momento
+            if ordenar:
+                insort(self.por_vencimiento, (momento, alerta['id']))
+            else:
+                self.por_vencimiento.append((momento, alerta['id']))
+            if self.programador and ordenar:
+                # En una reconstrucción se programan todas juntas al final
+                self.programador.programar(alerta['id'], momento)
+
+    def _quitar(self, alerta):
+        lista = self.por_audiencia[alerta.get('destinatario')]
+        del lista[bisect_left(lista, clave_alerta(alerta))]
+        if not lista:
+            del self.por_audiencia[alerta.get('destinatario')]
+        for user_id in self.lectores_previos.pop(alerta['id'], ()):
+            ids = self.leidas_previas[user_id]
+            ids.discard(alerta['id'])
+            if not ids:
+                del self.leidas_previas[user_id]
+        momento = self.vencimientos.pop(alerta['id'], None)
+        if momento is not None:
+            del self.por_vencimiento[bisect_left(self.por_vencimiento, (momento, alerta['id']))]
+            if self.programador:
+                self.programador.programar(alerta['id'], None)
+
+    def reconstruir(self, registros):
+        self.registros, self.por_audiencia, self.vencimientos = {}, {}, {}
+        self.lectores_previos, self.leidas_previas, self.por_vencimiento = {}, {}, []
+        for alerta in registros:
+            if alerta['id'] not in self.registros:
+                self._agregar(alerta, ordenar=False)
+        for lista in self.por_audiencia.values():
+            lista.sort()
+        self.por_vencimiento.sort()
+        if self.programador:
+            self.programador.reiniciar(self.vencimientos)
+
+    def aplicar(self, antes, despues):
+        anterior = self.registros.pop((despues or antes)['id'], None)
+        if anterior is not None:
+            self._quitar(anterior)
+        if despues is not None:
+            self._agregar(despues)
+
+    # --- Consultas ---
+
+    def _claves(self, tipo_usuario, desde=None):
+        """Claves de las alertas vigentes que ve ``tipo_usuario`` posteriores a ``desde``, en orden.
+        Las vencidas se saltan aunque el programador todavía no las haya eliminado."""
+        listas = []
+        for audiencia in AUDIENCIAS.get(tipo_usuario, ()):
+            lista = self.por_audiencia.get(audiencia, [])
+            listas.append(lista[bisect_right(lista, desde):] if desde else lista)
+        ahora = time.time()
+        return (clave for clave in heapq.merge(*listas) if self.vencimientos.get(clave[1], ahora + 1) > ahora)
+
+    def relevantes(self, tipo_usuario):
+        """Todas las alertas que ve ese tipo de cuenta, de la más antigua a la más reciente"""
+        with self._lock:
+            return [self.registros[i] for _, i in self._claves(tipo_usuario)]
+
+    def no_leidas(self, tipo_usuario, user_id, lectura=None, limite=None):
+        """Alertas sin leer del usuario, de la más antigua a la más reciente (con ``limite``,
+        solo las primeras). ``lectura`` es su registro de ``alertas_leidas``; solo se
+        recorren las alertas posteriores a su marca."""
+        marca, leidas = estado_lectura(lectura)
+        with self._lock:
+            ids = (i for _, i in self._claves(tipo_usuario, marca)
+                   if i not in leidas and user_id not in self.lectores_previos.get(i, ()))
+            return [self.registros[i] for i in islice(ids, limite)]
+
+    def contar_no_leidas(self, tipo_usuario, user_id, lectura=None):
+        """Cuántas alertas sin leer tiene el usuario, sin recorrerlas: las posteriores a su
+        marca en cada audiencia, menos las leídas una por una y las vencidas que todavía
+        no se eliminaron"""
+        marca, leidas = estado_lectura(lectura)
+        audiencias = AUDIENCIAS.get(tipo_usuario, ())
+        with self._lock:
+            total = 0
+            for audiencia in audiencias:
+                lista = self.por_audiencia.get(audiencia, [])
+                total -= bisect_right(lista, marca) if marca else 0
+                total += len(lista)
+            vencidas = self.por_vencimiento[:bisect_right(self.por_vencimiento, (time.time(), chr(sys.maxunicode)))]
+            descontar = leidas | self.leidas_previas.get(user_id, set()) | {i for _, i in vencidas}
+            for i in descontar:
+                alerta = self.registros.get(i)
+                if alerta is not None and alerta.get('destinatario') in audiencias \
+                        and (marca is None or clave_alerta(alerta) > marca):
+                    total -= 1
+            return total
+
+    def vigentes(self, ids):
+        """Los ids de la lista que siguen correspondiendo a una alerta"""
+        with self._lock:
+            return [i for i in ids if i in self.registros]
+
+    def ultima(self, tipo_usuario):
+        """Clave de la alerta más reciente que ve ese tipo de cuenta, o None"""
+        with self._lock:
+            ultimas = [self.por_audiencia[a][-1] for a in AUDIENCIAS.get(tipo_usuario, ()) if self.por_audiencia.get(a)]
+            return max(ultimas) if ultimas else None
@@ -0,0 +1,1107 @@
+"""Capa de almacenamiento del sistema de empleos.
+
+Todas las rutas acceden a los datos a través de un objeto ``Almacenamiento``.
+Hay dos implementaciones intercambiables:
+
+- ``AlmacenamientoJSON``: un archivo JSON por colección dentro de ``data/`` más un
+  diario de operaciones (``data/operaciones.log``) que se compacta en esos archivos.
+- ``AlmacenamientoSQLite``: una tabla por colección en una base SQLite en modo WAL.
+
+Los registros devueltos por ``todos``, ``obtener`` y ``buscar`` son de solo lectura;
+para modificarlos se usa ``actualizar``. Los cambios que tocan varias colecciones
+se agrupan en una transacción (``almacen.transaccion()`` o ``almacen.en_transaccion``).
+El backend JSON guarda las colecciones de entidades en memoria como registros compactos
+(``registros.py``), que se leen igual que un dict.
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from registros import CLASES, a_json
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo bloqueos dentro del proceso
+    fcntl = None
+
+# Colecciones del sistema y los campos por los que se consultan.
+# En SQLite cada uno de estos campos es una columna con su propio índice.
+COLECCIONES = {
+    'usuarios': ['email'],
+    'empleadores': ['email', 'ruc'],
+    'trabajos': ['empleador_id', 'estado', 'categoria'],
+    'mensajes': ['de_user_id', 'para_user_id'],
+    'lecturas': ['user_id', 'otro_user_id'],
+    'calificaciones': ['usuario_id', 'empleador_id', 'trabajo_activo_id'],
+    'reportes': ['reportador_id', 'reportado_id', 'estado'],
+    'postulaciones': ['trabajo_id', 'usuario_id', 'empleador_id', 'estado'],
+    'alertas': ['destinatario'],
+    'alertas_leidas': ['user_id', 'tipo_usuario'],
+    'trabajos_activos': ['trabajo_id', 'usuario_id', 'empleador_id', 'postulacion_id', 'estado'],
+    'eliminaciones': ['coleccion'],
+    'tareas': ['estado'],
+}
+
+# Referencias entre colecciones: (colección, campo, colecciones a las que apunta).
+# Los mensajes y reportes pueden apuntar tanto a usuarios como a empleadores.
+# Al eliminar un registro se eliminan los que lo referencian (ver eliminacion.py);
+# por eso cada campo de referencia está también en COLECCIONES, con su índice.
+REFERENCIAS = [
+    ('trabajos', 'empleador_id', ['empleadores']),
+    ('postulaciones', 'trabajo_id', ['trabajos']),
+    ('postulaciones', 'usuario_id', ['usuarios']),
+    ('postulaciones', 'empleador_id', ['empleadores']),
+    ('trabajos_activos', 'postulacion_id', ['postulaciones']),
+    ('trabajos_activos', 'trabajo_id', ['trabajos']),
+    ('trabajos_activos', 'usuario_id', ['usuarios']),
+    ('trabajos_activos', 'empleador_id', ['empleadores']),
+    ('calificaciones', 'trabajo_activo_id', ['trabajos_activos']),
+    ('calificaciones', 'usuario_id', ['usuarios']),
+    ('calificaciones', 'empleador_id', ['empleadores']),
+    ('mensajes', 'de_user_id', ['usuarios', 'empleadores']),
+    ('mensajes', 'para_user_id', ['usuarios', 'empleadores']),
+    ('lecturas', 'user_id', ['usuarios', 'empleadores']),
+    ('lecturas', 'otro_user_id', ['usuarios', 'empleadores']),
+    ('alertas_leidas', 'user_id', ['usuarios', 'empleadores']),
+    ('reportes', 'reportador_id', ['usuarios', 'empleadores']),
+    ('reportes', 'reportado_id', ['usuarios', 'empleadores']),
+]
+
+# Referencias a usuario o empleador cuyo registro dice a qué tipo de cuenta apunta:
+# (colección, campo) -> campo con el tipo. Sin él (mensajes, lecturas) el id vale para los dos.
+CAMPOS_TIPO = {
+    ('alertas_leidas', 'user_id'): 'tipo_usuario',
+    ('reportes', 'reportador_id'): 'reportador_tipo',
+    ('reportes', 'reportado_id'): 'reportado_tipo',
+}
+TIPOS_CUENTA = {'usuarios': 'usuario', 'empleadores': 'empleador'}
+
+class IdDuplicado(ValueError):
+    """Se intentó insertar un registro con un id que ya existe en la colección"""
+
+class Conflicto(Exception):
+    """Otra escritura cambió los datos que leyó la transacción; hay que reintentarla"""
+
+# ===== LECTURA/ESCRITURA DE ARCHIVOS JSON =====
+def _firma_archivo(archivo):
+    """Identifica una versión del archivo: si cambia, alguien lo modificó"""
+    if not os.path.exists(archivo):
+        return None
+    st = os.stat(archivo)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def leer_json(archivo):
+    """Leer un archivo JSON completo. Un archivo corrupto es un error: devolver []
+    haría que la siguiente compactación borrara todos los datos."""
+    try:
+        if not os.path.exists(archivo):
+            print(f"DEBUG: Archivo {archivo} no existe, retornando lista vacía")
+            return []
+
+        with open(archivo, 'r', encoding='utf-8') as f:
+            contenido = f.read().strip()
+            if not contenido:
+                print(f"DEBUG: Archivo {archivo} está vacío")
+                return []
+
+            datos = json.loads(contenido)
+            print(f"DEBUG: Archivo {archivo} leído exitosamente, {len(datos)} registros")
+            return datos
+
+    except FileNotFoundError:
+        return []
+    except json.JSONDecodeError as e:
+        print(f"DEBUG: Error leyendo {archivo}: {e}")
+        raise
+
+def _sincronizar_directorio(directorio):
+    """fsync del directorio para que los os.replace sobrevivan a un corte de luz (no existe en Windows)"""
+    try:
+        fd = os.open(directorio or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def escribir_json(archivo, datos):
+    """Escritura atómica: se escribe un temporal, se sincroniza y se reemplaza el original.
+    Si el proceso muere a mitad, el archivo anterior queda intacto."""
+    temporal = f'{archivo}.tmp-{os.getpid()}-{threading.get_ident()}'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2, default=a_json)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, archivo)
+
+def iterar_json(archivo, tam_bloque=64 * 1024):
+    """Recorrer los elementos de un arreglo JSON leyendo el archivo por bloques,
+    sin cargar el contenido completo en memoria"""
+    decodificador = json.JSONDecoder()
+    with open(archivo, 'r', encoding='utf-8') as f:
+        buffer, pos, abierto = '', 0, False
+        while True:
+            # Saltar espacios, el '[' inicial y las comas entre elementos
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ',' or (buffer[pos] == '[' and not abierto)):
+                abierto = abierto or buffer[pos] == '['
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                registro, pos = decodificador.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # El elemento quedó cortado: leer el siguiente bloque y reintentar
+                bloque = f.read(tam_bloque)
+                if not bloque:
+                    if buffer[pos:].strip():
+                        raise
+                    return
+                buffer, pos = buffer[pos:] + bloque, 0
+                continue
+            yield registro
+
+def _cumple(registro, filtros):
+    return all(registro.get(campo) == valor for campo, valor in filtros.items())
+
+# ===== TRANSACCIONES =====
+class Transaccion:
+    """Agrupa lecturas y escrituras sobre varias colecciones para confirmarlas juntas.
+
+    Control optimista: las lecturas se hacen sin bloquear y se anotan con su resultado;
+    las escrituras se acumulan. Al confirmar, el backend bloquea las colecciones
+    involucradas, repite las lecturas y, si alguna devuelve algo distinto, lanza
+    ``Conflicto`` sin escribir nada. Si no, aplica todas las escrituras de una vez.
+
+    Las lecturas ven los datos confirmados, no las escrituras pendientes de la
+    propia transacción."""
+
+    def __init__(self, almacen):
+        self.almacen = almacen
+        self.lecturas = []      # (tipo, colección, filtros, resultado)
+        self.escrituras = []    # (tipo, colección, *argumentos)
+        self.resultados = None  # Un resultado por escritura, tras confirmar
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        if tipo is None:
+            self.confirmar()
+        return False
+
+    # --- Lecturas (se validan al confirmar) ---
+
+    def buscar(self, coleccion, **filtros):
+        registros = self.almacen.buscar(coleccion, **filtros)
+        self.lecturas.append(('buscar', coleccion, filtros, registros))
+        return registros
+
+    def obtener(self, coleccion, id_registro):
+        registros = self.buscar(coleccion, id=id_registro)
+        return registros[0] if registros else None
+
+    def contar(self, coleccion, **filtros):
+        total = self.almacen.contar(coleccion, **filtros)
+        self.lecturas.append(('contar', coleccion, filtros, total))
+        return total
+
+    # --- Escrituras (se aplican al confirmar) ---
+
+    def insertar(self, coleccion, registro):
+        self.escrituras.append(('insertar', coleccion, dict(registro)))
+        return registro
+
+    def actualizar(self, coleccion, id_registro, cambios):
+        self.escrituras.append(('actualizar', coleccion, id_registro, dict(cambios)))
+
+    def eliminar(self, coleccion, id_registro):
+        self.eliminar_donde(coleccion, id=id_registro)
+
+    def eliminar_donde(self, coleccion, **filtros):
+        self.escrituras.append(('eliminar_donde', coleccion, filtros))
+
+    def reemplazar(self, coleccion, registros):
+        self.escrituras.append(('reemplazar', coleccion, [dict(r) for r in registros]))
+
+    def guardar_lote(self, coleccion, registros):
+        self.escrituras.append(('guardar_lote', coleccion, [dict(r) for r in registros]))
+
+    def colecciones(self):
+        """Colecciones leídas o escritas, en orden fijo para bloquearlas sin interbloqueos"""
+        return sorted({l[1] for l in self.lecturas} | {e[1] for e in self.escrituras})
+
+    def repetir_lectura(self, lectura, buscar, contar):
+        """True si la lectura da lo mismo que cuando se hizo"""
+        tipo, coleccion, filtros, resultado = lectura
+        actual = contar(coleccion, filtros) if tipo == 'contar' else buscar(coleccion, filtros)
+        return actual == resultado
+
+    def confirmar(self):
+        if self.escrituras:
+            self.resultados = self.almacen._confirmar_transaccion(self)
+        else:
+            self.resultados = []
+        return self.resultados
+
+# ===== ÍNDICES DERIVADOS =====
+class IndiceDerivado:
+    """Estructura calculada a partir de una colección (listados, búsqueda, resúmenes...)
+    que el almacenamiento mantiene al día con cada cambio de registro.
+
+    Las subclases definen ``coleccion``, ``reconstruir(registros)`` y ``aplicar(antes, despues)``
+    (``antes`` es None en un alta y ``despues`` en una baja). Un cambio puede llegar después
+    de una reconstrucción que ya lo incluye, así que ``aplicar`` tiene que ser idempotente
+    (lo más simple: guardar por id lo que se indexó de cada registro).
+    Las consultas de la subclase deben tomar ``self._lock``. Si un cambio deja al índice
+    sin poder seguir por sí solo, ``aplicar`` pone ``self.obsoleto = True`` y se
+    reconstruye en la próxima consulta."""
+
+    coleccion = None
+    obsoleto = False
+
+    def __init__(self):
+        self._lock = threading.RLock()
+
+    def reconstruir(self, registros):
+        raise NotImplementedError
+
+    def aplicar(self, antes, despues):
+        raise NotImplementedError
+
+# ===== INTERFAZ COMÚN =====
+class Almacenamiento:
+    """Operaciones que las rutas usan sobre cualquier colección"""
+
+    # Cuántos ids reserva cada proceso de una vez en el contador persistente
+    TAM_BLOQUE_IDS = 32
+
+    def __init__(self):
+        self._bloques_ids = {}  # colección -> (pid, siguiente, límite)
+        self._lock_ids = threading.Lock()
+        self._indices = {}  # nombre -> IndiceDerivado
+        self._indices_obsoletos = set(COLECCIONES)
+        self._lock_indices = threading.RLock()
+
+    def inicializar(self):
+        """Crear archivos/tablas que todavía no existan"""
+        raise NotImplementedError
+
+    def todos(self, coleccion):
+        raise NotImplementedError
+
+    def obtener(self, coleccion, id_registro):
+        return next((r for r in self.todos(coleccion) if r['id'] == id_registro), None)
+
+    def buscar(self, coleccion, **filtros):
+        return [r for r in self.todos(coleccion) if _cumple(r, filtros)]
+
+    def contar(self, coleccion, **filtros):
+        return len(self.buscar(coleccion, **filtros))
+
+    # --- Ids ---
+
+    def siguiente_id(self, coleccion):
+        """Id nuevo para la colección, sin cargarla ni contarla.
+
+        Cada proceso reserva bloques de TAM_BLOQUE_IDS en un contador persistente por
+        colección y los reparte desde memoria: los ids nunca se repiten (ni tras eliminar
+        registros ni entre workers), aunque entre procesos no salgan consecutivos."""
+        with self._lock_ids:
+            pid, siguiente, limite = self._bloques_ids.get(coleccion, (None, 0, 0))
+            # Un bloque heredado por fork pertenece al proceso padre
+            if pid != os.getpid() or siguiente >= limite:
+                siguiente = self._reservar_ids(coleccion, self.TAM_BLOQUE_IDS)
+                limite = siguiente + self.TAM_BLOQUE_IDS
+            self._bloques_ids[coleccion] = (os.getpid(), siguiente + 1, limite)
+            return str(siguiente)
+
+    def _reservar_ids(self, coleccion, cantidad):
+        """Avanzar el contador de la colección en ``cantidad``; devuelve el primer id reservado.
+        La primera vez el contador parte del mayor id numérico existente."""
+        raise NotImplementedError
+
+    # --- Índices derivados ---
+
+    def registrar_indice(self, nombre, indice):
+        """Mantener ``indice`` al día con su colección; se consulta con ``almacen.indice(nombre)``"""
+        with self._lock_indices:
+            self._indices[nombre] = indice
+            self._indices_obsoletos.add(indice.coleccion)
+
+    def indice(self, nombre):
+        """Devolver el índice registrado, al día con los cambios de este y otros procesos"""
+        indice = self._indices[nombre]
+        with self._lock_indices:
+            self._sincronizar_indices(indice.coleccion)
+            if indice.coleccion in self._indices_obsoletos or indice.obsoleto:
+                self._reconstruir_indices(indice.coleccion)
+        return indice
+
+    def _reconstruir_indices(self, coleccion):
+        registros = self.todos(coleccion)
+        for indice in self._indices.values():
+            if indice.coleccion == coleccion:
+                with indice._lock:
+                    indice.reconstruir(registros)
+                    indice.obsoleto = False
+        self._indices_obsoletos.discard(coleccion)
+        print(f"DEBUG: Índices de {coleccion} reconstruidos ({len(registros)} registros)")
+
+    def _notificar(self, coleccion, antes, despues):
+        """Pasar el cambio de un registro a los índices de su colección.
+        Un índice que falla no debe romper la escritura: se reconstruirá en la próxima consulta."""
+        if coleccion in self._indices_obsoletos:
+            return
+        for indice in self._indices.values():
+            if indice.coleccion == coleccion:
+                try:
+                    with indice._lock:
+                        indice.aplicar(antes, despues)
+                except Exception as e:
+                    print(f"DEBUG: Error actualizando índice de {coleccion}: {e}")
+                    self._indices_obsoletos.add(coleccion)
+
+    def _sincronizar_indices(self, coleccion):
+        """Incorporar los cambios que otros procesos hicieron en la colección"""
+        raise NotImplementedError
+
+    # --- Transacciones ---
+
+    def transaccion(self):
+        """``with almacen.transaccion() as tx:`` confirma al salir del bloque sin excepción"""
+        return Transaccion(self)
+
+    def en_transaccion(self, funcion, intentos=5):
+        """Ejecutar ``funcion(tx)`` en una transacción y confirmarla, repitiendo todo si hay
+        conflicto. ``funcion`` debe hacer sus lecturas con ``tx`` para que se validen.
+        Devuelve lo que devuelva ``funcion``."""
+        for intento in range(intentos):
+            tx = self.transaccion()
+            resultado = funcion(tx)
+            try:
+                tx.confirmar()
+                return resultado
+            except Conflicto:
+                if intento == intentos - 1:
+                    raise
+                print(f"DEBUG: Conflicto en transacción, reintento {intento + 1}")
+                time.sleep(random.uniform(0, 0.005 * 2 ** intento))
+
+    def _confirmar_transaccion(self, tx):
+        """Validar las lecturas y aplicar las escrituras de ``tx`` de forma atómica;
+        devuelve un resultado por escritura"""
+        raise NotImplementedError
+
+    # --- Escrituras sueltas (transacciones de una operación) ---
+
+    def insertar(self, coleccion, registro):
+        """Agregar un registro nuevo; lanza IdDuplicado si el id ya existe"""
+        with self.transaccion() as tx:
+            tx.insertar(coleccion, registro)
+        return registro
+
+    def actualizar(self, coleccion, id_registro, cambios):
+        """Aplicar ``cambios`` al registro; devuelve el registro actualizado o None"""
+        with self.transaccion() as tx:
+            tx.actualizar(coleccion, id_registro, cambios)
+        return tx.resultados[0]
+
+    def eliminar(self, coleccion, id_registro):
+        return self.eliminar_donde(coleccion, id=id_registro) > 0
+
+    def eliminar_donde(self, coleccion, **filtros):
+        """Eliminar los registros que cumplen todos los filtros; devuelve cuántos se eliminaron"""
+        with self.transaccion() as tx:
+            tx.eliminar_donde(coleccion, **filtros)
+        return tx.resultados[0]
+
+    def reemplazar(self, coleccion, registros):
+        """Sustituir el contenido completo de la colección"""
+        with self.transaccion() as tx:
+            tx.reemplazar(coleccion, registros)
+
+    def guardar_lote(self, coleccion, registros):
+        """Insertar o reemplazar (por id) un lote de registros en una sola operación"""
+        with self.transaccion() as tx:
+            tx.guardar_lote(coleccion, registros)
+
+    def referencias_rotas(self, coleccion, campo, destinos):
+        """Contar los registros cuyo ``campo`` apunta a un id que no existe en ``destinos``"""
+        ids = {r['id'] for destino in destinos for r in self.todos(destino)}
+        return sum(1 for r in self.todos(coleccion) if r.get(campo) is not None and r[campo] not in ids)
+
+# ===== BACKEND JSON (DESARROLLO) =====
+_SIN_CARGAR = object()
+
+class _ColeccionJSON:
+    """Registros de una colección en memoria, con un índice hash por cada campo
+    de COLECCIONES además del id.
+
+    Cada registro ocupa una ranura (entero creciente); los índices guardan
+    valor -> {ranura: None}, así que buscar por id o por clave foránea cuesta O(1)
+    más el número de resultados, y ordenar las ranuras devuelve el orden del archivo.
+    Con ``clase`` (ver ``registros.CLASES``) cada registro se guarda compacto."""
+
+    def __init__(self, campos, clase=None):
+        self.campos = ['id'] + campos
+        self.clase = clase
+        self.firma = _SIN_CARGAR
+        self.cargar([])
+
+    def cargar(self, datos):
+        self.registros = {}
+        self.indices = {campo: {} for campo in self.campos}
+        self._siguiente = 0
+        for registro in datos:
+            self.agregar(registro)
+
+    def _indexar(self, ranura, registro):
+        for campo in self.campos:
+            self.indices[campo].setdefault(registro.get(campo), {})[ranura] = None
+
+    def _desindexar(self, ranura, registro):
+        for campo in self.campos:
+            valor = registro.get(campo)
+            cubeta = self.indices[campo][valor]
+            del cubeta[ranura]
+            if not cubeta:
+                del self.indices[campo][valor]
+
+    def _compactar(self, registro):
+        return self.clase.desde_dict(registro) if self.clase else registro
+
+    def agregar(self, registro):
+        ranura = self._siguiente
+        self._siguiente += 1
+        registro = self.registros[ranura] = self._compactar(registro)
+        self._indexar(ranura, registro)
+        return ranura
+
+    def quitar(self, ranura):
+        registro = self.registros.pop(ranura)
+        self._desindexar(ranura, registro)
+        return registro
+
+    def sustituir(self, ranura, registro):
+        self._desindexar(ranura, self.registros[ranura])
+        registro = self.registros[ranura] = self._compactar(registro)
+        self._indexar(ranura, registro)
+        return registro
+
+    def ranura_de(self, id_registro):
+        cubeta = self.indices['id'].get(id_registro)
+        return min(cubeta) if cubeta else None
+
+    def ranuras(self, filtros):
+        """Ranuras que cumplen los filtros, partiendo del índice más selectivo"""
+        cubetas = [self.indices[campo].get(valor, {}) for campo, valor in filtros.items() if campo in self.indices]
+        if cubetas:
+            candidatas = sorted(min(cubetas, key=len))
+        else:
+            candidatas = list(self.registros)
+        return [r for r in candidatas if _cumple(self.registros[r], filtros)]
+
+class DiarioOperaciones:
+    """Archivo append-only con un lote de operaciones por línea (JSON).
+
+    Commit en grupo: los hilos encolan su línea y esperan a que quede en disco.
+    El primero que encuentra trabajo pendiente escribe todo lo encolado con un
+    solo fsync; los demás solo esperan, así varias escrituras comparten el fsync."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._cond = threading.Condition()
+        self._pendientes = []
+        self._encolados = 0
+        self._escritos = 0
+        self._escribiendo = False
+
+    def encolar(self, linea):
+        """Encolar una línea; devuelve su número para pasarlo a ``esperar``"""
+        with self._cond:
+            self._pendientes.append(linea)
+            self._encolados += 1
+            return self._encolados
+
+    def esperar(self, numero=None):
+        """Bloquear hasta que la línea ``numero`` (o todo lo encolado) esté sincronizada en disco"""
+        with self._cond:
+            if numero is None:
+                numero = self._encolados
+            while self._escritos < numero:
+                if self._escribiendo:
+                    self._cond.wait()
+                    continue
+
+                # Este hilo escribe el grupo completo de líneas pendientes
+                self._escribiendo = True
+                lote, self._pendientes = self._pendientes, []
+                hasta = self._encolados
+                self._cond.release()
+                try:
+                    self._escribir(''.join(lote).encode('utf-8'))
+                except BaseException:
+                    self._cond.acquire()
+                    self._pendientes = lote + self._pendientes
+                    self._escribiendo = False
+                    self._cond.notify_all()
+                    raise
+                self._cond.acquire()
+                self._escritos = hasta
+                self._escribiendo = False
+                self._cond.notify_all()
+
+    def _escribir(self, datos):
+        fd = os.open(self.ruta, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            # Si otro proceso murió a mitad de una línea, la cola rota queda como una línea
+            # aparte (se descarta al leer) en vez de pegarse a la primera de este grupo
+            tamano = os.fstat(fd).st_size
+            if tamano and os.pread(fd, 1, tamano - 1) != b'\n':
+                datos = b'\n' + datos
+            while datos:
+                escritos = os.write(fd, datos)
+                datos = datos[escritos:]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+class AlmacenamientoJSON(Almacenamiento):
+    """Colecciones en memoria con índices hash, persistidas como instantáneas data/*.json
+    más un diario de operaciones.
+
+    Cada escritura se aplica en memoria y se anota en el diario (commit en grupo);
+    las instantáneas solo se reescriben al compactar, con temporal + os.replace.
+    Al arrancar se cargan las instantáneas y se reproduce el diario. Las operaciones
+    del diario son idempotentes, así que reproducirlas sobre una instantánea que ya
+    las incluye (corte a mitad de una compactación) deja el mismo estado.
+
+    Si otro proceso escribe en el diario, sus líneas se aplican en la siguiente lectura;
+    si compacta (el diario cambia de inodo), se recarga todo.
+
+    Las transacciones bloquean sus colecciones (cerrojo por colección dentro del proceso
+    y flock sobre data/.<colección>.lock entre procesos) solo mientras validan, anotan
+    y sincronizan su línea; las lecturas no esperan a esos bloqueos."""
+
+    # Tamaño del diario a partir del cual se compacta
+    MAX_DIARIO = 4 * 1024 * 1024
+
+    def __init__(self, directorio, max_diario=None):
+        super().__init__()
+        self.directorio = directorio
+        self.max_diario = max_diario or self.MAX_DIARIO
+        self.diario = DiarioOperaciones(os.path.join(directorio, 'operaciones.log'))
+        self._colecciones = {nombre: _ColeccionJSON(campos, CLASES.get(nombre)) for nombre, campos in COLECCIONES.items()}
+        self._lock = threading.RLock()
+        self._lock_indices = self._lock  # Los índices cambian junto con la memoria
+        self._cerrojos = {nombre: threading.Lock() for nombre in COLECCIONES}
+        self._archivos_bloqueo = {}
+        self._pid_bloqueo = None
+        self._origen = uuid.uuid4().hex
+        self._modificadas = set()
+        self._secuencias = {}
+        self._secuencias_modificadas = False
+        self._cargado = False
+        self._inodo_diario = None
+        self._posicion_diario = 0
+
+    def ruta(self, coleccion):
+        return os.path.join(self.directorio, f'{coleccion}.json')
+
+    def ruta_secuencias(self):
+        return os.path.join(self.directorio, 'secuencias.json')
+
+    def inicializar(self):
+        os.makedirs(self.directorio, exist_ok=True)
+        for coleccion in COLECCIONES:
+            archivo = self.ruta(coleccion)
+            if not os.path.exists(archivo):
+                escribir_json(archivo, [])
+        self.compactar()
+
+    # --- Estado en memoria ---
+
+    def _cargar_todo(self):
+        """Cargar las instantáneas y reproducir el diario completo"""
+        self._indices_obsoletos.update(COLECCIONES)
+        for nombre, coleccion in self._colecciones.items():
+            archivo = self.ruta(nombre)
+            coleccion.cargar(leer_json(archivo))
+            coleccion.firma = _firma_archivo(archivo)
+        self._secuencias = leer_json(self.ruta_secuencias()) or {}
+        self._inodo_diario = None
+        self._posicion_diario = 0
+        self._leer_diario(solo_ajenas=False)
+        self._cargado = True
+
+    def _leer_diario(self, solo_ajenas):
+        """Aplicar las líneas completas del diario a partir de la última posición leída"""
+        try:
+            with open(self.diario.ruta, 'rb') as f:
+                self._inodo_diario = os.fstat(f.fileno()).st_ino
+                f.seek(self._posicion_diario)
+                contenido = f.read()
+        except FileNotFoundError:
+            return
+
+        fin = contenido.rfind(b'\n') + 1
+        for linea in contenido[:fin].splitlines():
+            if not linea.strip():
+                continue
+            try:
+                entrada = json.loads(linea)
+            except json.JSONDecodeError:
+                print(f"DEBUG: Línea corrupta en {self.diario.ruta}, se omite")
+                continue
+            if solo_ajenas and entrada['origen'] == self._origen:
+                continue
+            for operacion in entrada['ops']:
+                self._aplicar(operacion)
+        # Lo que sigue al último salto de línea es una escritura en curso de otro proceso o la
+        # cola de una interrumpida: no se trunca aquí (se cortaría un grupo que otro proceso
+        # está agregando); ``compactar``, con todas las colecciones bloqueadas, la descarta
+        self._posicion_diario += fin
+
+    def _sincronizar(self, nombre):
+        """Poner al día la memoria con lo que otros procesos hayan escrito"""
+        if not self._cargado:
+            self._cargar_todo()
+            return
+        try:
+            st = os.stat(self.diario.ruta)
+            inodo, tamano = st.st_ino, st.st_size
+        except FileNotFoundError:
+            inodo, tamano = None, 0
+
+        coleccion = self._colecciones[nombre]
+        if (inodo != self._inodo_diario and self._inodo_diario is not None) or tamano < self._posicion_diario \
+                or _firma_archivo(self.ruta(nombre)) != coleccion.firma:
+            self._cargar_todo()
+        elif tamano > self._posicion_diario:
+            self._leer_diario(solo_ajenas=True)
+
+    def _coleccion(self, nombre):
+        self._sincronizar(nombre)
+        return self._colecciones[nombre]
+
+    def _aplicar(self, operacion):
+        tipo = operacion['op']
+        if tipo == 'secuencia':
+            # Los contadores solo avanzan, así que reproducir la línea dos veces no hace daño
+            actual = self._secuencias.get(operacion['col'], 0)
+            self._secuencias[operacion['col']] = max(actual, operacion['valor'])
+            self._secuencias_modificadas = True
+            return
+
+        nombre = operacion['col']
+        coleccion = self._colecciones[nombre]
+        self._modificadas.add(nombre)
+        if tipo == 'insertar':
+            # Al reproducir, el registro puede estar ya en la instantánea
+            registro = operacion['registro']
+            if coleccion.ranura_de(registro['id']) is None:
+                # A los índices se les pasa el registro guardado, no la copia de la operación
+                ranura = coleccion.agregar(registro)
+                self._notificar(nombre, None, coleccion.registros[ranura])
+        elif tipo == 'guardar':
+            registro = operacion['registro']
+            ranura = coleccion.ranura_de(registro['id'])
+            if ranura is None:
+                ranura = coleccion.agregar(registro)
+                self._notificar(nombre, None, coleccion.registros[ranura])
+            else:
+                anterior = coleccion.registros[ranura]
+                self._notificar(nombre, anterior, coleccion.sustituir(ranura, registro))
+        elif tipo == 'eliminar':
+            for id_registro in operacion['ids']:
+                for ranura in coleccion.ranuras({'id': id_registro}):
+                    self._notificar(nombre, coleccion.quitar(ranura), None)
+        elif tipo == 'reemplazar':
+            coleccion.cargar(operacion['registros'])
+            self._indices_obsoletos.add(nombre)
+
+    def _anotar(self, operaciones):
+        """Aplicar en memoria y encolar en el diario. Se llama con el lock tomado;
+        devuelve el número de línea que hay que esperar con ``diario.esperar``"""
+        for operacion in operaciones:
+            self._aplicar(operacion)
+        linea = json.dumps({'origen': self._origen, 'ops': operaciones}, ensure_ascii=False, default=a_json) + '\n'
+        return self.diario.encolar(linea)
+
+    def _sincronizar_indices(self, coleccion):
+        # Las líneas de otros procesos pasan por _aplicar, que notifica a los índices
+        self._coleccion(coleccion)
+
+    def _archivo_bloqueo(self, nombre):
+        """Descriptor para flock de la colección; uno por proceso (tras un fork se reabre,
+        porque un descriptor heredado compartiría el bloqueo con el padre)"""
+        if self._pid_bloqueo != os.getpid():
+            self._archivos_bloqueo = {}
+            self._pid_bloqueo = os.getpid()
+        archivo = self._archivos_bloqueo.get(nombre)
+        if archivo is None:
+            archivo = open(os.path.join(self.directorio, f'.{nombre}.lock'), 'a')
+            self._archivos_bloqueo[nombre] = archivo
+        return archivo
+
+    @contextmanager
+    def _bloquear(self, colecciones):
+        """Bloqueo exclusivo de las colecciones, siempre en orden alfabético para evitar
+        interbloqueos. El cerrojo de hilo excluye dentro del proceso y el flock entre procesos."""
+        tomados = []
+        try:
+            for nombre in sorted(colecciones):
+                cerrojo = self._cerrojos[nombre]
+                cerrojo.acquire()
+                tomados.append([cerrojo, None])
+                if fcntl is not None:
+                    archivo = self._archivo_bloqueo(nombre)
+                    fcntl.flock(archivo.fileno(), fcntl.LOCK_EX)
+                    tomados[-1][1] = archivo
+            yield
+        finally:
+            for cerrojo, archivo in reversed(tomados):
+                if archivo is not None:
+                    fcntl.flock(archivo.fileno(), fcntl.LOCK_UN)
+                cerrojo.release()
+
+    def _reservar_ids(self, coleccion, cantidad):
+        with self._bloquear([coleccion]):
+            with self._lock:
+                col = self._coleccion(coleccion)
+                inicio = self._secuencias.get(coleccion)
+                if inicio is None:
+                    numericos = [int(i) for i in col.indices['id'] if str(i).isdigit()]
+                    inicio = max(numericos, default=0) + 1
+                numero = self._anotar([{'op': 'secuencia', 'col': coleccion, 'valor': inicio + cantidad}])
+            self.diario.esperar(numero)
+        return inicio
+
+    def _traducir(self, escrituras):
+        """Convertir las escrituras de una transacción en operaciones del diario, resueltas
+        contra el estado actual más las escrituras anteriores de la misma transacción.
+        Devuelve (operaciones, resultados); no modifica nada."""
+        operaciones, resultados = [], []
+        pendientes = {}  # (colección, id) -> registro tras esta transacción (None si se elimina)
+        for escritura in escrituras:
+            tipo, nombre = escritura[0], escritura[1]
+            col = self._coleccion(nombre)
+
+            def actual(id_registro):
+                if (nombre, id_registro) in pendientes:
+                    return pendientes[(nombre, id_registro)]
+                ranura = col.ranura_de(id_registro)
+                return col.registros[ranura] if ranura is not None else None
+
+            if tipo == 'insertar':
+                registro = escritura[2]
+                if actual(registro['id']) is not None:
+                    raise IdDuplicado(f"{nombre}: ya existe el id {registro['id']}")
+                pendientes[(nombre, registro['id'])] = registro
+                operaciones.append({'op': 'insertar', 'col': nombre, 'registro': registro})
+                resultados.append(registro)
+            elif tipo == 'actualizar':
+                anterior = actual(escritura[2])
+                if anterior is None:
+                    resultados.append(None)
+                    continue
+                registro = {**anterior, **escritura[3]}
+                pendientes[(nombre, registro['id'])] = registro
+                operaciones.append({'op': 'guardar', 'col': nombre, 'registro': registro})
+                resultados.append(registro)
+            elif tipo == 'eliminar_donde':
+                ranuras = col.ranuras(escritura[2])
+                ids = list(dict.fromkeys(col.registros[r]['id'] for r in ranuras))
+                if ids:
+                    operaciones.append({'op': 'eliminar', 'col': nombre, 'ids': ids})
+                for id_registro in ids:
+                    pendientes[(nombre, id_registro)] = None
+                resultados.append(len(ranuras))
+            elif tipo == 'reemplazar':
+                operaciones.append({'op': 'reemplazar', 'col': nombre, 'registros': escritura[2]})
+                resultados.append(None)
+            elif tipo == 'guardar_lote':
+                for registro in escritura[2]:
+                    pendientes[(nombre, registro['id'])] = registro
+                    operaciones.append({'op': 'guardar', 'col': nombre, 'registro': registro})
+                resultados.append(None)
+        return operaciones, resultados
+
+    def _confirmar_transaccion(self, tx):
+        with self._bloquear(tx.colecciones()):
+            with self._lock:
+                for lectura in tx.lecturas:
+                    if not tx.repetir_lectura(lectura, lambda c, f: self.buscar(c, **f), lambda c, f: self.contar(c, **f)):
+                        raise Conflicto(f"{lectura[1]} cambió durante la transacción")
+                operaciones, resultados = self._traducir(tx.escrituras)
+                numero = self._anotar(operaciones) if operaciones else None
+
+            # El fsync se espera sin el lock del proceso (commit en grupo con otros hilos)
+            # pero con las colecciones bloqueadas: otro proceso no debe validar contra
+            # estas colecciones antes de que la línea esté en el diario
+            if numero is not None:
+                self.diario.esperar(numero)
+
+        if os.path.exists(self.diario.ruta) and os.path.getsize(self.diario.ruta) > self.max_diario:
+            self.compactar()
+        return resultados
+
+    def compactar(self):
+        """Volcar el estado a las instantáneas data/*.json y empezar un diario vacío"""
+        with self._bloquear(COLECCIONES), self._lock:
+            # Incorporar antes lo que otros procesos anotaron: el diario se va a vaciar
+            for nombre in COLECCIONES:
+                self._sincronizar(nombre)
+            self.diario.esperar()
+            for nombre in self._modificadas:
+                coleccion = self._colecciones[nombre]
+                archivo = self.ruta(nombre)
+                escribir_json(archivo, list(coleccion.registros.values()))
+                coleccion.firma = _firma_archivo(archivo)
+            self._modificadas.clear()
+            if self._secuencias_modificadas:
+                escribir_json(self.ruta_secuencias(), self._secuencias)
+                self._secuencias_modificadas = False
+
+            # Sustituir el diario por uno vacío (nuevo inodo: los demás procesos recargan)
+            temporal = f'{self.diario.ruta}.tmp-{os.getpid()}'
+            open(temporal, 'wb').close()
+            os.replace(temporal, self.diario.ruta)
+            _sincronizar_directorio(self.directorio)
+            self._inodo_diario = os.stat(self.diario.ruta).st_ino
+            self._posicion_diario = 0
+
+    # --- Lecturas ---
+
+    def todos(self, coleccion):
+        with self._lock:
+            return list(self._coleccion(coleccion).registros.values())
+
+    def obtener(self, coleccion, id_registro):
+        with self._lock:
+            col = self._coleccion(coleccion)
+            ranura = col.ranura_de(id_registro)
+            return col.registros[ranura] if ranura is not None else None
+
+    def buscar(self, coleccion, **filtros):
+        with self._lock:
+            col = self._coleccion(coleccion)
+            return [col.registros[r] for r in col.ranuras(filtros)]
+
+    def contar(self, coleccion, **filtros):
+        with self._lock:
+            col = self._coleccion(coleccion)
+            return len(col.ranuras(filtros)) if filtros else len(col.registros)
+
+# ===== BACKEND SQLITE =====
+class AlmacenamientoSQLite(Almacenamiento):
+    """Una tabla por colección con el registro completo en la columna ``datos`` (JSON)
+    y los campos de COLECCIONES copiados en columnas indexadas.
+
+    La conexión trabaja en modo autocommit; cada transacción abre su propio
+    BEGIN IMMEDIATE, que toma el bloqueo de escritura de la base (los lectores en
+    WAL siguen sin esperar) y vale también entre procesos."""
+
+    def __init__(self, ruta):
+        super().__init__()
+        self.ruta = ruta
+        self._local = threading.local()
+        self._versiones_vistas = {}  # colección -> versión con la que están al día los índices
+        self._inicializada = False
+        self._init_lock = threading.Lock()
+
+    def _conexion(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            con.execute('PRAGMA journal_mode=WAL')
+            con.execute('PRAGMA synchronous=NORMAL')
+            self._local.con = con
+            if not self._inicializada:
+                self._crear_tablas(con)
+        return con
+
+    def _crear_tablas(self, con):
+        with self._init_lock:
+            if self._inicializada:
+                return
+            with con:
+                for coleccion, campos in COLECCIONES.items():
+                    columnas = ''.join(f', {campo} TEXT' for campo in campos)
+                    con.execute(f'CREATE TABLE IF NOT EXISTS {coleccion} (id TEXT PRIMARY KEY, datos TEXT NOT NULL{columnas})')
+                    for campo in campos:
+                        con.execute(f'CREATE INDEX IF NOT EXISTS idx_{coleccion}_{campo} ON {coleccion} ({campo})')
+                con.execute('CREATE TABLE IF NOT EXISTS secuencias (coleccion TEXT PRIMARY KEY, valor INTEGER NOT NULL)')
+                # Cada transacción incrementa la versión de las colecciones que escribe
+                con.execute('CREATE TABLE IF NOT EXISTS versiones (coleccion TEXT PRIMARY KEY, valor INTEGER NOT NULL)')
+            self._inicializada = True
+
+    def inicializar(self):
+        directorio = os.path.dirname(self.ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._conexion()
+
+    @staticmethod
+    def _columna(valor):
+        if valor is None or isinstance(valor, (str, int, float)):
+            return valor
+        return json.dumps(valor, ensure_ascii=False)
+
+    def _fila(self, coleccion, registro):
+        campos = COLECCIONES[coleccion]
+        return [registro['id'], json.dumps(registro, ensure_ascii=False, default=a_json)] + [self._columna(registro.get(c)) for c in campos]
+
+    def _sql_insertar(self, coleccion, reemplazar=False):
+        campos = ['id', 'datos'] + COLECCIONES[coleccion]
+        verbo = 'INSERT OR REPLACE' if reemplazar else 'INSERT'
+        return f'{verbo} INTO {coleccion} ({", ".join(campos)}) VALUES ({", ".join("?" * len(campos))})'
+
+    def _where(self, coleccion, filtros):
+        condiciones, valores = [], []
+        for campo, valor in filtros.items():
+            if campo == 'id' or campo in COLECCIONES[coleccion]:
+                columna = campo
+            else:
+                columna = f"json_extract(datos, '$.{campo}')"
+            if valor is None:
+                condiciones.append(f'{columna} IS NULL')
+            else:
+                condiciones.append(f'{columna} = ?')
+                valores.append(valor)
+        return (' WHERE ' + ' AND '.join(condiciones)) if condiciones else '', valores
+
+    def todos(self, coleccion):
+        filas = self._conexion().execute(f'SELECT datos FROM {coleccion} ORDER BY rowid')
+        return [json.loads(datos) for (datos,) in filas]
+
+    def obtener(self, coleccion, id_registro):
+        fila = self._conexion().execute(f'SELECT datos FROM {coleccion} WHERE id = ?', (id_registro,)).fetchone()
+        return json.loads(fila[0]) if fila else None
+
+    def buscar(self, coleccion, **filtros):
+        where, valores = self._where(coleccion, filtros)
+        filas = self._conexion().execute(f'SELECT datos FROM {coleccion}{where} ORDER BY rowid', valores)
+        return [json.loads(datos) for (datos,) in filas]
+
+    def contar(self, coleccion, **filtros):
+        where, valores = self._where(coleccion, filtros)
+        return self._conexion().execute(f'SELECT COUNT(*) FROM {coleccion}{where}', valores).fetchone()[0]
+
+    def _reservar_ids(self, coleccion, cantidad):
+        con = self._conexion()
+        con.execute('BEGIN IMMEDIATE')
+        try:
+            fila = con.execute('SELECT valor FROM secuencias WHERE coleccion = ?', (coleccion,)).fetchone()
+            if fila:
+                inicio = fila[0]
+            else:
+                maximo = con.execute(f"SELECT MAX(CAST(id AS INTEGER)) FROM {coleccion} WHERE id NOT GLOB '*[^0-9]*'").fetchone()[0]
+                inicio = (maximo or 0) + 1
+            con.execute('INSERT OR REPLACE INTO secuencias (coleccion, valor) VALUES (?, ?)', (coleccion, inicio + cantidad))
+            con.execute('COMMIT')
+        except BaseException:
+            con.execute('ROLLBACK')
+            raise
+        return inicio
+
+    def _escribir(self, con, escritura, cambios):
+        """Ejecutar una escritura de transacción; devuelve su resultado y anota en ``cambios``
+        (colección, antes, después) para los índices derivados, o (colección, None, None)
+        si hay que reconstruirlos"""
+        tipo, coleccion = escritura[0], escritura[1]
+        if tipo == 'insertar':
+            registro = escritura[2]
+            try:
+                con.execute(self._sql_insertar(coleccion), self._fila(coleccion, registro))
+            except sqlite3.IntegrityError:
+                raise IdDuplicado(f"{coleccion}: ya existe el id {registro['id']}")
+            cambios.append((coleccion, None, registro))
+            return registro
+        if tipo == 'actualizar':
+            id_registro, nuevos = escritura[2], escritura[3]
+            fila = con.execute(f'SELECT datos FROM {coleccion} WHERE id = ?', (id_registro,)).fetchone()
+            if not fila:
+                return None
+            anterior = json.loads(fila[0])
+            registro = {**anterior, **nuevos}
+            campos = COLECCIONES[coleccion]
+            asignaciones = ', '.join(['datos = ?'] + [f'{c} = ?' for c in campos])
+            valores = self._fila(coleccion, registro)[1:] + [id_registro]
+            con.execute(f'UPDATE {coleccion} SET {asignaciones} WHERE id = ?', valores)
+            cambios.append((coleccion, anterior, registro))
+            return registro
+        if tipo == 'eliminar_donde':
+            where, valores = self._where(coleccion, escritura[2])
+            if any(i.coleccion == coleccion for i in self._indices.values()):
+                # Los índices necesitan saber qué registros se van
+                for (datos,) in con.execute(f'SELECT datos FROM {coleccion}{where}', valores).fetchall():
+                    cambios.append((coleccion, json.loads(datos), None))
+            return con.execute(f'DELETE FROM {coleccion}{where}', valores).rowcount
+        if tipo == 'reemplazar':
+            con.execute(f'DELETE FROM {coleccion}')
+        reemplazar = tipo == 'guardar_lote'
+        con.executemany(self._sql_insertar(coleccion, reemplazar), [self._fila(coleccion, r) for r in escritura[2]])
+        cambios.append((coleccion, None, None))
+        return None
+
+    def _confirmar_transaccion(self, tx):
+        con = self._conexion()
+        cambios, versiones, ajenas = [], {}, set()
+        con.execute('BEGIN IMMEDIATE')
+        try:
+            for lectura in tx.lecturas:
+                if not tx.repetir_lectura(lectura, lambda c, f: self.buscar(c, **f), lambda c, f: self.contar(c, **f)):
+                    raise Conflicto(f"{lectura[1]} cambió durante la transacción")
+            resultados = [self._escribir(con, escritura, cambios) for escritura in tx.escrituras]
+
+            for coleccion in {e[1] for e in tx.escrituras}:
+                fila = con.execute('SELECT valor FROM versiones WHERE coleccion = ?', (coleccion,)).fetchone()
+                actual = fila[0] if fila else 0
+                if actual != self._versiones_vistas.get(coleccion):
+                    ajenas.add(coleccion)  # Otro proceso escribió antes: los índices no están al día
+                versiones[coleccion] = actual + 1
+                con.execute('INSERT OR REPLACE INTO versiones (coleccion, valor) VALUES (?, ?)', (coleccion, actual + 1))
+            con.execute('COMMIT')
+        except BaseException:
+            con.execute('ROLLBACK')
+            raise
+
+        with self._lock_indices:
+            self._versiones_vistas.update(versiones)
+            self._indices_obsoletos.update(ajenas)
+            for coleccion, antes, despues in cambios:
+                if antes is None and despues is None:
+                    self._indices_obsoletos.add(coleccion)
+                else:
+                    self._notificar(coleccion, antes, despues)
+        return resultados
+
+    def _sincronizar_indices(self, coleccion):
+        fila = self._conexion().execute('SELECT valor FROM versiones WHERE coleccion = ?', (coleccion,)).fetchone()
+        actual = fila[0] if fila else 0
+        if actual != self._versiones_vistas.get(coleccion):
+            self._indices_obsoletos.add(coleccion)
+            self._versiones_vistas[coleccion] = actual
+
+    def referencias_rotas(self, coleccion, campo, destinos):
+        columna = campo if campo in COLECCIONES[coleccion] else f"json_extract(datos, '$.{campo}')"
+        existentes = ' UNION '.join(f'SELECT id FROM {destino}' for destino in destinos)
+        sql = f'SELECT COUNT(*) FROM {coleccion} WHERE {columna} IS NOT NULL AND {columna} NOT IN ({existentes})'
+        return self._conexion().execute(sql).fetchone()[0]
+
+def crear_almacenamiento(tipo, directorio):
+    """Construir el backend indicado por ``tipo`` ('json' o 'sqlite')"""
+    if tipo == 'json':
+        return AlmacenamientoJSON(directorio)
+    if tipo == 'sqlite':
+        return AlmacenamientoSQLite(os.path.join(directorio, 'empleos.db'))
+    raise ValueError(f"Tipo de almacenamiento desconocido: {tipo}")
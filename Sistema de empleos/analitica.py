@@ -0,0 +1,350 @@
+"""Series de tiempo para el administrador: publicaciones, postulaciones, aceptaciones,
+rechazos y calificaciones por día y por hora.
+
+Cada evento se anota como una línea JSON al final de ``data/analitica.log`` y se suma
+en memoria a contadores guardados en arrays de enteros (``array('I')``, una posición
+por día y otra por hora): uno por evento, uno por evento + categoría y uno por
+evento + ubicación. Una consulta de un año corta como mucho 366 posiciones de cada
+serie, sin leer trabajos ni postulaciones.
+
+Cada proceso lee solo las líneas nuevas del log (de cualquier worker) antes de
+responder. Cuando el log pasa de ``MAX_LOG`` bytes, ``compactar`` guarda las series en
+``analitica.log.resumen`` junto con el (dispositivo, inodo) del log vacío que lo sigue,
+y pone ese log en lugar del anterior: un proceso que arranca carga el resumen y suma
+solo el log, que nunca es más largo que eso. ``reconstruir`` vuelve a generar el log a
+partir de los datos y descarta el resumen.
+
+Anotar toma un bloqueo compartido de ``analitica.log.lock``; compactar y reconstruir
+uno exclusivo, así ningún evento se escribe en un log que está por reemplazarse.
+"""
+import json
+import os
+import tempfile
+import threading
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo bloqueos dentro del proceso
+    fcntl = None
+
+from listados import normalizar_ubicacion
+
+EVENTOS = ('publicacion', 'postulacion', 'aceptacion', 'rechazo', 'calificacion')
+AGRUPACIONES = ('categoria', 'ubicacion')
+GRANULARIDADES = ('dia', 'hora')
+
+# Rango máximo de una consulta, en días (por hora son 24 posiciones por día)
+MAX_DIAS = {'dia': 366 * 5, 'hora': 31}
+
+# Bytes del log a partir de los cuales sus eventos pasan al resumen
+MAX_LOG = 4 * 1024 * 1024
+
+@lru_cache(maxsize=4096)
+def _dia(fecha):
+    """Ordinal del día 'AAAA-MM-DD'"""
+    return date.fromisoformat(fecha).toordinal()
+
+def _posicion(momento):
+    """(día, hora) de un momento ISO: el día como ordinal de fecha y la hora 0-23"""
+    if len(momento) >= 13 and momento[10] == 'T':
+        return _dia(momento[:10]), int(momento[11:13])
+    instante = datetime.fromisoformat(momento)
+    return instante.toordinal(), instante.hour
+
+class _Serie:
+    """Conteos por día y por hora desde ``dia0`` (el día más antiguo con eventos)"""
+
+    def __init__(self, dia):
+        self.dia0 = dia
+        self.dias = array('I', [0])
+        self.horas = array('I', [0] * 24)
+
+    def sumar(self, dia, hora, cantidad=1):
+        if dia < self.dia0:
+            # Evento anterior al primero (p. ej. al reconstruir fuera de orden): se corre el origen
+            faltan = self.dia0 - dia
+            self.dias = array('I', [0] * faltan) + self.dias
+            self.horas = array('I', [0] * (faltan * 24)) + self.horas
+            self.dia0 = dia
+        indice = dia - self.dia0
+        if indice >= len(self.dias):
+            faltan = indice + 1 - len(self.dias)
+            self.dias.extend([0] * faltan)
+            self.horas.extend([0] * (faltan * 24))
+        self.dias[indice] += cantidad
+        self.horas[indice * 24 + hora] += cantidad
+
+    def a_lista(self):
+        """Las horas con eventos como [posición, conteo]; los días son su suma"""
+        return [[indice, cantidad] for indice, cantidad in enumerate(self.horas) if cantidad]
+
+    @classmethod
+    def desde_lista(cls, dia0, horas):
+        serie = cls(dia0)
+        for indice, cantidad in horas:
+            serie.sumar(dia0 + indice // 24, indice % 24, cantidad)
+        return serie
+
+    def corte(self, desde, hasta, por_hora):
+        """Conteos del día ``desde`` al ``hasta`` (inclusive), con ceros fuera de la serie"""
+        datos, escala = (self.horas, 24) if por_hora else (self.dias, 1)
+        inicio, fin = (desde - self.dia0) * escala, (hasta + 1 - self.dia0) * escala
+        valores = datos[max(inicio, 0):max(min(fin, len(datos)), 0)].tolist()
+        antes = min(max(-inicio, 0), fin - inicio)
+        return [0] * antes + valores + [0] * (fin - inicio - antes - len(valores))
+
+class RegistroAnalitica:
+    """Eventos del log sumados en series por (evento, agrupación, valor)"""
+
+    def __init__(self, ruta, max_log=MAX_LOG):
+        self.ruta = ruta
+        self.ruta_resumen = f'{ruta}.resumen'
+        self.max_log = max_log
+        self._lock = threading.Lock()
+        self._lock_log = threading.RLock()  # Sin fcntl, en lugar del flock
+        self._limpiar()
+
+    def _limpiar(self):
+        self.series = {}            # (evento, None|'categoria'|'ubicacion', valor) -> _Serie
+        self.nombres_ubicacion = {}  # ubicación normalizada -> como se escribió la primera vez
+        self._claves_ubicacion = {}  # ubicación tal como llega -> normalizada
+        self._archivo = None         # (dispositivo, inodo) del log leído
+        self._leido = 0              # bytes del log ya sumados
+
+    # --- Escritura ---
+
+    @contextmanager
+    def _bloquear_log(self, exclusivo):
+        """flock de ``<log>.lock``: compartido para anotar (O_APPEND ya evita que se mezclen
+        líneas), exclusivo para reemplazar el log. Cada llamada abre su propio descriptor,
+        así también excluye a otros hilos del mismo proceso."""
+        if fcntl is None:
+            with self._lock_log:
+                yield
+            return
+        fd = os.open(f'{self.ruta}.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusivo else fcntl.LOCK_SH)
+            yield
+        finally:
+            os.close(fd)  # Libera el flock
+
+    def registrar(self, evento, momento=None, categoria=None, ubicacion=None):
+        """Anotar un evento. Un fallo se informa pero no interrumpe la operación que lo generó.
+
+        Devuelve True si con este evento el log pasó de ``max_log`` (hay que compactar)."""
+        linea = json.dumps({'evento': evento, 'momento': momento or datetime.now().isoformat(),
+                            'categoria': categoria, 'ubicacion': ubicacion}, ensure_ascii=False) + '\n'
+        datos = linea.encode('utf-8')
+        try:
+            with self._bloquear_log(exclusivo=False):
+                # Con O_APPEND cada línea va entera al final aunque escriban varios procesos
+                fd = os.open(self.ruta, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, datos)
+                    tamano = os.fstat(fd).st_size
+                finally:
+                    os.close(fd)
+        except OSError as e:
+            print(f"⚠️ No se pudo registrar el evento {evento}: {e}")
+            return False
+        return tamano - len(datos) <= self.max_log < tamano
+
+    def _temporal(self, lineas):
+        """Archivo temporal junto al log con ``lineas``; devuelve su ruta"""
+        fd, temporal = tempfile.mkstemp(prefix='analitica-', suffix='.tmp',
+                                        dir=os.path.dirname(self.ruta) or '.')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as archivo:
+                archivo.writelines(lineas)
+            os.chmod(temporal, 0o644)
+        except BaseException:
+            os.remove(temporal)
+            raise
+        return temporal
+
+    def reconstruir(self, generar):
+        """Reemplazar el log por los eventos que devuelve ``generar()``
+        [(evento, momento, categoría, ubicación)]; devuelve cuántos son.
+
+        ``generar`` se llama con el log bloqueado: un evento anotado mientras se leen los
+        datos espera y va al log nuevo, y dos reconstrucciones no se pisan."""
+        with self._bloquear_log(exclusivo=True):
+            eventos = generar()
+            temporal = self._temporal(
+                json.dumps({'evento': evento, 'momento': momento, 'categoria': categoria,
+                            'ubicacion': ubicacion}, ensure_ascii=False) + '\n'
+                for evento, momento, categoria, ubicacion in eventos)
+            try:
+                os.replace(temporal, self.ruta)
+            except BaseException:
+                os.remove(temporal)
+                raise
+            # El log nuevo tiene todos los eventos: el resumen (de otro inodo) ya no sirve
+            try:
+                os.remove(self.ruta_resumen)
+            except FileNotFoundError:
+                pass
+        return len(eventos)
+
+    def compactar(self):
+        """Guardar las series en el resumen y empezar un log vacío; devuelve los bytes
+        del log que pasaron al resumen.
+
+        Primero se escribe el resumen apuntando al log vacío y después se reemplaza el
+        log: si algo falla en medio, el resumen no corresponde al log que hay y se ignora."""
+        with self._lock, self._bloquear_log(exclusivo=True):
+            # Con el bloqueo nadie anota: se suma el log entero
+            self._sincronizar(bloqueado=True)
+            leido = self._leido
+            vacio = self._temporal(())
+            try:
+                estado = os.stat(vacio)
+                archivo = (estado.st_dev, estado.st_ino)
+                series = [[evento, agrupacion, valor, serie.dia0, serie.a_lista()]
+                          for (evento, agrupacion, valor), serie in self.series.items()]
+                resumen = self._temporal((json.dumps({'log': archivo, 'ubicaciones': self.nombres_ubicacion,
+                                                      'series': series}, ensure_ascii=False),))
+                try:
+                    os.replace(resumen, self.ruta_resumen)
+                except BaseException:
+                    os.remove(resumen)
+                    raise
+                os.replace(vacio, self.ruta)
+            except BaseException:
+                if os.path.exists(vacio):
+                    os.remove(vacio)
+                raise
+            self._archivo, self._leido = archivo, 0
+        return leido
+
+    # --- Lectura ---
+
+    def _sumar(self, evento, momento, categoria, ubicacion, cantidad=1):
+        dia, hora = _posicion(momento)
+        ubicacion = ubicacion or ''
+        clave_ubicacion = self._claves_ubicacion.get(ubicacion)
+        if clave_ubicacion is None:
+            clave_ubicacion = self._claves_ubicacion[ubicacion] = normalizar_ubicacion(ubicacion)
+            if clave_ubicacion:
+                self.nombres_ubicacion.setdefault(clave_ubicacion, ubicacion.strip())
+        for agrupacion, valor in ((None, None), ('categoria', categoria or None), ('ubicacion', clave_ubicacion or None)):
+            clave = (evento, agrupacion, valor)
+            serie = self.series.get(clave)
+            if serie is None:
+                serie = self.series[clave] = _Serie(dia)
+            serie.sumar(dia, hora, cantidad)
+
+    def _cargar_resumen(self, archivo):
+        """Empezar de nuevo para el log ``archivo`` (dispositivo, inodo), desde el resumen
+        si es el de ese log"""
+        self._limpiar()
+        self._archivo = archivo
+        try:
+            with open(self.ruta_resumen, encoding='utf-8') as resumen:
+                datos = json.load(resumen)
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            print(f"⚠️ Resumen de analítica inválido, se suma solo el log: {e}")
+            return
+        if tuple(datos['log']) != archivo:
+            print("⚠️ El resumen de analítica es de otro log: se suma solo el log")
+            return
+        self.nombres_ubicacion = datos['ubicaciones']
+        for evento, agrupacion, valor, dia0, horas in datos['series']:
+            self.series[(evento, agrupacion, valor)] = _Serie.desde_lista(dia0, horas)
+
+    def _abrir_log(self, bloqueado):
+        """El log abierto para leer. Si es otro que el ya leído (compactado, reconstruido
+        o truncado) se parte de su resumen; el bloqueo compartido evita que cambien
+        entre abrir uno y leer el otro."""
+        archivo = open(self.ruta, 'rb')
+        estado = os.fstat(archivo.fileno())
+        if (estado.st_dev, estado.st_ino) == self._archivo and estado.st_size >= self._leido:
+            return archivo
+        if not bloqueado:
+            archivo.close()
+            with self._bloquear_log(exclusivo=False):
+                return self._abrir_log(bloqueado=True)
+        self._cargar_resumen((estado.st_dev, estado.st_ino))
+        return archivo
+
+    def _sincronizar(self, bloqueado=False):
+        """Sumar las líneas del log escritas desde la última lectura (por este u otro proceso)"""
+        try:
+            with self._abrir_log(bloqueado) as archivo:
+                archivo.seek(self._leido)
+                datos = archivo.read()
+        except FileNotFoundError:
+            self._limpiar()
+            return
+        completas = datos[:datos.rfind(b'\n') + 1]  # Una línea a medio escribir se lee la próxima vez
+        lineas = completas.splitlines()
+        try:
+            # Todo el bloque como un solo arreglo JSON: mucho más rápido al cargar un log grande
+            registros = json.loads(b'[' + b','.join(lineas) + b']')
+        except ValueError:
+            registros = None
+        if registros is None:
+            registros = []
+            for linea in lineas:
+                try:
+                    registros.append(json.loads(linea))
+                except ValueError:
+                    print(f"⚠️ Línea de analítica inválida: {linea[:80]!r}")
+        # Los eventos iguales de la misma hora se suman de una vez
+        repetidos = Counter((r.get('evento'), (r.get('momento') or '')[:13], r.get('categoria'), r.get('ubicacion'))
+                            for r in registros if isinstance(r, dict))
+        for (evento, hora, categoria, ubicacion), cantidad in repetidos.items():
+            try:
+                self._sumar(evento, hora, categoria, ubicacion, cantidad)
+            except (ValueError, TypeError):
+                print(f"⚠️ Evento de analítica inválido: {evento} {hora!r}")
+        self._leido += len(completas)
+
+    def consultar(self, desde, hasta, granularidad='dia', agrupar=None, eventos=EVENTOS):
+        """Conteos de ``desde`` a ``hasta`` (fechas, inclusive). Devuelve (periodos,
+        {evento: {grupo: [conteo por periodo]}}); sin ``agrupar`` el único grupo es 'total'."""
+        por_hora = granularidad == 'hora'
+        primero, ultimo = desde.toordinal(), hasta.toordinal()
+        periodos = []
+        for ordinal in range(primero, ultimo + 1):
+            dia = date.fromordinal(ordinal)
+            if por_hora:
+                periodos.extend(f'{dia.isoformat()}T{hora:02d}:00' for hora in range(24))
+            else:
+                periodos.append(dia.isoformat())
+        vacia = [0] * len(periodos)
+
+        with self._lock:
+            self._sincronizar()
+            # Por si la compactación que pidió registrar no llegó a correr
+            compactar = self._leido > self.max_log
+            resultado = {}
+            for evento in eventos:
+                if agrupar is None:
+                    serie = self.series.get((evento, None, None))
+                    resultado[evento] = {'total': serie.corte(primero, ultimo, por_hora) if serie else vacia}
+                    continue
+                grupos = {}
+                for (nombre, agrupacion, valor), serie in self.series.items():
+                    if nombre == evento and agrupacion == agrupar:
+                        conteos = serie.corte(primero, ultimo, por_hora)
+                        if any(conteos):
+                            etiqueta = self.nombres_ubicacion.get(valor, valor) if agrupar == 'ubicacion' else valor
+                            grupos[etiqueta] = conteos
+                resultado[evento] = grupos
+        if compactar:
+            self.compactar()
+        return periodos, resultado
+
+def rango_por_defecto(dias=30):
+    """(desde, hasta) de los últimos ``dias`` días, incluido hoy"""
+    hoy = date.today()
+    return hoy - timedelta(days=dias - 1), hoy
@@ -1,13 +1,43 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash, Response, stream_with_context, g, has_request_context
 import json
 import os
+import queue
+import time
 from datetime import datetime
 import re
-from werkzeug.security import generate_password_hash, check_password_hash
+import click
+from functools import wraps
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.security import generate_password_hash
+from almacenamiento import crear_almacenamiento, iterar_json, REFERENCIAS, TIPOS_CUENTA
+from listados import IndiceTrabajos, ORDENES, TAM_PAGINA, cumple_filtros, ordenar_trabajos
+from busqueda import IndiceBusqueda
+from recomendaciones import Recomendador, TOP_K
+from alertas import IndiceAlertas, ProgramadorVencimientos, clave_alerta, estado_lectura
+from mensajeria import CentralEventos, IndiceMensajes, clave_conversacion, clave_mensaje, marca_de
+from estadisticas import EstadisticasColeccion
+from eliminacion import PurgaDiferida, eliminar_en_cascada
+from tareas import ColaTareas
+from seguridad import LimiteIntentos, Ocupado, PoolContrasenas
+from sesiones import InterfazSesiones, SesionesMemoria, SesionesSQLite, clave_cuenta
+from cache import CacheLRU, EntradaPagina, ExtensionCache, VersionColeccion, respuesta_condicional
+import vistas
+from registros import Registro, a_json
+from analitica import AGRUPACIONES, EVENTOS, GRANULARIDADES, MAX_DIAS, RegistroAnalitica, rango_por_defecto
 
 app = Flask(__name__)
 app.secret_key = 'tu_clave_secreta_muy_segura_aqui'
 
+class ProveedorJSON(DefaultJSONProvider):
+    """jsonify también acepta los registros compactos del almacenamiento"""
+    @staticmethod
+    def default(o):
+        if isinstance(o, Registro):
+            return a_json(o)
+        return DefaultJSONProvider.default(o)
+
+app.json = ProveedorJSON(app)
+
 # Directorio de datos
 DATA_DIR = 'data'
 
@@ -15,16 +45,142 @@ DATA_DIR = 'data'
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
-# Archivos JSON para simular BD
+# Archivo de usuarios: si está vacío al arrancar se crean los datos de prueba
 USUARIOS_FILE = os.path.join(DATA_DIR, 'usuarios.json')
-EMPLEADORES_FILE = os.path.join(DATA_DIR, 'empleadores.json')
-TRABAJOS_FILE = os.path.join(DATA_DIR, 'trabajos.json')
-MENSAJES_FILE = os.path.join(DATA_DIR, 'mensajes.json')
-CALIFICACIONES_FILE = os.path.join(DATA_DIR, 'calificaciones.json')
-REPORTES_FILE = os.path.join(DATA_DIR, 'reportes.json')  # NUEVO - SISTEMA DE REPORTES
-POSTULACIONES_FILE = os.path.join(DATA_DIR, 'postulaciones.json')
-ALERTAS_FILE = os.path.join(DATA_DIR, 'alertas.json')
-TRABAJOS_ACTIVOS_FILE = os.path.join(DATA_DIR, 'trabajos_activos.json')
+
+# Motor de almacenamiento: 'json' (archivos de data/, para desarrollo) o 'sqlite'
+app.config['ALMACENAMIENTO'] = os.environ.get('ALMACENAMIENTO', 'json')
+almacen = crear_almacenamiento(app.config['ALMACENAMIENTO'], DATA_DIR)
+almacen.registrar_indice('trabajos', IndiceTrabajos())
+almacen.registrar_indice('busqueda', IndiceBusqueda())
+central_eventos = CentralEventos()
+almacen.registrar_indice('mensajes', IndiceMensajes(central_eventos))
+recomendador = Recomendador()
+almacen.registrar_indice('recomendaciones_trabajos', recomendador.trabajos)
+almacen.registrar_indice('recomendaciones_usuarios', recomendador.usuarios)
+# Contadores y últimos registros del panel de administración
+for coleccion, campo_estado in (('usuarios', None), ('empleadores', None), ('trabajos', 'estado'),
+                                ('reportes', 'estado'), ('postulaciones', 'estado')):
+    almacen.registrar_indice(f'estadisticas_{coleccion}', EstadisticasColeccion(coleccion, campo_estado))
+
+def estadisticas(coleccion):
+    """Estadísticas de la colección, al día (ver estadisticas.py)"""
+    return almacen.indice(f'estadisticas_{coleccion}')
+
+# Eliminación en cascada según REFERENCIAS (ver eliminacion.py): 'inmediata' elimina todo
+# en la misma petición; 'diferida' elimina el registro y purga sus dependientes en segundo plano
+app.config['ELIMINACION'] = os.environ.get('ELIMINACION', 'inmediata')
+purga = PurgaDiferida(almacen)
+
+def eliminar_con_dependientes(coleccion, id_registro):
+    """Eliminar el registro y todo lo que lo referencia; False si el registro no existe"""
+    if app.config['ELIMINACION'] == 'diferida':
+        return purga.eliminar(coleccion, id_registro)
+    return eliminar_en_cascada(almacen, coleccion, id_registro) is not None
+
+# Series de tiempo del administrador (ver analitica.py)
+analitica = RegistroAnalitica(os.path.join(DATA_DIR, 'analitica.log'))
+
+def anotar_evento(evento, trabajo, momento=None):
+    """Registrar un evento de analítica con la categoría y ubicación del trabajo"""
+    trabajo = trabajo or {}
+    if analitica.registrar(evento, momento, trabajo.get('categoria'), trabajo.get('ubicacion')):
+        cola_tareas.encolar('compactar_analitica')
+
+# Trabajo lento fuera de la petición (ver tareas.py); los hilos arrancan con la primera tarea
+cola_tareas = ColaTareas(almacen)
+
+@cola_tareas.tarea('eliminar_con_dependientes')
+def tarea_eliminar(coleccion, id_registro):
+    eliminado = eliminar_con_dependientes(coleccion, id_registro)
+    if coleccion in TIPOS_CUENTA:
+        olvidar_cuenta(TIPOS_CUENTA[coleccion], id_registro)
+    return {'eliminado': eliminado}
+
+@cola_tareas.tarea('reconstruir_analitica')
+def tarea_reconstruir_analitica():
+    return {'eventos': reconstruir_analitica()}
+
+@cola_tareas.tarea('compactar_analitica')
+def tarea_compactar_analitica():
+    return {'bytes': analitica.compactar()}
+
+# Sesiones en el servidor (ver sesiones.py): 'memoria' (por defecto, en cada proceso)
+# o 'sqlite' (data/sesiones.db, compartida entre workers)
+app.config['SESIONES'] = os.environ.get('SESIONES', 'memoria')
+if app.config['SESIONES'] == 'sqlite':
+    app.session_interface = InterfazSesiones(SesionesSQLite(os.path.join(DATA_DIR, 'sesiones.db')))
+else:
+    app.session_interface = InterfazSesiones(SesionesMemoria())
+
+# Segundos que se usa la cuenta guardada en la sesión antes de volver a leerla
+app.config['CACHE_CUENTA'] = 300
+COLECCION_CUENTA = {tipo: coleccion for coleccion, tipo in TIPOS_CUENTA.items()}
+
+def cuenta_actual():
+    """Registro (sin contraseña) de la cuenta con la sesión iniciada, o None si ya no existe.
+    Se toma de la sesión mientras no venza; si no, se lee una vez y se guarda en ella."""
+    if 'cuenta' in g:
+        return g.cuenta
+    clave = clave_cuenta(session)
+    cache = session.cuenta_en_cache
+    if cache and cache['clave'] == clave and cache['vence'] > time.time():
+        g.cuenta = cache['registro']
+        return g.cuenta
+    
+    registro = almacen.obtener(COLECCION_CUENTA[session['user_type']], session['user_id'])
+    g.cuenta = {k: v for k, v in registro.items() if k != 'password'} if registro else None
+    session.cuenta_en_cache = None
+    if g.cuenta:
+        session.cuenta_en_cache = {'clave': clave, 'registro': g.cuenta,
+                                   'vence': time.time() + app.config['CACHE_CUENTA']}
+    session.modified = True
+    return g.cuenta
+
+def olvidar_cuenta(tipo, id_cuenta):
+    """Descartar la cuenta en caché de todas sus sesiones (tras editarla o eliminarla)"""
+    clave = f'{tipo}:{id_cuenta}'
+    app.session_interface.backend.olvidar_cuenta(clave)
+    if has_request_context() and clave_cuenta(session) == clave:
+        session.cuenta_en_cache = None
+        g.pop('cuenta', None)
+
+# Versiones de los datos para las cachés de páginas y fragmentos (ver cache.py), con
+# contadores por id en las colecciones cuyos registros se muestran en fragmentos
+for coleccion, campos in (('trabajos', ('id',)), ('empleadores', ()), ('usuarios', ('id',)),
+                          ('trabajos_activos', ('id',)), ('alertas', ('id',))):
+    almacen.registrar_indice(f'version_{coleccion}', VersionColeccion(coleccion, campos))
+
+def version_datos(coleccion, **filtro):
+    """Versión actual de la colección o de sus registros con ``campo=valor``"""
+    return almacen.indice(f'version_{coleccion}').de(**filtro)
+
+# Páginas públicas renderizadas, por ruta + parámetros + versión de los datos
+cache_paginas = CacheLRU()
+
+def cache_publica(*colecciones):
+    """Decorador para páginas públicas: a un visitante sin sesión se le sirve la página
+    guardada mientras no cambie ninguna de ``colecciones``, con ETag y Last-Modified
+    para que el navegador reciba 304 si ya la tiene."""
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            if session:
+                # Con sesión la página lleva el nombre de la cuenta y los mensajes flash
+                return vista(*args, **kwargs)
+            versiones = [almacen.indice(f'version_{coleccion}') for coleccion in colecciones]
+            version = tuple(v.version for v in versiones)
+            clave = (request.endpoint, tuple(sorted(request.args.items(multi=True))))
+            entrada = cache_paginas.obtener(clave, version)
+            if entrada is None:
+                respuesta = app.make_response(vista(*args, **kwargs))
+                if respuesta.status_code != 200:
+                    return respuesta
+                entrada = cache_paginas.guardar(clave, version, EntradaPagina(
+                    respuesta.get_data(), max(v.modificado for v in versiones), respuesta.content_type))
+            return respuesta_condicional(entrada, request)
+        return envoltura
+    return decorador
 
 # ===== FUNCIONES HELPER PARA JINJA2 =====
 def none_containing(seq, value):
@@ -36,57 +192,24 @@ def none_containing(seq, value):
 # Registra la función en Jinja2
 app.jinja_env.filters['none_containing'] = none_containing
 
+# {% cache clave, dependencias %} para las partes caras de los dashboards, con
+# version('colección', id=...) como dependencia (ver cache.py)
+app.jinja_env.add_extension(ExtensionCache)
+app.jinja_env.globals['version'] = version_datos
+
 # ===== FUNCIONES DE LIMPIEZA AUTOMÁTICA =====
-def limpiar_alertas_expiradas():
-    """Eliminar alertas expiradas automáticamente"""
-    alertas = leer_json(ALERTAS_FILE)
-    alertas_actualizadas = []
-    
-    for alerta in alertas:
-        # Si tiene fecha de expiración y ya pasó, no incluirla
-        if alerta.get('fecha_expiracion'):
-            try:
-                fecha_expiracion = datetime.fromisoformat(alerta['fecha_expiracion'])
-                if fecha_expiracion < datetime.now():
-                    continue  # Saltar esta alerta expirada
-            except (ValueError, KeyError):
-                # Si hay error en la fecha, mantener la alerta
-                pass
-        
-        alertas_actualizadas.append(alerta)
-    
-    if len(alertas_actualizadas) != len(alertas):
-        escribir_json(ALERTAS_FILE, alertas_actualizadas)
-        print(f"✅ Alertas expiradas limpiadas: {len(alertas) - len(alertas_actualizadas)} eliminadas")
-
-# Funciones para manejar JSON
-def leer_json(archivo):
-    try:
-        if not os.path.exists(archivo):
-            print(f"DEBUG: Archivo {archivo} no existe, retornando lista vacía")
-            return []
-        
-        with open(archivo, 'r', encoding='utf-8') as f:
-            contenido = f.read().strip()
-            if not contenido:
-                print(f"DEBUG: Archivo {archivo} está vacío")
-                return []
-            
-            datos = json.loads(contenido)
-            print(f"DEBUG: Archivo {archivo} leído exitosamente, {len(datos)} registros")
-            return datos
-            
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        print(f"DEBUG: Error leyendo {archivo}: {e}")
-        return []
+def vencer_alerta(alerta_id):
+    """Eliminar una alerta expirada (lo llama el programador, fuera de las peticiones)"""
+    almacen.eliminar('alertas', alerta_id)
+    print(f"✅ Alerta expirada eliminada: {alerta_id}")
 
-def obtener_usuario_por_id(user_id):
-    usuarios = leer_json(USUARIOS_FILE)
-    return next((u for u in usuarios if u['id'] == user_id), None)
+# Las alertas con fecha de expiración se eliminan a su hora desde un hilo aparte,
+# que arranca la primera vez que se carga el índice de alertas
+programador_alertas = ProgramadorVencimientos(vencer_alerta, sincronizar=lambda: almacen.indice('alertas'))
+almacen.registrar_indice('alertas', IndiceAlertas(programador_alertas))
 
-def escribir_json(archivo, datos):
-    with open(archivo, 'w', encoding='utf-8') as f:
-        json.dump(datos, f, ensure_ascii=False, indent=2)
+def obtener_usuario_por_id(user_id):
+    return almacen.obtener('usuarios', user_id)
 
 def crear_datos_prueba():
     """Crear datos de prueba automáticamente"""
@@ -243,41 +366,158 @@ def crear_datos_prueba():
     ]
 
     # Escribir datos de prueba
-    escribir_json(USUARIOS_FILE, usuarios_prueba)
-    escribir_json(EMPLEADORES_FILE, empleadores_prueba)
-    escribir_json(TRABAJOS_FILE, trabajos_prueba)
-    escribir_json(TRABAJOS_ACTIVOS_FILE, trabajos_activos_prueba)
-    
-    # Crear archivos vacíos para los demás datos
-    escribir_json(MENSAJES_FILE, [])
-    escribir_json(CALIFICACIONES_FILE, [])
-    escribir_json(REPORTES_FILE, [])
-    escribir_json(POSTULACIONES_FILE, [])
-    escribir_json(ALERTAS_FILE, [])
+    almacen.reemplazar('usuarios', usuarios_prueba)
+    almacen.reemplazar('empleadores', empleadores_prueba)
+    almacen.reemplazar('trabajos', trabajos_prueba)
+    almacen.reemplazar('trabajos_activos', trabajos_activos_prueba)
+    
+    # Vaciar las demás colecciones
+    almacen.reemplazar('mensajes', [])
+    almacen.reemplazar('lecturas', [])
+    almacen.reemplazar('calificaciones', [])
+    almacen.reemplazar('reportes', [])
+    almacen.reemplazar('postulaciones', [])
+    almacen.reemplazar('alertas', [])
+    almacen.reemplazar('alertas_leidas', [])
+    almacen.reemplazar('eliminaciones', [])
+    almacen.reemplazar('tareas', [])
     
     print("✅ Datos de prueba creados exitosamente!")
 
 def inicializar_archivos():
-    archivos = {
-        USUARIOS_FILE: [],
-        EMPLEADORES_FILE: [],
-        TRABAJOS_FILE: [],
-        MENSAJES_FILE: [],
-        CALIFICACIONES_FILE: [],
-        REPORTES_FILE: [],  # NUEVO - SISTEMA DE REPORTES
-        POSTULACIONES_FILE: [],
-        ALERTAS_FILE: [],
-        TRABAJOS_ACTIVOS_FILE: []
-    }
+    # Crea los archivos JSON o las tablas SQLite que falten
+    almacen.inicializar()
     
-    for archivo, datos in archivos.items():
-        if not os.path.exists(archivo):
-            with open(archivo, 'w', encoding='utf-8') as f:
-                json.dump(datos, f, ensure_ascii=False, indent=2)
+    # Retomar las purgas que quedaron pendientes
+    if app.config['ELIMINACION'] == 'diferida':
+        purga.iniciar()
     
-    if os.path.getsize(USUARIOS_FILE) == 0:
+    if app.config['ALMACENAMIENTO'] == 'json' and os.path.getsize(USUARIOS_FILE) == 0:
         crear_datos_prueba()
 
+@app.before_request
+def iniciar_cola_tareas():
+    # Los hilos de la cola corren solo en los procesos que atienden peticiones (no al
+    # importar app ni en los comandos flask); tras la primera petición no hace nada
+    cola_tareas.iniciar()
+
+# ===== MIGRACIÓN DE DATOS ENTRE MOTORES =====
+# Primero las colecciones a las que apuntan las demás
+ORDEN_MIGRACION = ['usuarios', 'empleadores', 'trabajos', 'postulaciones', 'trabajos_activos',
+                   'mensajes', 'lecturas', 'calificaciones', 'reportes', 'alertas', 'alertas_leidas',
+                   'eliminaciones', 'tareas']
+
+def migrar_datos(destino, tam_lote=500, directorio=DATA_DIR):
+    """Copiar data/*.json a ``destino`` por lotes, leyendo cada archivo de forma incremental.
+    Reemplaza por id, así que se puede repetir mientras la aplicación sigue en JSON
+    y hacer una última pasada justo antes de cambiar de motor."""
+    # Los .json son instantáneas: lo escrito desde la última compactación solo está en
+    # data/operaciones.log. Compactar (con todas las colecciones bloqueadas) lo vuelca.
+    crear_almacenamiento('json', directorio).compactar()
+    destino.inicializar()
+    totales = {}
+    
+    for coleccion in ORDEN_MIGRACION:
+        archivo = os.path.join(directorio, f'{coleccion}.json')
+        if not os.path.exists(archivo):
+            print(f"⚠️ {archivo} no existe, se omite")
+            totales[coleccion] = 0
+            continue
+        
+        inicio = time.perf_counter()
+        lote, filas = [], 0
+        for registro in iterar_json(archivo):
+            lote.append(registro)
+            if len(lote) >= tam_lote:
+                destino.guardar_lote(coleccion, lote)
+                filas += len(lote)
+                lote = []
+        if lote:
+            destino.guardar_lote(coleccion, lote)
+            filas += len(lote)
+        
+        segundos = time.perf_counter() - inicio
+        velocidad = filas / segundos if segundos > 0 else filas
+        print(f"✅ {coleccion}: {filas} registros en {segundos:.2f}s ({velocidad:.0f} filas/s)")
+        totales[coleccion] = filas
+    
+    return totales
+
+def verificar_migracion(destino, totales):
+    """Comparar conteos con los archivos de origen y revisar referencias entre colecciones"""
+    correcto = True
+    
+    for coleccion, filas in totales.items():
+        en_destino = destino.contar(coleccion)
+        if en_destino != filas:
+            print(f"⚠️ {coleccion}: {filas} registros en el archivo, {en_destino} en destino (¿ids duplicados?)")
+            correcto = False
+    
+    for coleccion, campo, destinos in REFERENCIAS:
+        rotas = destino.referencias_rotas(coleccion, campo, destinos)
+        if rotas:
+            print(f"⚠️ {coleccion}.{campo}: {rotas} registros apuntan a {'/'.join(destinos)} inexistentes")
+            correcto = False
+    
+    if correcto:
+        print("✅ Verificación completa: conteos e integridad referencial correctos")
+    return correcto
+
+@app.cli.command('migrar-datos')
+@click.option('--lote', default=500, show_default=True, help='Registros por transacción')
+def migrar_datos_command(lote):
+    """Importar data/*.json a la base SQLite (data/empleos.db)."""
+    destino = crear_almacenamiento('sqlite', DATA_DIR)
+    totales = migrar_datos(destino, lote)
+    if not verificar_migracion(destino, totales):
+        raise SystemExit(1)
+
+@app.cli.command('exportar-datos')
+def exportar_datos_command():
+    """Exportar la base SQLite (data/empleos.db) a data/*.json."""
+    origen = crear_almacenamiento('sqlite', DATA_DIR)
+    destino = crear_almacenamiento('json', DATA_DIR)
+    for coleccion in ORDEN_MIGRACION:
+        registros = origen.todos(coleccion)
+        destino.reemplazar(coleccion, registros)
+        print(f"✅ {coleccion}: {len(registros)} registros exportados")
+    # Los reemplazos quedan en el diario: compactar para que data/*.json sean la copia completa
+    destino.compactar()
+
+def eventos_analitica():
+    """Eventos de analítica deducidos de trabajos, postulaciones y calificaciones, por fecha"""
+    trabajos = {t['id']: t for t in almacen.todos('trabajos')}
+    trabajos_activos = {t['id']: t for t in almacen.todos('trabajos_activos')}
+    eventos = []
+    for trabajo in trabajos.values():
+        if trabajo.get('fecha_publicacion'):
+            eventos.append(('publicacion', trabajo['fecha_publicacion'], trabajo.get('categoria'), trabajo.get('ubicacion')))
+    for postulacion in almacen.todos('postulaciones'):
+        trabajo = trabajos.get(postulacion['trabajo_id'], {})
+        if postulacion.get('fecha_postulacion'):
+            eventos.append(('postulacion', postulacion['fecha_postulacion'], trabajo.get('categoria'), trabajo.get('ubicacion')))
+        if postulacion.get('estado') in ('aceptado', 'rechazado') and postulacion.get('fecha_respuesta'):
+            evento = 'aceptacion' if postulacion['estado'] == 'aceptado' else 'rechazo'
+            eventos.append((evento, postulacion['fecha_respuesta'], trabajo.get('categoria'), trabajo.get('ubicacion')))
+    for calificacion in almacen.todos('calificaciones'):
+        trabajo_activo = trabajos_activos.get(calificacion['trabajo_activo_id'], {})
+        trabajo = trabajos.get(trabajo_activo.get('trabajo_id'), trabajo_activo)
+        if calificacion.get('fecha_calificacion'):
+            eventos.append(('calificacion', calificacion['fecha_calificacion'], trabajo.get('categoria'), trabajo.get('ubicacion')))
+    eventos.sort(key=lambda e: e[1])
+    return eventos
+
+def reconstruir_analitica():
+    """Regenerar data/analitica.log a partir de los datos; devuelve el número de eventos"""
+    total = analitica.reconstruir(eventos_analitica)
+    print(f"✅ Analítica reconstruida: {total} eventos")
+    return total
+
+@app.cli.command('reconstruir-analitica')
+def reconstruir_analitica_command():
+    """Regenerar data/analitica.log a partir de trabajos, postulaciones y calificaciones."""
+    reconstruir_analitica()
+
 # Validaciones
 def validar_codigo_estudiante(codigo):
     patron = r'^\d{3}\.\d{4}\.\d{3}$'
@@ -304,9 +544,9 @@ def validar_pago(pago):
 
 # Rutas principales
 @app.route('/')
+@cache_publica('trabajos')
 def index():
-    trabajos = leer_json(TRABAJOS_FILE)
-    trabajos_disponibles = [t for t in trabajos if t.get('estado') == 'disponible']
+    trabajos_disponibles = almacen.buscar('trabajos', estado='disponible')
     return render_template('index.html', trabajos=trabajos_disponibles[:3])
 
 @app.route('/login')
@@ -347,21 +587,56 @@ def debug_session():
 # ===== RUTAS DE TRABAJOS PÚBLICOS =====
 
 @app.route('/trabajos')
+@cache_publica('trabajos', 'empleadores')
 def ver_trabajos():
-    trabajos = leer_json(TRABAJOS_FILE)
-    trabajos_disponibles = [t for t in trabajos if t.get('estado') == 'disponible']
-    categorias = list(set(t['categoria'] for t in trabajos_disponibles))
-    
+    consulta = request.args.get('q', '').strip()
     categoria_filtro = request.args.get('categoria', '')
-    if categoria_filtro:
-        trabajos_filtrados = [t for t in trabajos_disponibles if t['categoria'] == categoria_filtro]
+    ubicacion_filtro = request.args.get('ubicacion', '').strip()
+    pago_min = request.args.get('pago_min', type=float)
+    pago_max = request.args.get('pago_max', type=float)
+    orden = request.args.get('orden') or ('relevancia' if consulta else 'recientes')
+    if orden not in ORDENES and not (orden == 'relevancia' and consulta):
+        orden = 'recientes'
+    pagina = max(request.args.get('pagina', 1, type=int), 1)
+    
+    indice = almacen.indice('trabajos')
+    categorias, ubicaciones = indice.opciones('disponible')
+    
+    if consulta:
+        # Búsqueda de texto: solo se puntúan los trabajos que contienen los términos
+        def cumple(trabajo):
+            return cumple_filtros(trabajo, categoria_filtro, ubicacion_filtro, pago_min, pago_max)
+        
+        busqueda = almacen.indice('busqueda')
+        if orden == 'relevancia':
+            resultados, total = busqueda.buscar(consulta, cumple, limite=pagina * TAM_PAGINA)
+        else:
+            resultados, total = busqueda.buscar(consulta, cumple)
+            resultados = ordenar_trabajos(resultados, orden)
+        trabajos_pagina = resultados[(pagina - 1) * TAM_PAGINA:pagina * TAM_PAGINA]
     else:
-        trabajos_filtrados = trabajos_disponibles
+        # Solo se trae la página pedida; el índice ya está agrupado y ordenado
+        trabajos_pagina, total = indice.pagina('disponible', categoria_filtro, ubicacion_filtro,
+                                               pago_min, pago_max, orden, pagina)
+    total_paginas = max((total + TAM_PAGINA - 1) // TAM_PAGINA, 1)
+    
+    # Empresas solo de los trabajos de esta página
+    empleadores = [almacen.obtener('empleadores', emp_id) for emp_id in {t['empleador_id'] for t in trabajos_pagina}]
+    
+    # Filtros activos (sin categoría ni página) para mantenerlos en los enlaces
+    filtros = {clave: valor for clave, valor in request.args.items()
+               if clave in ('q', 'ubicacion', 'pago_min', 'pago_max', 'orden') and valor}
     
     return render_template('trabajos.html', 
-                         trabajos=trabajos_filtrados, 
+                         trabajos=trabajos_pagina, 
                          categorias=categorias, 
-                         categoria_actual=categoria_filtro)
+                         categoria_actual=categoria_filtro,
+                         ubicaciones=ubicaciones,
+                         empleadores=[e for e in empleadores if e],
+                         filtros=filtros,
+                         total=total,
+                         pagina=pagina,
+                         total_paginas=total_paginas)
 
 @app.route('/trabajo/<trabajo_id>/aplicar', methods=['POST'])
 def aplicar_trabajo(trabajo_id):
@@ -370,16 +645,14 @@ def aplicar_trabajo(trabajo_id):
         return redirect(url_for('login_usuario'))
     
     try:
-        trabajos = leer_json(TRABAJOS_FILE)
-        trabajo = next((t for t in trabajos if t['id'] == trabajo_id), None)
+        trabajo = almacen.obtener('trabajos', trabajo_id)
         
         if not trabajo:
             flash('Trabajo no encontrado', 'error')
             return redirect(url_for('ver_trabajos'))
         
         # Verificar si ya aplicó
-        postulaciones = leer_json(POSTULACIONES_FILE)
-        ya_aplico = any(p['usuario_id'] == session['user_id'] and p['trabajo_id'] == trabajo_id for p in postulaciones)
+        ya_aplico = almacen.contar('postulaciones', usuario_id=session['user_id'], trabajo_id=trabajo_id) > 0
         
         if ya_aplico:
             flash('Ya has aplicado a este trabajo', 'error')
@@ -387,7 +660,7 @@ def aplicar_trabajo(trabajo_id):
         
         # Crear postulación
         postulacion = {
-            'id': str(len(postulaciones) + 1),
+            'id': almacen.siguiente_id('postulaciones'),
             'trabajo_id': trabajo_id,
             'usuario_id': session['user_id'],
             'empleador_id': trabajo['empleador_id'],
@@ -396,8 +669,8 @@ def aplicar_trabajo(trabajo_id):
             'mensaje': request.form.get('mensaje', '')
         }
         
-        postulaciones.append(postulacion)
-        escribir_json(POSTULACIONES_FILE, postulaciones)
+        almacen.insertar('postulaciones', postulacion)
+        anotar_evento('postulacion', trabajo, postulacion['fecha_postulacion'])
         
         flash(f'¡Has aplicado al trabajo: {trabajo["titulo"]}!', 'success')
         return redirect(url_for('ver_trabajos'))
@@ -414,25 +687,22 @@ def ver_postulaciones(trabajo_id):
         return redirect(url_for('login_empleador'))
     
     try:
-        trabajos = leer_json(TRABAJOS_FILE)
-        trabajo = next((t for t in trabajos if t['id'] == trabajo_id and t['empleador_id'] == session['user_id']), None)
+        trabajo = almacen.obtener('trabajos', trabajo_id)
+        if trabajo and trabajo['empleador_id'] != session['user_id']:
+            trabajo = None
         
         if not trabajo:
             flash('Trabajo no encontrado o no tienes permisos', 'error')
             return redirect(url_for('dashboard_empleador'))
         
-        postulaciones = leer_json(POSTULACIONES_FILE)
-        usuarios = leer_json(USUARIOS_FILE)
-        
         # Obtener postulaciones para este trabajo con info de usuarios
         postulaciones_trabajo = []
-        for postulacion in postulaciones:
-            if postulacion['trabajo_id'] == trabajo_id:
-                usuario = next((u for u in usuarios if u['id'] == postulacion['usuario_id']), None)
-                if usuario:
-                    postulacion_con_info = postulacion.copy()
-                    postulacion_con_info['usuario_info'] = usuario
-                    postulaciones_trabajo.append(postulacion_con_info)
+        for postulacion in almacen.buscar('postulaciones', trabajo_id=trabajo_id):
+            usuario = almacen.obtener('usuarios', postulacion['usuario_id'])
+            if usuario:
+                postulacion_con_info = postulacion.copy()
+                postulacion_con_info['usuario_info'] = usuario
+                postulaciones_trabajo.append(postulacion_con_info)
         
         return render_template('ver_postulaciones.html', 
                              trabajo=trabajo, 
@@ -442,22 +712,70 @@ def ver_postulaciones(trabajo_id):
         flash('Error al cargar las postulaciones', 'error')
         return redirect(url_for('dashboard_empleador'))
 
+def responder_postulacion(tx, postulacion_id, trabajo_id, accion, empleador_id, id_activo=None):
+    """Acepta o rechaza una postulación dentro de la transacción ``tx``.
+
+    Relee la postulación y el trabajo: si otra petición los cambia antes de confirmar,
+    ``en_transaccion`` la repite con los datos nuevos. ``id_activo`` es el id del trabajo
+    activo que se crea al aceptar; se reserva antes para no gastar uno por reintento.
+    Devuelve 'ok', 'procesada' o 'no_existe'.
+    """
+    postulacion = tx.obtener('postulaciones', postulacion_id)
+    trabajo = tx.obtener('trabajos', trabajo_id)
+    if not postulacion or not trabajo:
+        return 'no_existe'
+    # Ya respondida (otra pestaña o un reintento tras un conflicto), o el
+    # trabajo ya se le dio a otro postulante
+    if postulacion['estado'] != 'pendiente':
+        return 'procesada'
+    if accion == 'aceptar' and trabajo['estado'] != 'disponible':
+        return 'procesada'
+    
+    # Si se acepta, crear trabajo activo
+    if accion == 'aceptar':
+        trabajo_activo = {
+            'id': id_activo,
+            'postulacion_id': postulacion_id,
+            'trabajo_id': trabajo['id'],
+            'usuario_id': postulacion['usuario_id'],
+            'empleador_id': empleador_id,
+            'titulo': trabajo['titulo'],
+            'descripcion': trabajo['descripcion'],
+            'pago': trabajo['pago'],
+            'horario_trabajo': trabajo['horario'],
+            'ubicacion': trabajo['ubicacion'],
+            'estado': 'activo',  # activo, finalizado, cancelado
+            'fecha_inicio': datetime.now().isoformat(),
+            'fecha_finalizacion': None
+        }
+        
+        tx.insertar('trabajos_activos', trabajo_activo)
+        
+        # Actualizar estado del trabajo a "ocupado"
+        tx.actualizar('trabajos', trabajo['id'], {'estado': 'ocupado'})
+    
+    tx.actualizar('postulaciones', postulacion_id, {
+        'estado': 'aceptado' if accion == 'aceptar' else 'rechazado',
+        'fecha_respuesta': datetime.now().isoformat()
+    })
+    return 'ok'
+
 @app.route('/empleador/postulacion/<postulacion_id>/<accion>')
 def gestionar_postulacion(postulacion_id, accion):
     if 'user_id' not in session or session['user_type'] != 'empleador':
         return redirect(url_for('login_empleador'))
     
     try:
-        postulaciones = leer_json(POSTULACIONES_FILE)
-        postulacion = next((p for p in postulaciones if p['id'] == postulacion_id), None)
+        postulacion = almacen.obtener('postulaciones', postulacion_id)
         
         if not postulacion:
             flash('Postulación no encontrada', 'error')
             return redirect(url_for('dashboard_empleador'))
         
         # Verificar que el empleador es dueño del trabajo
-        trabajos = leer_json(TRABAJOS_FILE)
-        trabajo = next((t for t in trabajos if t['id'] == postulacion['trabajo_id'] and t['empleador_id'] == session['user_id']), None)
+        trabajo = almacen.obtener('trabajos', postulacion['trabajo_id'])
+        if trabajo and trabajo['empleador_id'] != session['user_id']:
+            trabajo = None
         
         if not trabajo:
             flash('No tienes permisos para gestionar esta postulación', 'error')
@@ -465,45 +783,17 @@ def gestionar_postulacion(postulacion_id, accion):
         
         # Actualizar estado
         if accion in ['aceptar', 'rechazar']:
-            for i, p in enumerate(postulaciones):
-                if p['id'] == postulacion_id:
-                    postulaciones[i]['estado'] = 'aceptado' if accion == 'aceptar' else 'rechazado'
-                    postulaciones[i]['fecha_respuesta'] = datetime.now().isoformat()
-                    
-                    # Si se acepta, crear trabajo activo
-                    if accion == 'aceptar':
-                        trabajos_activos = leer_json(TRABAJOS_ACTIVOS_FILE)
-                        
-                        trabajo_activo = {
-                            'id': str(len(trabajos_activos) + 1),
-                            'postulacion_id': postulacion_id,
-                            'trabajo_id': trabajo['id'],
-                            'usuario_id': postulacion['usuario_id'],
-                            'empleador_id': session['user_id'],
-                            'titulo': trabajo['titulo'],
-                            'descripcion': trabajo['descripcion'],
-                            'pago': trabajo['pago'],
-                            'horario_trabajo': trabajo['horario'],
-                            'ubicacion': trabajo['ubicacion'],
-                            'estado': 'activo',  # activo, finalizado, cancelado
-                            'fecha_inicio': datetime.now().isoformat(),
-                            'fecha_finalizacion': None
-                        }
-                        
-                        trabajos_activos.append(trabajo_activo)
-                        escribir_json(TRABAJOS_ACTIVOS_FILE, trabajos_activos)
-                        
-                        # Actualizar estado del trabajo a "ocupado"
-                        for j, t in enumerate(trabajos):
-                            if t['id'] == trabajo['id']:
-                                trabajos[j]['estado'] = 'ocupado'
-                                break
-                        
-                        escribir_json(TRABAJOS_FILE, trabajos)
-                    
-                    break
-            
-            escribir_json(POSTULACIONES_FILE, postulaciones)
+            id_activo = almacen.siguiente_id('trabajos_activos') if accion == 'aceptar' else None
+            resultado = almacen.en_transaccion(
+                lambda tx: responder_postulacion(tx, postulacion_id, trabajo['id'], accion,
+                                                 session['user_id'], id_activo))
+            if resultado == 'no_existe':
+                flash('La postulación ya no existe', 'error')
+                return redirect(url_for('dashboard_empleador'))
+            if resultado == 'procesada':
+                flash('Esta postulación ya fue procesada o el trabajo ya no está disponible', 'error')
+                return redirect(url_for('ver_postulaciones', trabajo_id=postulacion['trabajo_id']))
+            anotar_evento('aceptacion' if accion == 'aceptar' else 'rechazo', trabajo)
             
             if accion == 'aceptar':
                 flash('Postulación aceptada exitosamente. El trabajo ahora está activo.', 'success')
@@ -524,8 +814,9 @@ def editar_trabajo(trabajo_id):
         return redirect(url_for('login_empleador'))
     
     try:
-        trabajos = leer_json(TRABAJOS_FILE)
-        trabajo = next((t for t in trabajos if t['id'] == trabajo_id and t['empleador_id'] == session['user_id']), None)
+        trabajo = almacen.obtener('trabajos', trabajo_id)
+        if trabajo and trabajo['empleador_id'] != session['user_id']:
+            trabajo = None
         
         if not trabajo:
             flash('Trabajo no encontrado o no tienes permisos', 'error')
@@ -537,23 +828,17 @@ def editar_trabajo(trabajo_id):
                 flash('El pago debe ser un número positivo', 'error')
                 return render_template('editar_trabajo.html', trabajo=trabajo)
             
-            # Actualizar datos del trabajo
-            trabajo['titulo'] = request.form['titulo']
-            trabajo['descripcion'] = request.form['descripcion']
-            trabajo['categoria'] = request.form['categoria']
-            trabajo['pago'] = request.form['pago']
-            trabajo['horario'] = request.form['horario']
-            trabajo['ubicacion'] = request.form['ubicacion']
-            trabajo['requisitos'] = request.form['requisitos']
-            trabajo['estado'] = request.form['estado']
-            
             # Guardar cambios
-            for i, t in enumerate(trabajos):
-                if t['id'] == trabajo_id:
-                    trabajos[i] = trabajo
-                    break
-            
-            escribir_json(TRABAJOS_FILE, trabajos)
+            almacen.actualizar('trabajos', trabajo_id, {
+                'titulo': request.form['titulo'],
+                'descripcion': request.form['descripcion'],
+                'categoria': request.form['categoria'],
+                'pago': request.form['pago'],
+                'horario': request.form['horario'],
+                'ubicacion': request.form['ubicacion'],
+                'requisitos': request.form['requisitos'],
+                'estado': request.form['estado']
+            })
             flash('Trabajo actualizado exitosamente', 'success')
             return redirect(url_for('dashboard_empleador'))
         
@@ -569,21 +854,16 @@ def eliminar_trabajo(trabajo_id):
         return redirect(url_for('login_empleador'))
     
     try:
-        trabajos = leer_json(TRABAJOS_FILE)
-        trabajo = next((t for t in trabajos if t['id'] == trabajo_id and t['empleador_id'] == session['user_id']), None)
+        trabajo = almacen.obtener('trabajos', trabajo_id)
+        if trabajo and trabajo['empleador_id'] != session['user_id']:
+            trabajo = None
         
         if not trabajo:
             flash('Trabajo no encontrado o no tienes permisos', 'error')
             return redirect(url_for('dashboard_empleador'))
         
-        # Eliminar trabajo
-        trabajos = [t for t in trabajos if t['id'] != trabajo_id]
-        escribir_json(TRABAJOS_FILE, trabajos)
-        
-        # También eliminar postulaciones relacionadas
-        postulaciones = leer_json(POSTULACIONES_FILE)
-        postulaciones = [p for p in postulaciones if p['trabajo_id'] != trabajo_id]
-        escribir_json(POSTULACIONES_FILE, postulaciones)
+        # Con sus postulaciones, trabajos activos y calificaciones (ver REFERENCIAS)
+        eliminar_con_dependientes('trabajos', trabajo_id)
         
         flash('Trabajo eliminado exitosamente', 'success')
         return redirect(url_for('dashboard_empleador'))
@@ -600,18 +880,14 @@ def empleador_trabajos_activos():
         return redirect(url_for('login_empleador'))
     
     try:
-        trabajos_activos = leer_json(TRABAJOS_ACTIVOS_FILE)
-        usuarios = leer_json(USUARIOS_FILE)
-        
-        # Filtrar trabajos activos del empleador
+        # Trabajos activos del empleador con info del estudiante
         trabajos_activos_empleador = []
-        for trabajo in trabajos_activos:
-            if trabajo['empleador_id'] == session['user_id']:
-                usuario_info = next((u for u in usuarios if u['id'] == trabajo['usuario_id']), None)
-                if usuario_info:
-                    trabajo_con_info = trabajo.copy()
-                    trabajo_con_info['usuario_info'] = usuario_info
-                    trabajos_activos_empleador.append(trabajo_con_info)
+        for trabajo in almacen.buscar('trabajos_activos', empleador_id=session['user_id']):
+            usuario_info = almacen.obtener('usuarios', trabajo['usuario_id'])
+            if usuario_info:
+                trabajo_con_info = trabajo.copy()
+                trabajo_con_info['usuario_info'] = usuario_info
+                trabajos_activos_empleador.append(trabajo_con_info)
         
         # Separar por estado
         trabajos_activos_list = [t for t in trabajos_activos_empleador if t['estado'] == 'activo']
@@ -625,6 +901,32 @@ def empleador_trabajos_activos():
         flash('Error al cargar los trabajos activos', 'error')
         return redirect(url_for('dashboard_empleador'))
 
+# Límites de inicio de sesión (ver seguridad.py): por IP 20 intentos seguidos y luego uno
+# cada 6 segundos; por cuenta 5 seguidos y luego uno por minuto
+limite_ip = LimiteIntentos('ip', capacidad=20, periodo=6)
+limite_cuenta = LimiteIntentos('cuenta', capacidad=5, periodo=60)
+pool_contrasenas = PoolContrasenas()
+
+def autenticar(coleccion, email, password):
+    """(cuenta, None, 200) si el email y la contraseña son correctos; si no (None, mensaje de
+    error, código HTTP). Cada intento gasta uno de la IP y otro de la cuenta antes de
+    calcular ningún hash."""
+    email = email.strip()
+    clave_cuenta = f'{coleccion}:{email.casefold()}'
+    espera = max(limite_ip.intentar(request.remote_addr), limite_cuenta.intentar(clave_cuenta))
+    if espera:
+        return None, f'Demasiados intentos. Espera {int(espera) + 1} segundos e inténtalo de nuevo', 429
+    
+    try:
+        # Búsqueda por el índice de email: solo se revisan las cuentas con ese email
+        cuenta = pool_contrasenas.verificar(almacen.buscar(coleccion, email=email), password)
+    except Ocupado:
+        return None, 'El servidor está ocupado, inténtalo de nuevo en unos segundos', 503
+    if not cuenta:
+        return None, 'Credenciales incorrectas', 200
+    limite_cuenta.reiniciar(clave_cuenta)
+    return cuenta, None, 200
+
 # Login y registro de Usuarios
 @app.route('/login/usuario', methods=['GET', 'POST'])
 def login_usuario():
@@ -633,16 +935,16 @@ def login_usuario():
         password = request.form['password']
         
         try:
-            usuarios = leer_json(USUARIOS_FILE)
-            for usuario in usuarios:
-                if usuario['email'] == email and check_password_hash(usuario['password'], password):
-                    session['user_id'] = usuario['id']
-                    session['user_type'] = 'usuario'
-                    session['user_name'] = usuario['nombres']
-                    flash(f'Bienvenido {usuario["nombres"]}!', 'success')
-                    return redirect(url_for('dashboard_usuario'))
+            usuario, error, codigo = autenticar('usuarios', email, password)
+            if usuario:
+                session['user_id'] = usuario['id']
+                session['user_type'] = 'usuario'
+                session['user_name'] = usuario['nombres']
+                flash(f'Bienvenido {usuario["nombres"]}!', 'success')
+                return redirect(url_for('dashboard_usuario'))
             
-            flash('Credenciales incorrectas', 'error')
+            flash(error, 'error')
+            return render_template('login_usuario.html'), codigo
         
         except Exception as e:
             flash('Error al iniciar sesión', 'error')
@@ -654,11 +956,11 @@ def registro_usuario():
     if request.method == 'POST':
         try:
             datos = {
-                'id': str(len(leer_json(USUARIOS_FILE)) + 1),
+                'id': almacen.siguiente_id('usuarios'),
                 'nombres': request.form['nombres'],
                 'apellidos': request.form['apellidos'],
                 'email': request.form['email'],
-                'password': generate_password_hash(request.form['password']),
+                'password': None,
                 'codigo_estudiante': request.form['codigo_estudiante'],
                 'dni': request.form['dni'],
                 'telefono': request.form['telefono'],
@@ -687,18 +989,19 @@ def registro_usuario():
                 return render_template('registro_usuario.html')
             
             # Verificar si el email ya existe
-            usuarios = leer_json(USUARIOS_FILE)
-            if any(u['email'] == datos['email'] for u in usuarios):
+            if almacen.contar('usuarios', email=datos['email']) > 0:
                 flash('El email ya está registrado', 'error')
                 return render_template('registro_usuario.html')
             
-            # Guardar usuario
-            usuarios.append(datos)
-            escribir_json(USUARIOS_FILE, usuarios)
+            # Guardar usuario, con la contraseña calculada en el pool (no en el hilo de la petición)
+            datos['password'] = pool_contrasenas.generar(request.form['password'])
+            almacen.insertar('usuarios', datos)
             
             flash('Registro exitoso. Ahora puedes iniciar sesión.', 'success')
             return redirect(url_for('login_usuario'))
         
+        except Ocupado:
+            flash('El servidor está ocupado, inténtalo de nuevo en unos segundos', 'error')
         except Exception as e:
             flash('Error en el registro', 'error')
     
@@ -712,16 +1015,16 @@ def login_empleador():
         password = request.form['password']
         
         try:
-            empleadores = leer_json(EMPLEADORES_FILE)
-            for empleador in empleadores:
-                if empleador['email'] == email and check_password_hash(empleador['password'], password):
-                    session['user_id'] = empleador['id']
-                    session['user_type'] = 'empleador'
-                    session['user_name'] = empleador['empresa']
-                    flash(f'Bienvenido {empleador["empresa"]}!', 'success')
-                    return redirect(url_for('dashboard_empleador'))
+            empleador, error, codigo = autenticar('empleadores', email, password)
+            if empleador:
+                session['user_id'] = empleador['id']
+                session['user_type'] = 'empleador'
+                session['user_name'] = empleador['empresa']
+                flash(f'Bienvenido {empleador["empresa"]}!', 'success')
+                return redirect(url_for('dashboard_empleador'))
             
-            flash('Credenciales incorrectas', 'error')
+            flash(error, 'error')
+            return render_template('login_empleador.html'), codigo
         
         except Exception as e:
             flash('Error al iniciar sesión', 'error')
@@ -733,13 +1036,13 @@ def registro_empleador():
     if request.method == 'POST':
         try:
             datos = {
-                'id': str(len(leer_json(EMPLEADORES_FILE)) + 1),
+                'id': almacen.siguiente_id('empleadores'),
                 'empresa': request.form['empresa'],
                 'ruc': request.form['ruc'],
                 'dni_representante': request.form['dni_representante'],
                 'nombre_representante': request.form['nombre_representante'],
                 'email': request.form['email'],
-                'password': generate_password_hash(request.form['password']),
+                'password': None,
                 'telefono': request.form['telefono'],
                 'direccion': request.form['direccion'],
                 'rubro': request.form['rubro'],
@@ -764,22 +1067,23 @@ def registro_empleador():
                 return render_template('registro_empleador.html')
             
             # Verificar si el RUC o email ya existen
-            empleadores = leer_json(EMPLEADORES_FILE)
-            if any(e['ruc'] == datos['ruc'] for e in empleadores):
+            if almacen.contar('empleadores', ruc=datos['ruc']) > 0:
                 flash('El RUC ya está registrado', 'error')
                 return render_template('registro_empleador.html')
             
-            if any(e['email'] == datos['email'] for e in empleadores):
+            if almacen.contar('empleadores', email=datos['email']) > 0:
                 flash('El email ya está registrado', 'error')
                 return render_template('registro_empleador.html')
             
-            # Guardar empleador
-            empleadores.append(datos)
-            escribir_json(EMPLEADORES_FILE, empleadores)
+            # Guardar empleador, con la contraseña calculada en el pool (no en el hilo de la petición)
+            datos['password'] = pool_contrasenas.generar(request.form['password'])
+            almacen.insertar('empleadores', datos)
             
             flash('Registro exitoso. Ahora puedes iniciar sesión.', 'success')
             return redirect(url_for('login_empleador'))
         
+        except Ocupado:
+            flash('El servidor está ocupado, inténtalo de nuevo en unos segundos', 'error')
         except Exception as e:
             flash('Error en el registro', 'error')
     
@@ -792,22 +1096,30 @@ def dashboard_usuario():
         return redirect(url_for('login_usuario'))
     
     try:
-        limpiar_alertas_expiradas()
-        usuario = next((u for u in leer_json(USUARIOS_FILE) if u['id'] == session['user_id']), None)
-        trabajos = leer_json(TRABAJOS_FILE)
+        usuario = cuenta_actual()
+        
+        # Recomendados según habilidades y horario de clases, sin los que ya postuló
+        almacen.indice('recomendaciones_usuarios')
+        almacen.indice('recomendaciones_trabajos')
+        postulados = {p['trabajo_id'] for p in almacen.buscar('postulaciones', usuario_id=session['user_id'])}
+        trabajos = [t for t in recomendador.para_usuario(session['user_id'], TOP_K) if t['id'] not in postulados][:3]
+        recomendados = bool(trabajos)
+        recientes, total_disponibles = almacen.indice('trabajos').pagina('disponible', tam_pagina=3)
+        if not trabajos:
+            # Sin habilidades que coincidan se muestran los más recientes
+            trabajos = recientes
         
         # Obtener trabajos activos del usuario
-        trabajos_activos = leer_json(TRABAJOS_ACTIVOS_FILE)
-        trabajos_activos_usuario = [t for t in trabajos_activos if t['usuario_id'] == session['user_id'] and t['estado'] == 'activo']
-        
-        # Obtener alertas
-        alertas = leer_json(ALERTAS_FILE)
+        trabajos_activos_usuario = almacen.buscar('trabajos_activos', usuario_id=session['user_id'], estado='activo')
         
         return render_template('dashboard_usuario.html', 
                              usuario=usuario, 
                              trabajos=trabajos,
+                             recomendados=recomendados,
+                             total_disponibles=total_disponibles,
                              trabajos_activos=trabajos_activos_usuario,
-                             alertas=alertas)
+                             alertas_no_leidas=alertas_sin_leer(ALERTAS_EN_DASHBOARD),
+                             total_alertas_no_leidas=contar_alertas_sin_leer())
     
     except Exception as e:
         flash('Error al cargar el dashboard', 'error')
@@ -820,34 +1132,17 @@ def dashboard_empleador():
         return redirect(url_for('login_empleador'))
     
     try:
-        empleadores = leer_json(EMPLEADORES_FILE)
-        empleador = next((e for e in empleadores if e['id'] == session['user_id']), None)
+        empleador = cuenta_actual()
         
         if not empleador:
             session.clear()
             flash('Sesión inválida', 'error')
             return redirect(url_for('login_empleador'))
         
-        # Cargar todos los datos necesarios
-        trabajos = [t for t in leer_json(TRABAJOS_FILE) if t.get('empleador_id') == session['user_id']]
-        
-        trabajos_activos = leer_json(TRABAJOS_ACTIVOS_FILE)
-        trabajos_activos_empleador = [t for t in trabajos_activos if t.get('empleador_id') == session['user_id'] and t.get('estado') == 'activo']
-        
-        # Cargar usuarios para los trabajos activos
-        usuarios = leer_json(USUARIOS_FILE)
-        for trabajo in trabajos_activos_empleador:
-            usuario_info = next((u for u in usuarios if u['id'] == trabajo['usuario_id']), None)
-            trabajo['usuario_info'] = usuario_info
-        
-        alertas = leer_json(ALERTAS_FILE)
-        
-        return render_template('dashboard_empleador.html', 
-                             empleador=empleador, 
-                             trabajos=trabajos,
-                             trabajos_activos=trabajos_activos_empleador,
-                             alertas=alertas,
-                             usuarios=usuarios)  # ← NUEVO: pasar usuarios al template
+        # Solo las filas que muestra la página, ya unidas con sus estudiantes (ver vistas.py)
+        modelo = vistas.dashboard_empleador(almacen, empleador, alertas_sin_leer(ALERTAS_EN_DASHBOARD),
+                                             contar_alertas_sin_leer())
+        return render_template('dashboard_empleador.html', **modelo.contexto())
     
     except Exception as e:
         print(f"Error en dashboard empleador: {e}")
@@ -860,20 +1155,15 @@ def ver_mis_postulaciones():
         return redirect(url_for('login_usuario'))
     
     try:
-        postulaciones = leer_json(POSTULACIONES_FILE)
-        trabajos = leer_json(TRABAJOS_FILE)
-        empleadores = leer_json(EMPLEADORES_FILE)
-        
         mis_postulaciones = []
-        for postulacion in postulaciones:
-            if postulacion['usuario_id'] == session['user_id']:
-                trabajo = next((t for t in trabajos if t['id'] == postulacion['trabajo_id']), None)
-                if trabajo:
-                    empleador = next((e for e in empleadores if e['id'] == trabajo['empleador_id']), None)
-                    postulacion_con_info = postulacion.copy()
-                    postulacion_con_info['trabajo_info'] = trabajo
-                    postulacion_con_info['empleador_info'] = empleador
-                    mis_postulaciones.append(postulacion_con_info)
+        for postulacion in almacen.buscar('postulaciones', usuario_id=session['user_id']):
+            trabajo = almacen.obtener('trabajos', postulacion['trabajo_id'])
+            if trabajo:
+                empleador = almacen.obtener('empleadores', trabajo['empleador_id'])
+                postulacion_con_info = postulacion.copy()
+                postulacion_con_info['trabajo_info'] = trabajo
+                postulacion_con_info['empleador_info'] = empleador
+                mis_postulaciones.append(postulacion_con_info)
         
         return render_template('mis_postulaciones.html', postulaciones=mis_postulaciones)
     
@@ -888,18 +1178,20 @@ def editar_perfil_usuario():
         return redirect(url_for('login_usuario'))
     
     try:
-        usuarios = leer_json(USUARIOS_FILE)
-        usuario = next((u for u in usuarios if u['id'] == session['user_id']), None)
+        usuario = cuenta_actual()
         
         if request.method == 'POST':
             # Actualizar datos
-            usuario['nombres'] = request.form['nombres']
-            usuario['apellidos'] = request.form['apellidos']
-            usuario['telefono'] = request.form['telefono']
-            usuario['universidad'] = request.form['universidad']
-            usuario['carrera'] = request.form['carrera']
-            usuario['habilidades'] = request.form['habilidades']
-            usuario['horario_clases'] = request.form['horario_clases']
+            cambios = {
+                'nombres': request.form['nombres'],
+                'apellidos': request.form['apellidos'],
+                'telefono': request.form['telefono'],
+                'universidad': request.form['universidad'],
+                'carrera': request.form['carrera'],
+                'habilidades': request.form['habilidades'],
+                'horario_clases': request.form['horario_clases']
+            }
+            usuario = {**usuario, **cambios}
             
             # Validar teléfono
             if not validar_telefono(usuario['telefono']):
@@ -907,12 +1199,8 @@ def editar_perfil_usuario():
                 return render_template('editar_perfil_usuario.html', usuario=usuario)
             
             # Guardar cambios
-            for i, u in enumerate(usuarios):
-                if u['id'] == session['user_id']:
-                    usuarios[i] = usuario
-                    break
-            
-            escribir_json(USUARIOS_FILE, usuarios)
+            almacen.actualizar('usuarios', session['user_id'], cambios)
+            olvidar_cuenta('usuario', session['user_id'])
             session['user_name'] = usuario['nombres']
             flash('Perfil actualizado exitosamente', 'success')
             return redirect(url_for('dashboard_usuario'))
@@ -929,16 +1217,18 @@ def editar_perfil_empleador():
         return redirect(url_for('login_empleador'))
     
     try:
-        empleadores = leer_json(EMPLEADORES_FILE)
-        empleador = next((e for e in empleadores if e['id'] == session['user_id']), None)
+        empleador = cuenta_actual()
         
         if request.method == 'POST':
             # Actualizar datos
-            empleador['empresa'] = request.form['empresa']
-            empleador['nombre_representante'] = request.form['nombre_representante']
-            empleador['telefono'] = request.form['telefono']
-            empleador['direccion'] = request.form['direccion']
-            empleador['rubro'] = request.form['rubro']
+            cambios = {
+                'empresa': request.form['empresa'],
+                'nombre_representante': request.form['nombre_representante'],
+                'telefono': request.form['telefono'],
+                'direccion': request.form['direccion'],
+                'rubro': request.form['rubro']
+            }
+            empleador = {**empleador, **cambios}
             
             # Validar teléfono
             if not validar_telefono(empleador['telefono']):
@@ -946,12 +1236,8 @@ def editar_perfil_empleador():
                 return render_template('editar_perfil_empleador.html', empleador=empleador)
             
             # Guardar cambios
-            for i, e in enumerate(empleadores):
-                if e['id'] == session['user_id']:
-                    empleadores[i] = empleador
-                    break
-            
-            escribir_json(EMPLEADORES_FILE, empleadores)
+            almacen.actualizar('empleadores', session['user_id'], cambios)
+            olvidar_cuenta('empleador', session['user_id'])
             session['user_name'] = empleador['empresa']
             flash('Perfil actualizado exitosamente', 'success')
             return redirect(url_for('dashboard_empleador'))
@@ -977,7 +1263,7 @@ def publicar_trabajo():
                 return render_template('publicar_trabajo.html')
             
             trabajo = {
-                'id': str(len(leer_json(TRABAJOS_FILE)) + 1),
+                'id': almacen.siguiente_id('trabajos'),
                 'empleador_id': session['user_id'],
                 'titulo': request.form['titulo'],
                 'descripcion': request.form['descripcion'],
@@ -990,9 +1276,8 @@ def publicar_trabajo():
                 'fecha_publicacion': datetime.now().isoformat()
             }
             
-            trabajos = leer_json(TRABAJOS_FILE)
-            trabajos.append(trabajo)
-            escribir_json(TRABAJOS_FILE, trabajos)
+            almacen.insertar('trabajos', trabajo)
+            anotar_evento('publicacion', trabajo, trabajo['fecha_publicacion'])
             
             flash('Trabajo publicado exitosamente', 'success')
             return redirect(url_for('dashboard_empleador'))
@@ -1026,7 +1311,7 @@ def admin_usuarios():
     if 'user_type' not in session or session['user_type'] != 'admin':
         return redirect(url_for('login_admin'))
     
-    usuarios = leer_json(USUARIOS_FILE)
+    usuarios = almacen.todos('usuarios')
     return render_template('admin_usuarios.html', usuarios=usuarios)
 
 @app.route('/admin/empleadores')
@@ -1034,7 +1319,7 @@ def admin_empleadores():
     if 'user_type' not in session or session['user_type'] != 'admin':
         return redirect(url_for('login_admin'))
     
-    empleadores = leer_json(EMPLEADORES_FILE)
+    empleadores = almacen.todos('empleadores')
     return render_template('admin_empleadores.html', empleadores=empleadores)
 
 @app.route('/admin/debug/usuario/<user_id>')
@@ -1043,14 +1328,14 @@ def debug_usuario(user_id):
         return redirect(url_for('login_admin'))
     
     datos = {
-        'usuario': next((u for u in leer_json(USUARIOS_FILE) if u['id'] == user_id), None),
-        'postulaciones': [p for p in leer_json(POSTULACIONES_FILE) if p['usuario_id'] == user_id],
-        'trabajos_activos': [t for t in leer_json(TRABAJOS_ACTIVOS_FILE) if t['usuario_id'] == user_id],
-        'calificaciones': [c for c in leer_json(CALIFICACIONES_FILE) if c['usuario_id'] == user_id],
-        'mensajes_enviados': [m for m in leer_json(MENSAJES_FILE) if m['de_user_id'] == user_id],
-        'mensajes_recibidos': [m for m in leer_json(MENSAJES_FILE) if m['para_user_id'] == user_id],
-        'reportes_enviados': [r for r in leer_json(REPORTES_FILE) if r['reportador_id'] == user_id],
-        'reportes_recibidos': [r for r in leer_json(REPORTES_FILE) if r['reportado_id'] == user_id]
+        'usuario': almacen.obtener('usuarios', user_id),
+        'postulaciones': almacen.buscar('postulaciones', usuario_id=user_id),
+        'trabajos_activos': almacen.buscar('trabajos_activos', usuario_id=user_id),
+        'calificaciones': almacen.buscar('calificaciones', usuario_id=user_id),
+        'mensajes_enviados': almacen.buscar('mensajes', de_user_id=user_id),
+        'mensajes_recibidos': almacen.buscar('mensajes', para_user_id=user_id),
+        'reportes_enviados': almacen.buscar('reportes', reportador_id=user_id),
+        'reportes_recibidos': almacen.buscar('reportes', reportado_id=user_id)
     }
     
     return jsonify(datos)
@@ -1061,15 +1346,15 @@ def debug_empleador(emp_id):
         return redirect(url_for('login_admin'))
     
     datos = {
-        'empleador': next((e for e in leer_json(EMPLEADORES_FILE) if e['id'] == emp_id), None),
-        'trabajos_publicados': [t for t in leer_json(TRABAJOS_FILE) if t['empleador_id'] == emp_id],
-        'postulaciones_recibidas': [p for p in leer_json(POSTULACIONES_FILE) if p['empleador_id'] == emp_id],
-        'trabajos_activos': [t for t in leer_json(TRABAJOS_ACTIVOS_FILE) if t['empleador_id'] == emp_id],
-        'calificaciones_dadas': [c for c in leer_json(CALIFICACIONES_FILE) if c['empleador_id'] == emp_id],
-        'mensajes_enviados': [m for m in leer_json(MENSAJES_FILE) if m['de_user_id'] == emp_id],
-        'mensajes_recibidos': [m for m in leer_json(MENSAJES_FILE) if m['para_user_id'] == emp_id],
-        'reportes_enviados': [r for r in leer_json(REPORTES_FILE) if r['reportador_id'] == emp_id],
-        'reportes_recibidos': [r for r in leer_json(REPORTES_FILE) if r['reportado_id'] == emp_id]
+        'empleador': almacen.obtener('empleadores', emp_id),
+        'trabajos_publicados': almacen.buscar('trabajos', empleador_id=emp_id),
+        'postulaciones_recibidas': almacen.buscar('postulaciones', empleador_id=emp_id),
+        'trabajos_activos': almacen.buscar('trabajos_activos', empleador_id=emp_id),
+        'calificaciones_dadas': almacen.buscar('calificaciones', empleador_id=emp_id),
+        'mensajes_enviados': almacen.buscar('mensajes', de_user_id=emp_id),
+        'mensajes_recibidos': almacen.buscar('mensajes', para_user_id=emp_id),
+        'reportes_enviados': almacen.buscar('reportes', reportador_id=emp_id),
+        'reportes_recibidos': almacen.buscar('reportes', reportado_id=emp_id)
     }
     
     return jsonify(datos)
@@ -1080,49 +1365,18 @@ def admin_eliminar_usuario(user_id):
         return redirect(url_for('login_admin'))
     
     try:
-        # 1. Leer todos los archivos necesarios
-        usuarios = leer_json(USUARIOS_FILE)
-        trabajos = leer_json(TRABAJOS_FILE)
-        postulaciones = leer_json(POSTULACIONES_FILE)
-        trabajos_activos = leer_json(TRABAJOS_ACTIVOS_FILE)
-        calificaciones = leer_json(CALIFICACIONES_FILE)
-        mensajes = leer_json(MENSAJES_FILE)
-        reportes = leer_json(REPORTES_FILE)
-        
-        # 2. Encontrar el usuario a eliminar
-        usuario_eliminar = next((u for u in usuarios if u['id'] == user_id), None)
+        # 1. Encontrar el usuario a eliminar
+        usuario_eliminar = almacen.obtener('usuarios', user_id)
         if not usuario_eliminar:
             flash('Usuario no encontrado', 'error')
             return redirect(url_for('admin_usuarios'))
         
-        # 3. Eliminar usuario de la lista de usuarios
-        usuarios = [u for u in usuarios if u['id'] != user_id]
-        escribir_json(USUARIOS_FILE, usuarios)
-        
-        # 4. Eliminar postulaciones del usuario
-        postulaciones = [p for p in postulaciones if p['usuario_id'] != user_id]
-        escribir_json(POSTULACIONES_FILE, postulaciones)
-        
-        # 5. Eliminar trabajos activos del usuario
-        trabajos_activos = [t for t in trabajos_activos if t['usuario_id'] != user_id]
-        escribir_json(TRABAJOS_ACTIVOS_FILE, trabajos_activos)
-        
-        # 6. Eliminar calificaciones del usuario
-        calificaciones = [c for c in calificaciones if c['usuario_id'] != user_id]
-        escribir_json(CALIFICACIONES_FILE, calificaciones)
-        
-        # 7. Eliminar mensajes del usuario (como remitente o destinatario)
-        mensajes = [m for m in mensajes if m['de_user_id'] != user_id and m['para_user_id'] != user_id]
-        escribir_json(MENSAJES_FILE, mensajes)
-        
-        # 8. Eliminar reportes donde el usuario es reportador o reportado
-        reportes = [r for r in reportes if r['reportador_id'] != user_id and r['reportado_id'] != user_id]
-        escribir_json(REPORTES_FILE, reportes)
-        
-        # 9. Para trabajos donde era empleador, cambiar el estado o eliminar
-        # (Esto se maneja mejor en la eliminación de empleadores)
+        # 2. Eliminar el usuario con sus postulaciones, trabajos activos, calificaciones,
+        # mensajes, lecturas y reportes (ver REFERENCIAS), todo en una transacción,
+        # desde la cola de tareas para no hacer esperar la respuesta
+        cola_tareas.encolar('eliminar_con_dependientes', 'usuarios', user_id)
         
-        flash(f'Usuario {usuario_eliminar["nombres"]} {usuario_eliminar["apellidos"]} eliminado exitosamente. Se limpiaron todos sus datos relacionados.', 'success')
+        flash(f'Usuario {usuario_eliminar["nombres"]} {usuario_eliminar["apellidos"]} en proceso de eliminación. Sus datos relacionados se limpiarán en unos momentos.', 'success')
         
     except Exception as e:
         print(f"Error eliminando usuario: {e}")
@@ -1136,57 +1390,19 @@ def admin_eliminar_empleador(emp_id):
         return redirect(url_for('login_admin'))
     
     try:
-        # 1. Leer todos los archivos necesarios
-        empleadores = leer_json(EMPLEADORES_FILE)
-        trabajos = leer_json(TRABAJOS_FILE)
-        postulaciones = leer_json(POSTULACIONES_FILE)
-        trabajos_activos = leer_json(TRABAJOS_ACTIVOS_FILE)
-        calificaciones = leer_json(CALIFICACIONES_FILE)
-        mensajes = leer_json(MENSAJES_FILE)
-        reportes = leer_json(REPORTES_FILE)
-        alertas = leer_json(ALERTAS_FILE)
-        
-        # 2. Encontrar el empleador a eliminar
-        empleador_eliminar = next((e for e in empleadores if e['id'] == emp_id), None)
+        # 1. Encontrar el empleador a eliminar
+        empleador_eliminar = almacen.obtener('empleadores', emp_id)
         if not empleador_eliminar:
             flash('Empleador no encontrado', 'error')
             return redirect(url_for('admin_empleadores'))
         
-        # 3. Eliminar empleador de la lista
-        empleadores = [e for e in empleadores if e['id'] != emp_id]
-        escribir_json(EMPLEADORES_FILE, empleadores)
+        # 2. Eliminar el empleador con sus trabajos (y las postulaciones, trabajos activos y
+        # calificaciones de esos trabajos), mensajes, lecturas y reportes (ver REFERENCIAS).
+        # Una sola transacción; se repite si alguien publica un trabajo a la vez. Se hace
+        # desde la cola de tareas para no hacer esperar la respuesta
+        cola_tareas.encolar('eliminar_con_dependientes', 'empleadores', emp_id)
         
-        # 4. Eliminar trabajos publicados por el empleador
-        trabajos_eliminar_ids = [t['id'] for t in trabajos if t['empleador_id'] == emp_id]
-        trabajos = [t for t in trabajos if t['empleador_id'] != emp_id]
-        escribir_json(TRABAJOS_FILE, trabajos)
-        
-        # 5. Eliminar postulaciones relacionadas con los trabajos del empleador
-        postulaciones = [p for p in postulaciones if p['empleador_id'] != emp_id and p['trabajo_id'] not in trabajos_eliminar_ids]
-        escribir_json(POSTULACIONES_FILE, postulaciones)
-        
-        # 6. Eliminar trabajos activos del empleador
-        trabajos_activos = [t for t in trabajos_activos if t['empleador_id'] != emp_id]
-        escribir_json(TRABAJOS_ACTIVOS_FILE, trabajos_activos)
-        
-        # 7. Eliminar calificaciones dadas por el empleador
-        calificaciones = [c for c in calificaciones if c['empleador_id'] != emp_id]
-        escribir_json(CALIFICACIONES_FILE, calificaciones)
-        
-        # 8. Eliminar mensajes del empleador
-        mensajes = [m for m in mensajes if m['de_user_id'] != emp_id and m['para_user_id'] != emp_id]
-        escribir_json(MENSAJES_FILE, mensajes)
-        
-        # 9. Eliminar reportes donde el empleador es reportador o reportado
-        reportes = [r for r in reportes if r['reportador_id'] != emp_id and r['reportado_id'] != emp_id]
-        escribir_json(REPORTES_FILE, reportes)
-        
-        # 10. Eliminar alertas enviadas por el empleador (si es que puede enviar)
-        # Normalmente solo admin envía alertas, pero por si acaso
-        alertas = [a for a in alertas if a.get('admin_id') != emp_id]
-        escribir_json(ALERTAS_FILE, alertas)
-        
-        flash(f'Empleador {empleador_eliminar["empresa"]} eliminado exitosamente. Se limpiaron todos sus trabajos y datos relacionados.', 'success')
+        flash(f'Empleador {empleador_eliminar["empresa"]} en proceso de eliminación. Sus trabajos y datos relacionados se limpiarán en unos momentos.', 'success')
         
     except Exception as e:
         print(f"Error eliminando empleador: {e}")
@@ -1195,6 +1411,35 @@ def admin_eliminar_empleador(emp_id):
     return redirect(url_for('admin_empleadores'))
 
 # === SISTEMA DE MENSAJERÍA ===
+# Flujo de eventos de un chat abierto: cada cuánto se revisa lo escrito por otros
+# procesos (y se manda un ping) y cuánto dura antes de que el navegador reconecte
+ESPERA_EVENTOS = 15
+DURACION_EVENTOS = 300
+
+def marcar_leidos(user_id, otro_user_id):
+    """Avanzar la marca de lectura de user_id hasta el último mensaje recibido de otro_user_id.
+    Solo escribe si hay mensajes nuevos; devuelve True si la marca avanzó."""
+    indice_mensajes = almacen.indice('mensajes')
+    
+    def avanzar(tx):
+        lectura = next(iter(tx.buscar('lecturas', user_id=user_id, otro_user_id=otro_user_id)), None)
+        ultimo = indice_mensajes.ultimo_recibido(user_id, otro_user_id, marca_de(lectura))
+        if ultimo is None:
+            return False
+        if lectura:
+            tx.actualizar('lecturas', lectura['id'], {'fecha': ultimo[0], 'mensaje_id': ultimo[1]})
+        else:
+            tx.insertar('lecturas', {
+                'id': almacen.siguiente_id('lecturas'),
+                'user_id': user_id,
+                'otro_user_id': otro_user_id,
+                'fecha': ultimo[0],
+                'mensaje_id': ultimo[1]
+            })
+        return True
+    
+    return almacen.en_transaccion(avanzar)
+
 
 @app.route('/mensajes')
 def ver_mensajes():
@@ -1202,35 +1447,20 @@ def ver_mensajes():
         return redirect(url_for('login_usuario'))
     
     try:
-        mensajes = leer_json(MENSAJES_FILE)
-        usuarios = leer_json(USUARIOS_FILE)
-        empleadores = leer_json(EMPLEADORES_FILE)
-        
-        # Obtener conversaciones del usuario
-        conversaciones = {}
+        # Resumen de cada conversación (último mensaje, fecha, sin leer), ya calculado en el índice
+        marcas = {l['otro_user_id']: marca_de(l) for l in almacen.buscar('lecturas', user_id=session['user_id'])}
+        conversaciones = almacen.indice('mensajes').bandeja(session['user_id'], marcas)
+        
+        for conversacion in conversaciones:
+            # Buscar información del otro usuario
+            if session['user_type'] == 'usuario':
+                otro_user = almacen.obtener('empleadores', conversacion['user_id'])
+                conversacion['nombre'] = otro_user['empresa'] if otro_user else 'Usuario desconocido'
+            else:
+                otro_user = almacen.obtener('usuarios', conversacion['user_id'])
+                conversacion['nombre'] = f"{otro_user['nombres']} {otro_user['apellidos']}" if otro_user else 'Usuario desconocido'
         
-        for mensaje in mensajes:
-            if mensaje['de_user_id'] == session['user_id'] or mensaje['para_user_id'] == session['user_id']:
-                otro_user_id = mensaje['para_user_id'] if mensaje['de_user_id'] == session['user_id'] else mensaje['de_user_id']
-                
-                if otro_user_id not in conversaciones:
-                    # Buscar información del otro usuario
-                    if session['user_type'] == 'usuario':
-                        otro_user = next((e for e in empleadores if e['id'] == otro_user_id), None)
-                        nombre = otro_user['empresa'] if otro_user else 'Usuario desconocido'
-                    else:
-                        otro_user = next((u for u in usuarios if u['id'] == otro_user_id), None)
-                        nombre = f"{otro_user['nombres']} {otro_user['apellidos']}" if otro_user else 'Usuario desconocido'
-                    
-                    conversaciones[otro_user_id] = {
-                        'user_id': otro_user_id,
-                        'nombre': nombre,
-                        'ultimo_mensaje': mensaje['mensaje'],
-                        'fecha_ultimo': mensaje['fecha'],
-                        'sin_leer': 0
-                    }
-        
-        return render_template('mensajes.html', conversaciones=list(conversaciones.values()))
+        return render_template('mensajes.html', conversaciones=conversaciones)
     
     except Exception as e:
         flash('Error al cargar los mensajes', 'error')
@@ -1247,10 +1477,8 @@ def ver_conversacion(otro_user_id):
             mensaje_texto = request.form['mensaje']
             
             if mensaje_texto.strip():
-                mensajes = leer_json(MENSAJES_FILE)
-                
                 nuevo_mensaje = {
-                    'id': str(len(mensajes) + 1),
+                    'id': almacen.siguiente_id('mensajes'),
                     'de_user_id': session['user_id'],
                     'para_user_id': otro_user_id,
                     'mensaje': mensaje_texto,
@@ -1258,37 +1486,38 @@ def ver_conversacion(otro_user_id):
                     'leido': False
                 }
                 
-                mensajes.append(nuevo_mensaje)
-                escribir_json(MENSAJES_FILE, mensajes)
+                almacen.insertar('mensajes', nuevo_mensaje)
                 
                 return redirect(url_for('ver_conversacion', otro_user_id=otro_user_id))
         
-        # Obtener mensajes de la conversación
-        mensajes = leer_json(MENSAJES_FILE)
-        conversacion = [m for m in mensajes if 
-                       (m['de_user_id'] == session['user_id'] and m['para_user_id'] == otro_user_id) or 
-                       (m['de_user_id'] == otro_user_id and m['para_user_id'] == session['user_id'])]
+        # Obtener una página de la conversación: las últimas o las anteriores al mensaje ?antes=<id>
+        indice_mensajes = almacen.indice('mensajes')
+        antes = request.args.get('antes')
+        cursor = indice_mensajes.clave(antes) if antes else None
+        conversacion, hay_anteriores = indice_mensajes.pagina(session['user_id'], otro_user_id, cursor)
         
-        # Marcar mensajes como leídos
-        for mensaje in conversacion:
-            if mensaje['para_user_id'] == session['user_id'] and not mensaje['leido']:
-                mensaje['leido'] = True
+        # Al ver los últimos mensajes se avanza la marca de lectura (no escribe si no hay nuevos)
+        if not antes:
+            marcar_leidos(session['user_id'], otro_user_id)
         
-        escribir_json(MENSAJES_FILE, mensajes)
+        # ✓✓ en mis mensajes que el otro ya vio
+        lectura_otro = next(iter(almacen.buscar('lecturas', user_id=otro_user_id, otro_user_id=session['user_id'])), None)
+        marca_otro = marca_de(lectura_otro)
+        conversacion = [dict(m, leido=m.get('leido') or (marca_otro is not None and clave_mensaje(m) <= marca_otro))
+                        if m['de_user_id'] == session['user_id'] else m
+                        for m in conversacion]
         
         # Obtener información del otro usuario
-        usuarios = leer_json(USUARIOS_FILE)
-        empleadores = leer_json(EMPLEADORES_FILE)
-        
         if session['user_type'] == 'usuario':
-            otro_user = next((e for e in empleadores if e['id'] == otro_user_id), None)
+            otro_user = almacen.obtener('empleadores', otro_user_id)
             nombre_otro = otro_user['empresa'] if otro_user else 'Empleador'
         else:
-            otro_user = next((u for u in usuarios if u['id'] == otro_user_id), None)
+            otro_user = almacen.obtener('usuarios', otro_user_id)
             nombre_otro = f"{otro_user['nombres']} {otro_user['apellidos']}" if otro_user else 'Usuario'
         
         return render_template('conversacion.html', 
                              mensajes=conversacion, 
+                             hay_anteriores=hay_anteriores,
                              otro_user_id=otro_user_id,
                              nombre_otro=nombre_otro)
     
@@ -1296,6 +1525,49 @@ def ver_conversacion(otro_user_id):
         flash('Error al cargar la conversación', 'error')
         return redirect(url_for('ver_mensajes'))
 
+@app.route('/mensajes/<otro_user_id>/eventos')
+def eventos_conversacion(otro_user_id):
+    """Mensajes nuevos de la conversación en tiempo real (Server-Sent Events).
+    Empieza después del mensaje ?despues=<id> (o del Last-Event-ID al reconectar)."""
+    if 'user_id' not in session:
+        return Response(status=401)
+    
+    user_id = session['user_id']
+    desde = request.headers.get('Last-Event-ID') or request.args.get('despues')
+    
+    def flujo():
+        indice_mensajes = almacen.indice('mensajes')
+        cursor = indice_mensajes.clave(desde) if desde else None
+        if cursor is None and desde:
+            # El mensaje ya no existe: se sigue desde el último
+            ultimos, _ = indice_mensajes.pagina(user_id, otro_user_id, limite=1)
+            cursor = clave_mensaje(ultimos[0]) if ultimos else None
+        fin = time.monotonic() + DURACION_EVENTOS
+        
+        with central_eventos.suscribir(clave_conversacion(user_id, otro_user_id)) as cola:
+            yield 'retry: 2000\n\n'
+            while time.monotonic() < fin:
+                nuevos = indice_mensajes.posteriores(user_id, otro_user_id, cursor)
+                for mensaje in nuevos:
+                    cursor = clave_mensaje(mensaje)
+                    yield f"id: {mensaje['id']}\nevent: mensaje\ndata: {json.dumps(mensaje, default=a_json)}\n\n"
+                if any(m['para_user_id'] == user_id for m in nuevos):
+                    marcar_leidos(user_id, otro_user_id)
+                if nuevos:
+                    continue  # Puede haber más de una página pendiente
+                
+                try:
+                    cola.get(timeout=ESPERA_EVENTOS)
+                    while not cola.empty():
+                        cola.get_nowait()
+                except queue.Empty:
+                    # Chat quieto: ping para mantener la conexión y revisar otros procesos
+                    yield ': ping\n\n'
+                    indice_mensajes = almacen.indice('mensajes')
+    
+    return Response(stream_with_context(flujo()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/iniciar-chat/<user_id>')
 def iniciar_chat(user_id):
     if 'user_id' not in session:
@@ -1304,11 +1576,10 @@ def iniciar_chat(user_id):
     try:
         # Verificar que existe un trabajo activo entre estos usuarios (para empleadores)
         if session['user_type'] == 'empleador':
-            trabajos_activos = leer_json(TRABAJOS_ACTIVOS_FILE)
-            trabajo_activo = next((t for t in trabajos_activos if 
-                                  t['usuario_id'] == user_id and 
-                                  t['empleador_id'] == session['user_id'] and
-                                  t['estado'] == 'activo'), None)
+            trabajo_activo = next(iter(almacen.buscar('trabajos_activos',
+                                                      usuario_id=user_id,
+                                                      empleador_id=session['user_id'],
+                                                      estado='activo')), None)
             
             if not trabajo_activo:
                 flash('Solo puedes chatear con estudiantes que tengas en trabajos activos', 'error')
@@ -1316,11 +1587,10 @@ def iniciar_chat(user_id):
         
         # Para usuarios, verificar que tienen trabajo activo con el empleador
         elif session['user_type'] == 'usuario':
-            trabajos_activos = leer_json(TRABAJOS_ACTIVOS_FILE)
-            trabajo_activo = next((t for t in trabajos_activos if 
-                                  t['empleador_id'] == user_id and 
-                                  t['usuario_id'] == session['user_id'] and
-                                  t['estado'] == 'activo'), None)
+            trabajo_activo = next(iter(almacen.buscar('trabajos_activos',
+                                                      empleador_id=user_id,
+                                                      usuario_id=session['user_id'],
+                                                      estado='activo')), None)
             
             if not trabajo_activo:
                 flash('Solo puedes chatear con empleadores que te hayan contratado', 'error')
@@ -1341,7 +1611,7 @@ def admin_enviar_alerta():
     
     if request.method == 'POST':
         alerta = {
-            'id': str(len(leer_json(ALERTAS_FILE)) + 1),
+            'id': almacen.siguiente_id('alertas'),
             'titulo': request.form['titulo'],
             'mensaje': request.form['mensaje'],
             'tipo': request.form['tipo'],
@@ -1353,9 +1623,7 @@ def admin_enviar_alerta():
             'estado': 'activa'
         }
         
-        alertas = leer_json(ALERTAS_FILE)
-        alertas.append(alerta)
-        escribir_json(ALERTAS_FILE, alertas)
+        almacen.insertar('alertas', alerta)
         
         flash('Alerta enviada exitosamente', 'success')
         return redirect(url_for('dashboard_admin'))
@@ -1370,16 +1638,14 @@ def ver_alertas():
         return redirect(url_for('login_usuario'))
     
     try:
-        limpiar_alertas_expiradas()
-        alertas = leer_json(ALERTAS_FILE)
-        
-        # Filtrar alertas relevantes para el usuario
-        if session['user_type'] == 'usuario':
-            alertas_relevantes = [a for a in alertas if a['destinatario'] in ['todos', 'usuarios']]
-        else:
-            alertas_relevantes = [a for a in alertas if a['destinatario'] in ['todos', 'empleadores']]
+        # Alertas para este tipo de cuenta, ya separadas por audiencia en el índice
+        alertas_relevantes = almacen.indice('alertas').relevantes(session['user_type'])
+        no_leidas = alertas_sin_leer()
         
-        return render_template('alertas.html', alertas=alertas_relevantes)
+        return render_template('alertas.html',
+                             alertas=alertas_relevantes,
+                             alertas_no_leidas=len(no_leidas),
+                             ids_no_leidas={a['id'] for a in no_leidas})
     
     except Exception as e:
         flash('Error al cargar las alertas', 'error')
@@ -1390,10 +1656,38 @@ def admin_ver_alertas():
     if 'user_type' not in session or session['user_type'] != 'admin':
         return redirect(url_for('login_admin'))
     
-    alertas = leer_json(ALERTAS_FILE)
+    alertas = almacen.todos('alertas')
     return render_template('admin_alertas.html', alertas=alertas)
 
 # ===== GESTIÓN DE ALERTAS PARA USUARIOS/EMPLEADORES =====
+ALERTAS_EN_DASHBOARD = 3  # Las demás se ven en /alertas
+
+def lectura_alertas():
+    """Registro de ``alertas_leidas`` de la cuenta en sesión, o None"""
+    return next(iter(almacen.buscar('alertas_leidas', user_id=session['user_id'], tipo_usuario=session['user_type'])), None)
+
+def alertas_sin_leer(limite=None):
+    """Alertas que la cuenta en sesión todavía no leyó, de la más antigua a la más reciente
+    (con ``limite``, solo las primeras)"""
+    return almacen.indice('alertas').no_leidas(session['user_type'], session['user_id'], lectura_alertas(), limite)
+
+def contar_alertas_sin_leer():
+    return almacen.indice('alertas').contar_no_leidas(session['user_type'], session['user_id'], lectura_alertas())
+
+def guardar_lectura_alertas(tx, lectura, cambios):
+    """Crear o actualizar el registro de alertas leídas de la cuenta en sesión"""
+    if lectura:
+        tx.actualizar('alertas_leidas', lectura['id'], cambios)
+    else:
+        tx.insertar('alertas_leidas', {
+            'id': almacen.siguiente_id('alertas_leidas'),
+            'user_id': session['user_id'],
+            'tipo_usuario': session['user_type'],
+            'hasta_fecha': '',
+            'hasta_id': '',
+            'leidas': [],
+            **cambios
+        })
 
 @app.route('/alerta/<alerta_id>/marcar-leida')
 def marcar_alerta_leida(alerta_id):
@@ -1401,22 +1695,20 @@ def marcar_alerta_leida(alerta_id):
         return redirect(url_for('login_usuario'))
     
     try:
-        alertas = leer_json(ALERTAS_FILE)
-        
-        # Buscar la alerta y actualizar
-        for i, alerta in enumerate(alertas):
-            if alerta['id'] == alerta_id:
-                # Si no existe el campo 'leida_por', crearlo
-                if 'leida_por' not in alertas[i]:
-                    alertas[i]['leida_por'] = []
-                
-                # Agregar el usuario actual a la lista de quienes han leído
-                if session['user_id'] not in alertas[i]['leida_por']:
-                    alertas[i]['leida_por'].append(session['user_id'])
-                
-                break
+        alerta = almacen.obtener('alertas', alerta_id)
+        
+        # Agregar la alerta al conjunto de leídas del usuario (si no la cubre ya su marca)
+        def marcar(tx):
+            lectura = next(iter(tx.buscar('alertas_leidas', user_id=session['user_id'], tipo_usuario=session['user_type'])), None)
+            marca, leidas = estado_lectura(lectura)
+            if alerta_id in leidas or (marca and clave_alerta(alerta) <= marca):
+                return
+            # Las leídas que ya no existen se descartan al guardar
+            vigentes = almacen.indice('alertas').vigentes(sorted(leidas))
+            guardar_lectura_alertas(tx, lectura, {'leidas': vigentes + [alerta_id]})
         
-        escribir_json(ALERTAS_FILE, alertas)
+        if alerta:
+            almacen.en_transaccion(marcar)
         
         # Redirigir de vuelta a donde estaba el usuario
         referer = request.headers.get('Referer')
@@ -1435,21 +1727,16 @@ def descartar_todas_alertas():
         return redirect(url_for('login_usuario'))
     
     try:
-        alertas = leer_json(ALERTAS_FILE)
+        # Mover la marca del usuario hasta la última alerta que le corresponde
+        ultima = almacen.indice('alertas').ultima(session['user_type'])
         
-        # Marcar todas las alertas relevantes como leídas por este usuario
-        for i, alerta in enumerate(alertas):
-            # Verificar si la alerta es relevante para este usuario
-            if ((session['user_type'] == 'usuario' and alerta['destinatario'] in ['todos', 'usuarios']) or
-                (session['user_type'] == 'empleador' and alerta['destinatario'] in ['todos', 'empleadores'])):
-                
-                if 'leida_por' not in alertas[i]:
-                    alertas[i]['leida_por'] = []
-                
-                if session['user_id'] not in alertas[i]['leida_por']:
-                    alertas[i]['leida_por'].append(session['user_id'])
+        def descartar(tx):
+            lectura = next(iter(tx.buscar('alertas_leidas', user_id=session['user_id'], tipo_usuario=session['user_type'])), None)
+            marca, _ = estado_lectura(lectura)
+            if ultima and (marca is None or ultima > marca):
+                guardar_lectura_alertas(tx, lectura, {'hasta_fecha': ultima[0], 'hasta_id': ultima[1], 'leidas': []})
         
-        escribir_json(ALERTAS_FILE, alertas)
+        almacen.en_transaccion(descartar)
         
         # Redirigir de vuelta
         referer = request.headers.get('Referer')
@@ -1470,28 +1757,22 @@ def admin_ver_usuario(user_id):
         return redirect(url_for('login_admin'))
     
     try:
-        usuarios = leer_json(USUARIOS_FILE)
-        usuario = next((u for u in usuarios if u['id'] == user_id), None)
+        usuario = almacen.obtener('usuarios', user_id)
         
         if not usuario:
             flash('Usuario no encontrado', 'error')
             return redirect(url_for('admin_usuarios'))
         
         # Obtener postulaciones del usuario
-        postulaciones = leer_json(POSTULACIONES_FILE)
-        trabajos = leer_json(TRABAJOS_FILE)
-        empleadores = leer_json(EMPLEADORES_FILE)
-        
         postulaciones_usuario = []
-        for postulacion in postulaciones:
-            if postulacion['usuario_id'] == user_id:
-                trabajo = next((t for t in trabajos if t['id'] == postulacion['trabajo_id']), None)
-                if trabajo:
-                    empleador = next((e for e in empleadores if e['id'] == trabajo['empleador_id']), None)
-                    postulacion_con_info = postulacion.copy()
-                    postulacion_con_info['trabajo_info'] = trabajo
-                    postulacion_con_info['empleador_info'] = empleador
-                    postulaciones_usuario.append(postulacion_con_info)
+        for postulacion in almacen.buscar('postulaciones', usuario_id=user_id):
+            trabajo = almacen.obtener('trabajos', postulacion['trabajo_id'])
+            if trabajo:
+                empleador = almacen.obtener('empleadores', trabajo['empleador_id'])
+                postulacion_con_info = postulacion.copy()
+                postulacion_con_info['trabajo_info'] = trabajo
+                postulacion_con_info['empleador_info'] = empleador
+                postulaciones_usuario.append(postulacion_con_info)
         
         return render_template('admin_detalle_usuario.html', 
                              usuario=usuario, 
@@ -1507,32 +1788,15 @@ def admin_ver_empleador(emp_id):
         return redirect(url_for('login_admin'))
     
     try:
-        empleadores = leer_json(EMPLEADORES_FILE)
-        empleador = next((e for e in empleadores if e['id'] == emp_id), None)
+        empleador = almacen.obtener('empleadores', emp_id)
         
         if not empleador:
             flash('Empleador no encontrado', 'error')
             return redirect(url_for('admin_empleadores'))
         
-        # Obtener trabajos del empleador
-        trabajos = leer_json(TRABAJOS_FILE)
-        trabajos_empleador = [t for t in trabajos if t['empleador_id'] == emp_id]
-        
-        # Obtener postulaciones para estos trabajos
-        postulaciones = leer_json(POSTULACIONES_FILE)
-        usuarios = leer_json(USUARIOS_FILE)
-        
-        # Estadísticas
-        total_postulaciones = len([p for p in postulaciones if p['empleador_id'] == emp_id])
-        postulaciones_aceptadas = len([p for p in postulaciones if p['empleador_id'] == emp_id and p['estado'] == 'aceptado'])
-        
-        return render_template('admin_detalle_empleador.html', 
-                             empleador=empleador, 
-                             trabajos=trabajos_empleador,
-                             postulaciones=postulaciones,
-                             usuarios=usuarios,
-                             total_postulaciones=total_postulaciones,
-                             postulaciones_aceptadas=postulaciones_aceptadas)
+        # Trabajos, las postulaciones que se muestran con su estudiante y estadísticas (ver vistas.py)
+        modelo = vistas.detalle_empleador(almacen, empleador)
+        return render_template('admin_detalle_empleador.html', **modelo.contexto())
     
     except Exception as e:
         flash('Error al cargar los detalles del empleador', 'error')
@@ -1546,33 +1810,85 @@ def dashboard_admin():
         return redirect(url_for('login_admin'))
     
     try:
-        usuarios = leer_json(USUARIOS_FILE)
-        empleadores = leer_json(EMPLEADORES_FILE)
-        trabajos = leer_json(TRABAJOS_FILE)
-        reportes = leer_json(REPORTES_FILE)
-        postulaciones = leer_json(POSTULACIONES_FILE)
-        alertas = leer_json(ALERTAS_FILE)
-        
-        # Estadísticas
-        trabajos_activos = len([t for t in trabajos if t.get('estado') == 'disponible'])
-        postulaciones_pendientes = len([p for p in postulaciones if p.get('estado') == 'pendiente'])
-        reportes_pendientes = len([r for r in reportes if r.get('estado') == 'pendiente'])  # NUEVO
+        # Estadísticas precalculadas: no se carga ninguna colección completa
+        usuarios, empleadores = estadisticas('usuarios'), estadisticas('empleadores')
+        trabajos, reportes = estadisticas('trabajos'), estadisticas('reportes')
         
         return render_template('dashboard_admin.html', 
-                             usuarios=usuarios, 
-                             empleadores=empleadores, 
-                             trabajos=trabajos, 
-                             reportes=reportes,
-                             postulaciones=postulaciones,
-                             alertas=alertas,
-                             trabajos_activos=trabajos_activos,
-                             postulaciones_pendientes=postulaciones_pendientes,
-                             reportes_pendientes=reportes_pendientes)  # NUEVO
+                             total_usuarios=usuarios.total(),
+                             total_empleadores=empleadores.total(),
+                             total_trabajos=trabajos.total(),
+                             total_reportes=reportes.total(),
+                             ultimos_usuarios=usuarios.ultimos(3),
+                             ultimos_empleadores=empleadores.ultimos(3),
+                             ultimos_reportes=reportes.ultimos(3),
+                             trabajos_activos=trabajos.contar('disponible'),
+                             postulaciones_pendientes=estadisticas('postulaciones').contar('pendiente'),
+                             reportes_pendientes=reportes.contar('pendiente'))  # NUEVO
     
     except Exception as e:
         flash('Error al cargar el dashboard de administración', 'error')
         return redirect(url_for('login_admin'))
 
+@app.route('/admin/analitica')
+def admin_analitica():
+    """Series de tiempo en JSON. Parámetros: desde/hasta (AAAA-MM-DD, por defecto los
+    últimos 30 días), granularidad (dia u hora), agrupar (categoria o ubicacion) y evento."""
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return redirect(url_for('login_admin'))
+    
+    granularidad = request.args.get('granularidad', 'dia')
+    agrupar = request.args.get('agrupar') or None
+    evento = request.args.get('evento') or None
+    try:
+        desde, hasta = rango_por_defecto()
+        if request.args.get('desde'):
+            desde = datetime.strptime(request.args['desde'], '%Y-%m-%d').date()
+        if request.args.get('hasta'):
+            hasta = datetime.strptime(request.args['hasta'], '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Las fechas deben tener el formato AAAA-MM-DD'}), 400
+    
+    if granularidad not in GRANULARIDADES:
+        return jsonify({'error': f"granularidad debe ser {' o '.join(GRANULARIDADES)}"}), 400
+    if agrupar is not None and agrupar not in AGRUPACIONES:
+        return jsonify({'error': f"agrupar debe ser {' o '.join(AGRUPACIONES)}"}), 400
+    if evento is not None and evento not in EVENTOS:
+        return jsonify({'error': f"evento debe ser uno de: {', '.join(EVENTOS)}"}), 400
+    if hasta < desde or (hasta - desde).days + 1 > MAX_DIAS[granularidad]:
+        return jsonify({'error': f'El rango debe ir de desde a hasta y no pasar de {MAX_DIAS[granularidad]} días'}), 400
+    
+    periodos, series = analitica.consultar(desde, hasta, granularidad, agrupar, (evento,) if evento else EVENTOS)
+    return jsonify({
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'granularidad': granularidad,
+        'agrupar': agrupar,
+        'periodos': periodos,
+        'series': series
+    })
+
+@app.route('/admin/analitica/reconstruir', methods=['POST'])
+def admin_reconstruir_analitica():
+    """Encolar la reconstrucción del log de analítica; el estado se consulta en /admin/tareas/<id>"""
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return redirect(url_for('login_admin'))
+    
+    tarea_id = cola_tareas.encolar('reconstruir_analitica')
+    return jsonify({'tarea': tarea_id, 'estado': url_for('admin_estado_tarea', tarea_id=tarea_id)}), 202
+
+@app.route('/admin/tareas/<tarea_id>')
+def admin_estado_tarea(tarea_id):
+    """Estado de una tarea en segundo plano, en JSON"""
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return redirect(url_for('login_admin'))
+    
+    tarea = cola_tareas.estado(tarea_id)
+    if not tarea:
+        return jsonify({'error': 'Tarea no encontrada'}), 404
+    campos = ('id', 'nombre', 'estado', 'intentos', 'error', 'resultado', 'fecha_creacion', 'fecha_fin')
+    return jsonify({campo: tarea.get(campo) for campo in campos})
+
 # === SISTEMA DE CALIFICACIONES ===
 
 # Ruta para que empleadores califiquen usuarios - MEJORADA
@@ -1581,8 +1897,9 @@ def calificar_usuario(trabajo_activo_id):
     if 'user_id' not in session or session['user_type'] != 'empleador':
         return redirect(url_for('login_empleador'))
     
-    trabajos_activos = leer_json(TRABAJOS_ACTIVOS_FILE)
-    trabajo_activo = next((t for t in trabajos_activos if t['id'] == trabajo_activo_id and t['empleador_id'] == session['user_id']), None)
+    trabajo_activo = almacen.obtener('trabajos_activos', trabajo_activo_id)
+    if trabajo_activo and trabajo_activo['empleador_id'] != session['user_id']:
+        trabajo_activo = None
     
     if not trabajo_activo:
         flash('Trabajo activo no encontrado o no tienes permisos', 'error')
@@ -1593,45 +1910,47 @@ def calificar_usuario(trabajo_activo_id):
         flash('Este trabajo ya ha sido finalizado y calificado', 'error')
         return redirect(url_for('empleador_trabajos_activos'))
     
-    usuarios = leer_json(USUARIOS_FILE)
-    usuario = next((u for u in usuarios if u['id'] == trabajo_activo['usuario_id']), None)
+    usuario = almacen.obtener('usuarios', trabajo_activo['usuario_id'])
     
     if not usuario:
         flash('Usuario no encontrado', 'error')
         return redirect(url_for('empleador_trabajos_activos'))
     
     if request.method == 'POST':
-        # Verificar si ya existe calificación para este trabajo
-        calificaciones = leer_json(CALIFICACIONES_FILE)
-        calificacion_existente = next((c for c in calificaciones if c['trabajo_activo_id'] == trabajo_activo_id), None)
-        
-        if calificacion_existente:
+        def calificar(tx):
+            # Verificar dentro de la transacción que sigue activo y sin calificación,
+            # así dos envíos simultáneos no crean dos calificaciones
+            trabajo_activo_tx = tx.obtener('trabajos_activos', trabajo_activo_id)
+            calificacion_existente = tx.contar('calificaciones', trabajo_activo_id=trabajo_activo_id) > 0
+            
+            if not trabajo_activo_tx or trabajo_activo_tx['estado'] != 'activo' or calificacion_existente:
+                return False
+            
+            calificacion_data = {
+                'id': almacen.siguiente_id('calificaciones'),
+                'trabajo_activo_id': trabajo_activo_id,
+                'empleador_id': session['user_id'],
+                'usuario_id': trabajo_activo_tx['usuario_id'],
+                'puntuacion': int(request.form['puntuacion']),
+                'comentario': request.form['comentario'],
+                'fecha_calificacion': datetime.now().isoformat(),
+                'trabajo_titulo': trabajo_activo_tx['titulo']
+            }
+            
+            # Guardar calificación
+            tx.insertar('calificaciones', calificacion_data)
+            
+            # Actualizar trabajo activo a "finalizado"
+            tx.actualizar('trabajos_activos', trabajo_activo_id, {
+                'estado': 'finalizado',
+                'fecha_finalizacion': datetime.now().isoformat()
+            })
+            return True
+        
+        if not almacen.en_transaccion(calificar):
             flash('Ya has calificado este trabajo anteriormente', 'error')
             return redirect(url_for('empleador_trabajos_activos'))
-        
-        calificacion_data = {
-            'id': str(len(calificaciones) + 1),
-            'trabajo_activo_id': trabajo_activo_id,
-            'empleador_id': session['user_id'],
-            'usuario_id': trabajo_activo['usuario_id'],
-            'puntuacion': int(request.form['puntuacion']),
-            'comentario': request.form['comentario'],
-            'fecha_calificacion': datetime.now().isoformat(),
-            'trabajo_titulo': trabajo_activo['titulo']
-        }
-        
-        # Guardar calificación
-        calificaciones.append(calificacion_data)
-        escribir_json(CALIFICACIONES_FILE, calificaciones)
-        
-        # Actualizar trabajo activo a "finalizado"
-        for i, ta in enumerate(trabajos_activos):
-            if ta['id'] == trabajo_activo_id:
-                trabajos_activos[i]['estado'] = 'finalizado'
-                trabajos_activos[i]['fecha_finalizacion'] = datetime.now().isoformat()
-                break
-        
-        escribir_json(TRABAJOS_ACTIVOS_FILE, trabajos_activos)
+        anotar_evento('calificacion', almacen.obtener('trabajos', trabajo_activo['trabajo_id']) or trabajo_activo)
         
         flash('Calificación enviada exitosamente. El trabajo ha sido marcado como finalizado.', 'success')
         return redirect(url_for('empleador_trabajos_activos'))
@@ -1646,21 +1965,16 @@ def ver_mis_calificaciones():
         return redirect(url_for('login_usuario'))
     
     try:
-        calificaciones = leer_json(CALIFICACIONES_FILE)
-        empleadores = leer_json(EMPLEADORES_FILE)
-        trabajos_activos = leer_json(TRABAJOS_ACTIVOS_FILE)
-        
         mis_calificaciones = []
-        for calificacion in calificaciones:
-            if calificacion['usuario_id'] == session['user_id']:
-                empleador = next((e for e in empleadores if e['id'] == calificacion['empleador_id']), None)
-                trabajo_activo = next((t for t in trabajos_activos if t['id'] == calificacion['trabajo_activo_id']), None)
-                
-                if empleador and trabajo_activo:
-                    calificacion_con_info = calificacion.copy()
-                    calificacion_con_info['empleador_info'] = empleador
-                    calificacion_con_info['trabajo_info'] = trabajo_activo
-                    mis_calificaciones.append(calificacion_con_info)
+        for calificacion in almacen.buscar('calificaciones', usuario_id=session['user_id']):
+            empleador = almacen.obtener('empleadores', calificacion['empleador_id'])
+            trabajo_activo = almacen.obtener('trabajos_activos', calificacion['trabajo_activo_id'])
+            
+            if empleador and trabajo_activo:
+                calificacion_con_info = calificacion.copy()
+                calificacion_con_info['empleador_info'] = empleador
+                calificacion_con_info['trabajo_info'] = trabajo_activo
+                mis_calificaciones.append(calificacion_con_info)
         
         # Calcular promedio
         promedio = 0
@@ -1684,15 +1998,12 @@ def crear_reporte(tipo_usuario, user_id):
     
     try:
         # Obtener información del usuario a reportar
-        usuarios = leer_json(USUARIOS_FILE)
-        empleadores = leer_json(EMPLEADORES_FILE)
-        
         usuario_reportado = None
         if tipo_usuario == 'usuario':
-            usuario_reportado = next((u for u in usuarios if u['id'] == user_id), None)
+            usuario_reportado = almacen.obtener('usuarios', user_id)
             nombre_reportado = f"{usuario_reportado['nombres']} {usuario_reportado['apellidos']}" if usuario_reportado else "Usuario"
         else:
-            usuario_reportado = next((e for e in empleadores if e['id'] == user_id), None)
+            usuario_reportado = almacen.obtener('empleadores', user_id)
             nombre_reportado = usuario_reportado['empresa'] if usuario_reportado else "Empleador"
         
         if not usuario_reportado:
@@ -1701,7 +2012,7 @@ def crear_reporte(tipo_usuario, user_id):
         
         if request.method == 'POST':
             reporte = {
-                'id': str(len(leer_json(REPORTES_FILE)) + 1),
+                'id': almacen.siguiente_id('reportes'),
                 'reportador_id': session['user_id'],
                 'reportador_tipo': session['user_type'],
                 'reportado_id': user_id,
@@ -1718,9 +2029,7 @@ def crear_reporte(tipo_usuario, user_id):
                 'admin_id': None
             }
             
-            reportes = leer_json(REPORTES_FILE)
-            reportes.append(reporte)
-            escribir_json(REPORTES_FILE, reportes)
+            almacen.insertar('reportes', reporte)
             
             flash('Reporte enviado exitosamente. El administrador lo revisará pronto.', 'success')
             return redirect(url_for('dashboard_usuario' if session['user_type'] == 'usuario' else 'dashboard_empleador'))
@@ -1740,8 +2049,7 @@ def mis_reportes():
         return redirect(url_for('login_usuario'))
     
     try:
-        reportes = leer_json(REPORTES_FILE)
-        mis_reportes_lista = [r for r in reportes if r['reportador_id'] == session['user_id']]
+        mis_reportes_lista = almacen.buscar('reportes', reportador_id=session['user_id'])
         
         # Ordenar por fecha (más recientes primero)
         mis_reportes_lista.sort(key=lambda x: x['fecha_reporte'], reverse=True)
@@ -1758,26 +2066,23 @@ def admin_reportes():
         return redirect(url_for('login_admin'))
     
     try:
-        reportes = leer_json(REPORTES_FILE)
-        
         # Ordenar por fecha (más recientes primero)
-        reportes.sort(key=lambda x: x['fecha_reporte'], reverse=True)
+        reportes = sorted(almacen.todos('reportes'), key=lambda x: x['fecha_reporte'], reverse=True)
         
-        # Contar reportes pendientes para la notificación
-        reportes_pendientes = len([r for r in reportes if r['estado'] == 'pendiente'])
-        
-        # Obtener estadísticas
-        estadisticas = {
-            'total': len(reportes),
+        # Estadísticas precalculadas (ver estadisticas.py)
+        conteo = estadisticas('reportes')
+        reportes_pendientes = conteo.contar('pendiente')
+        resumen = {
+            'total': conteo.total(),
             'pendientes': reportes_pendientes,
-            'revisados': len([r for r in reportes if r['estado'] == 'revisado']),
-            'resueltos': len([r for r in reportes if r['estado'] == 'resuelto'])
+            'revisados': conteo.contar('revisado'),
+            'resueltos': conteo.contar('resuelto')
         }
         
         return render_template('admin_reportes.html', 
                              reportes=reportes, 
                              reportes_pendientes=reportes_pendientes,
-                             estadisticas=estadisticas)
+                             estadisticas=resumen)
     
     except Exception as e:
         flash('Error al cargar los reportes', 'error')
@@ -1789,8 +2094,7 @@ def admin_responder_reporte(reporte_id):
         return redirect(url_for('login_admin'))
     
     try:
-        reportes = leer_json(REPORTES_FILE)
-        reporte = next((r for r in reportes if r['id'] == reporte_id), None)
+        reporte = almacen.obtener('reportes', reporte_id)
         
         if not reporte:
             flash('Reporte no encontrado', 'error')
@@ -1800,15 +2104,12 @@ def admin_responder_reporte(reporte_id):
             respuesta = request.form['respuesta']
             estado = request.form['estado']
             
-            for i, r in enumerate(reportes):
-                if r['id'] == reporte_id:
-                    reportes[i]['respuesta_admin'] = respuesta
-                    reportes[i]['estado'] = estado
-                    reportes[i]['fecha_respuesta'] = datetime.now().isoformat()
-                    reportes[i]['admin_id'] = session['user_id']
-                    break
-            
-            escribir_json(REPORTES_FILE, reportes)
+            almacen.actualizar('reportes', reporte_id, {
+                'respuesta_admin': respuesta,
+                'estado': estado,
+                'fecha_respuesta': datetime.now().isoformat(),
+                'admin_id': session['user_id']
+            })
             flash('Respuesta enviada exitosamente', 'success')
             return redirect(url_for('admin_reportes'))
         
@@ -1824,9 +2125,7 @@ def admin_eliminar_reporte(reporte_id):
         return redirect(url_for('login_admin'))
     
     try:
-        reportes = leer_json(REPORTES_FILE)
-        reportes = [r for r in reportes if r['id'] != reporte_id]
-        escribir_json(REPORTES_FILE, reportes)
+        almacen.eliminar('reportes', reporte_id)
         
         flash('Reporte eliminado exitosamente', 'success')
         return redirect(url_for('admin_reportes'))
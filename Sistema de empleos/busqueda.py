@@ -0,0 +1,223 @@
+"""Búsqueda de texto completo sobre los trabajos disponibles.
+
+Índice invertido (término -> {id de trabajo: frecuencia}) sobre titulo,
+descripcion, requisitos y ubicacion, con ranking BM25. Una consulta solo recorre
+las listas de los términos buscados, nunca todos los trabajos; para las primeras
+páginas además se corta cada lista en cuanto ningún trabajo pendiente puede entrar
+al top (listas ordenadas por frecuencia, estilo MaxScore). El índice se actualiza
+con cada alta, edición o baja de un trabajo (ver IndiceDerivado).
+"""
+import heapq
+import math
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from functools import lru_cache
+
+from almacenamiento import IndiceDerivado
+
+# Campos indexados y cuántas veces cuenta cada aparición (el título pesa más)
+CAMPOS = {'titulo': 3, 'descripcion': 1, 'requisitos': 1, 'ubicacion': 1}
+
+# Parámetros habituales de BM25
+K1 = 1.2
+B = 0.75
+
+STOPWORDS = set('''
+a al algo algunas algunos ante antes como con contra cual cuando de del desde donde durante
+e el ella ellas ellos en entre era es esa esas ese eso esos esta estas este esto estos fue
+ha hay la las le les lo los mas me mi mis mucho muy nada ni no nos o os otra otro para pero
+poco por porque que quien se sea ser si sin sobre su sus tambien te tiene tu tus un una uno
+unos unas y ya yo
+'''.split())
+
+# Sufijos derivativos, de más largo a más corto
+SUFIJOS = (
+    'amientos', 'imientos', 'amiento', 'imiento', 'aciones', 'uciones', 'idades',
+    'adoras', 'adores', 'ancias', 'encias', 'mente', 'acion', 'ucion', 'cion',
+    'adora', 'ador', 'ancia', 'encia', 'idad', 'ismos', 'ismo', 'istas', 'ista',
+    'ables', 'ibles', 'able', 'ible',
+)
+
+def plegar(texto):
+    """Minúsculas y sin tildes ni diéresis: 'Atención' -> 'atencion', 'Compañía' -> 'compania'"""
+    texto = (texto or '').lower()
+    if texto.isascii():
+        return texto
+    descompuesto = unicodedata.normalize('NFD', texto)
+    return ''.join(c for c in descompuesto if unicodedata.category(c) != 'Mn')
+
+@lru_cache(maxsize=50000)
+def raiz(palabra):
+    """Stemmer ligero para español: quita sufijos derivativos, plurales y género.
+    'meseros', 'mesera' y 'mesero' quedan en 'meser'."""
+    if len(palabra) <= 3:
+        return palabra
+    for sufijo in SUFIJOS:
+        if palabra.endswith(sufijo) and len(palabra) - len(sufijo) >= 3:
+            return palabra[:-len(sufijo)]
+    if palabra.endswith('es') and len(palabra) > 4 and palabra[-3] not in 'aeiou':
+        palabra = palabra[:-2]
+    elif palabra.endswith('s') and len(palabra) > 3:
+        palabra = palabra[:-1]
+    if palabra[-1] in 'aeo' and len(palabra) > 3:
+        palabra = palabra[:-1]
+    return palabra
+
+def tokenizar(texto):
+    """Términos de búsqueda de un texto: plegado, sin stopwords y reducidos a su raíz"""
+    return [raiz(p) for p in re.findall(r'[a-z0-9]+', plegar(texto)) if p not in STOPWORDS]
+
+def _clave_ranking(par):
+    """(puntaje, id): a igual puntaje va primero el id menor, para que la paginación sea estable"""
+    puntaje, id_registro = par
+    return (puntaje, -int(id_registro) if id_registro.isdigit() else 0)
+
+class IndiceBusqueda(IndiceDerivado):
+    """Índice invertido con BM25 sobre los trabajos en los estados indicados.
+
+    Cada posting guarda ya su peso BM25 sin el idf (depende de la frecuencia y de la
+    longitud del trabajo respecto a la longitud media). La media usada se fija al
+    construir y solo se recalcula si la real se aleja más de un 20%; así las listas
+    ordenadas por peso siguen valiendo entre altas y bajas."""
+
+    coleccion = 'trabajos'
+
+    # Desvío de la longitud media a partir del cual se recalculan los pesos
+    MAX_DESVIO_MEDIA = 0.2
+
+    def __init__(self, estados=('disponible',)):
+        super().__init__()
+        self.estados = set(estados)
+        self.postings = {}   # término -> {id: peso}
+        self.impactos = {}   # término -> [(-peso, id)] ordenada: mayor peso primero
+        self.terminos = {}   # id -> {término: frecuencia}, para poder desindexar
+        self.longitudes = {}  # id -> número de términos del documento
+        self.registros = {}  # id -> registro indexado
+        self.longitud_total = 0
+        self.media = None    # longitud media con la que se calcularon los pesos
+
+    def _terminos(self, registro):
+        frecuencias = {}
+        for campo, peso in CAMPOS.items():
+            for termino in tokenizar(registro.get(campo)):
+                frecuencias[termino] = frecuencias.get(termino, 0) + peso
+        return frecuencias
+
+    def _peso(self, frecuencia, longitud):
+        return frecuencia * (K1 + 1) / (frecuencia + K1 * (1 - B + B * longitud / self.media))
+
+    def _agregar(self, registro, ordenar=True):
+        if registro.get('estado') not in self.estados or registro['id'] in self.registros:
+            return
+        id_registro = registro['id']
+        frecuencias = self._terminos(registro)
+        longitud = sum(frecuencias.values())
+        if not self.media:
+            self.media = longitud or 1
+        for termino, frecuencia in frecuencias.items():
+            peso = self._peso(frecuencia, longitud)
+            self.postings.setdefault(termino, {})[id_registro] = peso
+            if ordenar:
+                insort(self.impactos.setdefault(termino, []), (-peso, id_registro))
+        self.terminos[id_registro] = frecuencias
+        self.longitudes[id_registro] = longitud
+        self.longitud_total += longitud
+        self.registros[id_registro] = registro
+
+    def _quitar(self, id_registro):
+        if id_registro not in self.registros:
+            return
+        for termino in self.terminos.pop(id_registro):
+            lista = self.postings[termino]
+            impactos = self.impactos[termino]
+            del impactos[bisect_left(impactos, (-lista.pop(id_registro), id_registro))]
+            if not lista:
+                del self.postings[termino]
+                del self.impactos[termino]
+        self.longitud_total -= self.longitudes.pop(id_registro)
+        del self.registros[id_registro]
+
+    def _recalcular_pesos(self):
+        """Recalcular todos los pesos con la longitud media actual y reordenar las listas"""
+        self.media = (self.longitud_total / len(self.registros)) if self.registros else None
+        for id_registro, frecuencias in self.terminos.items():
+            longitud = self.longitudes[id_registro]
+            for termino, frecuencia in frecuencias.items():
+                self.postings[termino][id_registro] = self._peso(frecuencia, longitud)
+        self.impactos = {t: sorted((-p, i) for i, p in lista.items()) for t, lista in self.postings.items()}
+
+    def reconstruir(self, registros):
+        self.postings, self.terminos, self.longitudes, self.registros = {}, {}, {}, {}
+        self.longitud_total = 0
+        self.media = None
+        for registro in registros:
+            self._agregar(registro, ordenar=False)
+        self._recalcular_pesos()
+
+    def aplicar(self, antes, despues):
+        self._quitar((despues or antes)['id'])
+        if despues is not None:
+            self._agregar(despues)
+
+    # --- Consultas ---
+
+    def buscar(self, consulta, filtro=None, limite=None):
+        """Trabajos que contienen algún término de la consulta, de mayor a menor puntaje BM25.
+        ``filtro(registro)`` descarta resultados; con ``limite`` solo se calculan los primeros.
+        Devuelve (registros, total de coincidencias tras el filtro)."""
+        with self._lock:
+            terminos = [t for t in set(tokenizar(consulta)) if t in self.postings]
+            if not terminos:
+                return [], 0
+            media_actual = self.longitud_total / len(self.registros)
+            if abs(media_actual / self.media - 1) > self.MAX_DESVIO_MEDIA:
+                self._recalcular_pesos()
+
+            # (idf, término), del más raro (más informativo) al más común
+            total_docs = len(self.registros)
+            terminos = sorted(((math.log(1 + (total_docs - len(self.postings[t]) + 0.5) / (len(self.postings[t]) + 0.5)), t)
+                               for t in terminos), reverse=True)
+
+            # Total: unión de las listas (en C); el filtro sí hay que evaluarlo por trabajo
+            coincidencias = set().union(*(self.postings[t].keys() for _, t in terminos))
+            if filtro is not None:
+                coincidencias = {i for i in coincidencias if filtro(self.registros[i])}
+
+            if limite is None:
+                ordenados = sorted(((self._puntaje(i, terminos), i) for i in coincidencias), key=_clave_ranking, reverse=True)
+            else:
+                ordenados = self._mejores(terminos, coincidencias, limite)
+            return [self.registros[i] for _, i in ordenados], len(coincidencias)
+
+    def _puntaje(self, id_registro, terminos):
+        return sum(idf * self.postings[t].get(id_registro, 0.0) for idf, t in terminos)
+
+    def _mejores(self, terminos, validos, limite):
+        """Top ``limite`` de ``validos`` sin puntuar todas las coincidencias.
+
+        Cada lista se recorre de mayor a menor peso. Un trabajo que todavía no apareció
+        no puede sumar más que el peso actual de cada lista, así que cuando la suma de
+        esas cotas no alcanza al peor del top, ningún trabajo pendiente puede entrar."""
+        cotas = [idf * -self.impactos[t][0][0] for idf, t in terminos]
+        restantes = [sum(cotas[j + 1:]) for j in range(len(terminos))]
+
+        top, vistos, anteriores = [], set(), 0.0
+        for j, (idf, termino) in enumerate(terminos):
+            corte = 0.0
+            for menos_peso, id_registro in self.impactos[termino]:
+                corte = idf * -menos_peso
+                if len(top) == limite and anteriores + corte + restantes[j] < top[0][0][0]:
+                    break
+                if id_registro in vistos or id_registro not in validos:
+                    continue
+                vistos.add(id_registro)
+                clave = _clave_ranking((self._puntaje(id_registro, terminos), id_registro))
+                if len(top) < limite:
+                    heapq.heappush(top, (clave, id_registro))
+                elif clave > top[0][0]:
+                    heapq.heapreplace(top, (clave, id_registro))
+            else:
+                corte = 0.0  # Lista completa: ya no quedan trabajos pendientes en este término
+            anteriores += corte
+        return sorted(((c[0], i) for c, i in top), key=_clave_ranking, reverse=True)
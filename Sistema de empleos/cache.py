@@ -0,0 +1,154 @@
+"""Cachés de HTML renderizado, invalidadas por la versión de los datos.
+
+``VersionColeccion`` es un índice derivado que solo cuenta cambios: su ``version``
+aumenta con cada escritura de la colección (de este u otro proceso) y ``modificado``
+guarda cuándo se vio la última. Además lleva un contador por valor de los ``campos``
+indicados (p. ej. por id), así que se puede preguntar por la versión de un registro.
+Una entrada guardada con unas versiones deja de servir en cuanto alguna cambia; no hay
+que borrar nada a mano.
+
+- Páginas: ``CacheLRU`` con ``EntradaPagina`` (el HTML con su ETag, un hash del
+  contenido igual en todos los workers); ``respuesta_condicional`` responde 304 si el
+  navegador ya tiene esa versión.
+- Fragmentos: ``ExtensionCache`` agrega a Jinja ``{% cache clave, dependencias %}``.
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+
+from flask import Response
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+from almacenamiento import IndiceDerivado
+
+class VersionColeccion(IndiceDerivado):
+    """Contador de cambios de una colección y de sus registros por valor de ``campos``"""
+
+    def __init__(self, coleccion, campos=()):
+        super().__init__()
+        self.coleccion = coleccion
+        self.campos = campos
+        self.version = 0
+        self.generacion = 0            # cuántas veces se reconstruyó
+        self.por_valor = Counter()      # (campo, valor) -> cambios vistos
+        self.modificado = time.time()
+
+    def reconstruir(self, registros):
+        # No se sabe qué cambió mientras no se seguía la colección: cuenta como un cambio
+        # de todo. Los contadores por valor no vuelven a cero, así ninguna versión se repite.
+        self.version += 1
+        self.generacion += 1
+        self.modificado = time.time()
+
+    def aplicar(self, antes, despues):
+        # Un cambio repetido solo cuesta una entrada de caché que no se reutiliza
+        self.version += 1
+        self.modificado = time.time()
+        for campo in self.campos:
+            for valor in {registro.get(campo) for registro in (antes, despues) if registro is not None}:
+                self.por_valor[(campo, valor)] += 1
+
+    def de(self, **filtro):
+        """Versión de toda la colección o, con un filtro ``campo=valor``, solo de los
+        registros con ese valor"""
+        with self._lock:
+            if not filtro:
+                return self.version
+            (campo, valor), = filtro.items()
+            if campo not in self.campos:
+                raise ValueError(f'{self.coleccion} no lleva versiones por {campo}')
+            return self.generacion, self.por_valor.get((campo, valor), 0)
+
+class CacheLRU:
+    """A lo sumo ``max_entradas`` valores, cada uno con la versión de los datos con la que
+    se calculó; al pasarse se olvidan los usados hace más tiempo. Con ``max_edad`` un
+    valor tampoco se usa pasados esos segundos."""
+
+    def __init__(self, max_entradas=256, max_edad=None):
+        self.max_entradas = max_entradas
+        self.max_edad = max_edad
+        self._entradas = OrderedDict()  # clave -> (versión, valor, time.monotonic() al guardar)
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, version):
+        """El valor guardado con esa versión, o None"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada[0] != version:
+                return None
+            if self.max_edad is not None and time.monotonic() - entrada[2] > self.max_edad:
+                return None
+            self._entradas.move_to_end(clave)
+            return entrada[1]
+
+    def guardar(self, clave, version, valor):
+        with self._lock:
+            self._entradas[clave] = (version, valor, time.monotonic())
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return valor
+
+# ===== PÁGINAS =====
+class EntradaPagina:
+    __slots__ = ('cuerpo', 'etag', 'modificado', 'tipo')
+
+    def __init__(self, cuerpo, modificado, tipo='text/html; charset=utf-8'):
+        self.cuerpo = cuerpo
+        self.etag = hashlib.sha1(cuerpo).hexdigest()
+        # Las fechas HTTP no tienen fracciones de segundo: se redondea hacia arriba para
+        # que un cambio dentro del mismo segundo no parezca anterior a una copia ya servida
+        self.modificado = datetime.fromtimestamp(math.ceil(modificado), timezone.utc)
+        self.tipo = tipo
+
+def respuesta_condicional(entrada, peticion):
+    """Respuesta con la página de ``entrada``, o 304 si la petición trae su ETag
+    (If-None-Match) o una fecha posterior a su modificación (If-Modified-Since)"""
+    respuesta = Response(entrada.cuerpo, content_type=entrada.tipo)
+    respuesta.set_etag(entrada.etag)
+    respuesta.last_modified = entrada.modificado
+    # El navegador puede guardarla, pero tiene que preguntar antes de volver a usarla
+    respuesta.cache_control.no_cache = True
+    return respuesta.make_conditional(peticion)
+
+# ===== FRAGMENTOS DE PLANTILLA =====
+class ExtensionCache(Extension):
+    """``{% cache clave, dependencias %}...{% endcache %}`` guarda el HTML del bloque por
+    (plantilla, clave) y lo reutiliza mientras ``dependencias`` sea igual (normalmente las
+    versiones de los registros que muestra). El bloque no debe usar nada más que cambie
+    entre peticiones. La caché es ``environment.cache_fragmentos``.
+
+    Las versiones se leen al renderizar, después de que la vista leyó los datos: si un
+    registro cambia justo entre ambas cosas el fragmento viejo queda con la versión nueva,
+    por eso además vence a los ``MAX_EDAD`` segundos."""
+
+    tags = {'cache'}
+
+    MAX_ENTRADAS = 2048
+    MAX_EDAD = 300
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(cache_fragmentos=CacheLRU(self.MAX_ENTRADAS, self.MAX_EDAD))
+
+    def parse(self, parser):
+        linea = next(parser.stream).lineno
+        argumentos = [nodes.Const(parser.name), parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            argumentos.append(parser.parse_expression())
+        else:
+            argumentos.append(nodes.Const(None))
+        cuerpo = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_fragmento', argumentos), [], [], cuerpo).set_lineno(linea)
+
+    def _fragmento(self, plantilla, clave, dependencias, caller):
+        cache = self.environment.cache_fragmentos
+        clave = (plantilla, tuple(clave) if isinstance(clave, list) else clave)
+        html = cache.obtener(clave, dependencias)
+        if html is None:
+            html = cache.guardar(clave, dependencias, caller())
+        return html
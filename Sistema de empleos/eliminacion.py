@@ -0,0 +1,132 @@
+"""Eliminación en cascada según las referencias declaradas en ``almacenamiento.REFERENCIAS``.
+
+Al eliminar un registro se eliminan también los que apuntan a él, y los que apuntan a
+esos, siguiendo el esquema: no hay filtros escritos a mano por ruta. Cada paso es una
+búsqueda por campo de referencia (todos están indexados, ver COLECCIONES), así que
+solo se leen los registros afectados. Toda la cascada se confirma en una transacción.
+
+Con ``PurgaDiferida`` el registro principal se elimina en el momento junto con una
+marca en la colección ``eliminaciones``, y la cascada de sus dependientes la hace un
+hilo en segundo plano (también en una transacción por marca). Como los ids no se
+reutilizan, lo que quede apuntando al registro mientras tanto no se confunde con nada.
+"""
+import threading
+from datetime import datetime
+
+from almacenamiento import CAMPOS_TIPO, REFERENCIAS, TIPOS_CUENTA
+
+def dependientes(tx, coleccion, id_registro):
+    """{colección: {ids}} de todo lo que hay que eliminar junto con el registro (sin incluirlo).
+    Las lecturas se hacen con ``tx``, así que la transacción falla si cambian antes de confirmar."""
+    encontrados = {}
+    pendientes = [(coleccion, id_registro)]
+    while pendientes:
+        destino, id_destino = pendientes.pop()
+        for origen, campo, destinos in REFERENCIAS:
+            if destino not in destinos:
+                continue
+            campo_tipo = CAMPOS_TIPO.get((origen, campo))
+            if campo_tipo:
+                # Referencia que dice a qué tipo de cuenta apunta: solo las de este tipo
+                # (y las antiguas sin tipo, que antes se eliminaban igual)
+                registros = (tx.buscar(origen, **{campo: id_destino, campo_tipo: TIPOS_CUENTA[destino]})
+                             + tx.buscar(origen, **{campo: id_destino, campo_tipo: None}))
+            else:
+                registros = tx.buscar(origen, **{campo: id_destino})
+            for registro in registros:
+                ids = encontrados.setdefault(origen, set())
+                if registro['id'] not in ids and (origen, registro['id']) != (coleccion, id_registro):
+                    ids.add(registro['id'])
+                    pendientes.append((origen, registro['id']))
+    return encontrados
+
+def eliminar_en_cascada(almacen, coleccion, id_registro):
+    """Eliminar el registro y sus dependientes en una transacción.
+    Devuelve {colección: número de registros eliminados} o None si el registro no existe."""
+    def eliminar(tx):
+        if not tx.obtener(coleccion, id_registro):
+            return None
+        eliminados = dependientes(tx, coleccion, id_registro)
+        tx.eliminar(coleccion, id_registro)
+        for origen, ids in eliminados.items():
+            for id_dependiente in ids:
+                tx.eliminar(origen, id_dependiente)
+        resumen = {origen: len(ids) for origen, ids in eliminados.items()}
+        resumen[coleccion] = 1
+        return resumen
+    return almacen.en_transaccion(eliminar)
+
+class PurgaDiferida:
+    """Eliminar el registro ya y sus dependientes después, desde un hilo aparte.
+
+    Las marcas pendientes se guardan en la colección ``eliminaciones``, así que lo que
+    no se alcanzó a purgar (proceso reiniciado, otro worker) se retoma en la siguiente
+    pasada. El hilo revisa la colección cada ``ESPERA`` segundos o en cuanto se marca
+    algo en este proceso."""
+
+    ESPERA = 60
+
+    def __init__(self, almacen):
+        self.almacen = almacen
+        self._despertar = threading.Event()
+        self._lock = threading.Lock()
+        self._hilo = None
+
+    def eliminar(self, coleccion, id_registro):
+        """Eliminar el registro y dejar la marca para purgar sus dependientes.
+        Devuelve False si el registro no existe."""
+        def marcar(tx):
+            if not tx.obtener(coleccion, id_registro):
+                return False
+            tx.eliminar(coleccion, id_registro)
+            tx.insertar('eliminaciones', {
+                'id': self.almacen.siguiente_id('eliminaciones'),
+                'coleccion': coleccion,
+                'registro_id': id_registro,
+                'fecha': datetime.now().isoformat()
+            })
+            return True
+        if not self.almacen.en_transaccion(marcar):
+            return False
+        self.iniciar()
+        self._despertar.set()
+        return True
+
+    def purgar(self, marca):
+        """Eliminar los dependientes del registro marcado y la marca, en una transacción.
+        Devuelve {colección: número de registros eliminados}."""
+        def purgar(tx):
+            if not tx.obtener('eliminaciones', marca['id']):
+                return {}  # Ya la purgó otro proceso
+            eliminados = dependientes(tx, marca['coleccion'], marca['registro_id'])
+            for origen, ids in eliminados.items():
+                for id_dependiente in ids:
+                    tx.eliminar(origen, id_dependiente)
+            tx.eliminar('eliminaciones', marca['id'])
+            return {origen: len(ids) for origen, ids in eliminados.items()}
+        return self.almacen.en_transaccion(purgar)
+
+    def purgar_pendientes(self):
+        """Purgar todas las marcas pendientes; devuelve cuántas se procesaron"""
+        marcas = self.almacen.todos('eliminaciones')
+        for marca in marcas:
+            eliminados = self.purgar(marca)
+            total = sum(eliminados.values())
+            print(f"✅ Purga de {marca['coleccion']} {marca['registro_id']}: {total} registros dependientes eliminados")
+        return len(marcas)
+
+    def iniciar(self):
+        """Arrancar el hilo de purga si todavía no corre"""
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._ejecutar, name='purga', daemon=True)
+                self._hilo.start()
+
+    def _ejecutar(self):
+        while True:
+            self._despertar.clear()
+            try:
+                self.purgar_pendientes()
+            except Exception as e:
+                print(f"⚠️ Error en la purga de eliminaciones: {e}")
+            self._despertar.wait(self.ESPERA)
@@ -0,0 +1,83 @@
+"""Estadísticas del panel de administración, mantenidas con cada escritura.
+
+``EstadisticasColeccion`` lleva, para una colección, cuántos registros hay en cada
+estado y los últimos registros dados de alta (un buffer circular de tamaño fijo).
+El dashboard del administrador y la página de reportes leen estos agregados en vez
+de cargar colecciones enteras para contarlas o quedarse con los tres últimos.
+"""
+from collections import Counter, deque
+
+from almacenamiento import IndiceDerivado
+
+# Cuántos registros recientes se guardan por colección. Las bajas vacían el buffer;
+# por debajo de MIN_RECIENTES se vuelve a llenar desde la colección.
+TAM_RECIENTES = 10
+MIN_RECIENTES = 5
+
+class EstadisticasColeccion(IndiceDerivado):
+    """Conteo por ``campo_estado`` y últimos ``tam_recientes`` registros de una colección,
+    en orden de alta (el mismo de ``almacen.todos``)."""
+
+    def __init__(self, coleccion, campo_estado=None, tam_recientes=TAM_RECIENTES):
+        super().__init__()
+        self.coleccion = coleccion
+        self.campo_estado = campo_estado
+        self.tam_recientes = tam_recientes
+        self.estados = {}          # id -> estado con el que se contó (None sin campo_estado)
+        self.por_estado = Counter()
+        self.recientes = deque(maxlen=tam_recientes)  # registros, del más antiguo al más nuevo
+
+    def _estado(self, registro):
+        return registro.get(self.campo_estado) if self.campo_estado else None
+
+    def reconstruir(self, registros):
+        self.estados, self.por_estado = {}, Counter()
+        unicos = []
+        for registro in registros:
+            # Con ids repetidos vale el primero, igual que en almacen.obtener
+            if registro['id'] not in self.estados:
+                self.estados[registro['id']] = self._estado(registro)
+                unicos.append(registro)
+        self.por_estado.update(self.estados.values())
+        self.recientes = deque(unicos[-self.tam_recientes:], maxlen=self.tam_recientes)
+
+    def aplicar(self, antes, despues):
+        id_registro = (despues or antes)['id']
+        existia = id_registro in self.estados
+        if existia:
+            estado = self.estados.pop(id_registro)
+            self.por_estado[estado] -= 1
+            if not self.por_estado[estado]:
+                del self.por_estado[estado]
+        if despues is not None:
+            self.estados[id_registro] = self._estado(despues)
+            self.por_estado[self.estados[id_registro]] += 1
+
+        posicion = next((i for i, r in enumerate(self.recientes) if r['id'] == id_registro), None)
+        if despues is None:
+            if posicion is not None:
+                del self.recientes[posicion]
+                if len(self.recientes) < MIN_RECIENTES and len(self.recientes) < len(self.estados):
+                    # El buffer no sabe cuál es el anterior al más antiguo: se recarga
+                    self.obsoleto = True
+        elif posicion is not None:
+            self.recientes[posicion] = despues
+        elif not existia:
+            self.recientes.append(despues)
+
+    # --- Consultas ---
+
+    def total(self):
+        with self._lock:
+            return len(self.estados)
+
+    def contar(self, estado):
+        """Registros con ese valor de ``campo_estado``"""
+        with self._lock:
+            return self.por_estado.get(estado, 0)
+
+    def ultimos(self, cantidad=3):
+        """Los ``cantidad`` (hasta MIN_RECIENTES) registros dados de alta más recientemente,
+        del más antiguo al más nuevo"""
+        with self._lock:
+            return list(self.recientes)[-cantidad:] if cantidad else []
@@ -0,0 +1,179 @@
+"""Índices precalculados para el listado público de trabajos (/trabajos).
+
+``IndiceTrabajos`` agrupa los trabajos por estado, por estado + categoría, por
+estado + ubicación y por las tres cosas a la vez. Cada grupo guarda dos listas
+ordenadas (por fecha de publicación y por pago), así que una página es un corte
+de lista y no hace falta recorrer ni ordenar todos los trabajos en cada petición.
+"""
+from bisect import bisect_left, bisect_right, insort
+
+from almacenamiento import IndiceDerivado
+
+TAM_PAGINA = 20
+
+# orden -> (lista del grupo que se usa, descendente)
+ORDENES = {
+    'recientes': ('por_fecha', True),
+    'pago_asc': ('por_pago', False),
+    'pago_desc': ('por_pago', True),
+}
+
+def pago_numerico(pago):
+    """El pago se guarda como texto ("150.49"); para ordenar y filtrar se usa como número"""
+    try:
+        return float(pago)
+    except (TypeError, ValueError):
+        return 0.0
+
+def normalizar_ubicacion(ubicacion):
+    """Clave de ubicación sin diferencias de mayúsculas ni espacios"""
+    return ' '.join((ubicacion or '').split()).casefold()
+
+def cumple_filtros(trabajo, categoria=None, ubicacion=None, pago_min=None, pago_max=None):
+    """Los mismos filtros de IndiceTrabajos.pagina, para una lista ya reducida (p. ej. resultados de búsqueda)"""
+    if categoria and trabajo.get('categoria') != categoria:
+        return False
+    if ubicacion and normalizar_ubicacion(trabajo.get('ubicacion')) != normalizar_ubicacion(ubicacion):
+        return False
+    pago = pago_numerico(trabajo.get('pago'))
+    return (pago_min is None or pago >= pago_min) and (pago_max is None or pago <= pago_max)
+
+def ordenar_trabajos(trabajos, orden):
+    """Ordenar una lista ya reducida con el mismo criterio que el índice"""
+    if orden == 'recientes':
+        return sorted(trabajos, key=lambda t: (t.get('fecha_publicacion') or '', t['id']), reverse=True)
+    return sorted(trabajos, key=lambda t: (pago_numerico(t.get('pago')), t['id']), reverse=orden == 'pago_desc')
+
+class _Grupo:
+    """Trabajos de un grupo ordenados por (fecha, id) y por (pago, id)"""
+
+    def __init__(self):
+        self.por_fecha = []
+        self.por_pago = []
+
+    def agregar(self, registro, ordenar=True):
+        por_fecha = (registro.get('fecha_publicacion') or '', registro['id'])
+        por_pago = (pago_numerico(registro.get('pago')), registro['id'])
+        if ordenar:
+            insort(self.por_fecha, por_fecha)
+            insort(self.por_pago, por_pago)
+        else:
+            self.por_fecha.append(por_fecha)
+            self.por_pago.append(por_pago)
+
+    def quitar(self, registro):
+        for lista, clave in ((self.por_fecha, (registro.get('fecha_publicacion') or '', registro['id'])),
+                             (self.por_pago, (pago_numerico(registro.get('pago')), registro['id']))):
+            posicion = bisect_left(lista, clave)
+            if posicion < len(lista) and lista[posicion] == clave:
+                del lista[posicion]
+
+class IndiceTrabajos(IndiceDerivado):
+    """Listado de trabajos por estado, categoría y ubicación, con paginación y orden"""
+
+    coleccion = 'trabajos'
+
+    def __init__(self):
+        super().__init__()
+        self.registros = {}  # id -> registro tal como se indexó
+        self.grupos = {}     # (estado, categoría o None, ubicación o None) -> _Grupo
+        self.nombres_ubicacion = {}  # ubicación normalizada -> como la escribió el empleador
+        self._opciones = {}  # estado -> (categorías, ubicaciones), se invalida con cada cambio
+
+    @staticmethod
+    def _claves(registro):
+        estado = registro.get('estado')
+        categoria = registro.get('categoria')
+        ubicacion = normalizar_ubicacion(registro.get('ubicacion'))
+        return [(estado, None, None), (estado, categoria, None), (estado, None, ubicacion), (estado, categoria, ubicacion)]
+
+    def _agregar(self, registro, ordenar=True):
+        self.registros[registro['id']] = registro
+        self._opciones.clear()
+        ubicacion = (registro.get('ubicacion') or '').strip()
+        self.nombres_ubicacion.setdefault(normalizar_ubicacion(ubicacion), ubicacion)
+        for clave in self._claves(registro):
+            self.grupos.setdefault(clave, _Grupo()).agregar(registro, ordenar)
+
+    def _quitar(self, registro):
+        self._opciones.clear()
+        for clave in self._claves(registro):
+            grupo = self.grupos.get(clave)
+            if grupo:
+                grupo.quitar(registro)
+                if not grupo.por_fecha:
+                    del self.grupos[clave]
+
+    def reconstruir(self, registros):
+        self.registros, self.grupos, self.nombres_ubicacion = {}, {}, {}
+        for registro in registros:
+            # Con ids repetidos vale el primero, igual que en almacen.obtener
+            if registro['id'] not in self.registros:
+                self._agregar(registro, ordenar=False)
+        for grupo in self.grupos.values():
+            grupo.por_fecha.sort()
+            grupo.por_pago.sort()
+
+    def aplicar(self, antes, despues):
+        id_registro = (despues or antes)['id']
+        anterior = self.registros.pop(id_registro, None)
+        if anterior is not None:
+            self._quitar(anterior)
+        if despues is not None:
+            self._agregar(despues)
+
+    # --- Consultas ---
+
+    def opciones(self, estado='disponible'):
+        """(categorías, ubicaciones) con trabajos en ese estado, para los filtros.
+        Se calculan una vez por cada cambio del índice, no en cada petición."""
+        with self._lock:
+            if estado not in self._opciones:
+                categorias = sorted(c for (e, c, u) in self.grupos if e == estado and c is not None and u is None)
+                ubicaciones = sorted(self.nombres_ubicacion[u] for (e, c, u) in self.grupos
+                                     if e == estado and c is None and u)
+                self._opciones[estado] = (categorias, ubicaciones)
+            return self._opciones[estado]
+
+    def pagina(self, estado='disponible', categoria=None, ubicacion=None, pago_min=None, pago_max=None,
+               orden='recientes', pagina=1, tam_pagina=TAM_PAGINA):
+        """Devolver (trabajos de la página, total que cumple los filtros)"""
+        nombre_lista, descendente = ORDENES.get(orden, ORDENES['recientes'])
+        inicio = (max(pagina, 1) - 1) * tam_pagina
+        with self._lock:
+            grupo = self.grupos.get((estado, categoria or None, normalizar_ubicacion(ubicacion) or None))
+            if not grupo:
+                return [], 0
+
+            # Rango de pago: posiciones en la lista ordenada por pago (búsqueda binaria)
+            desde = bisect_left(grupo.por_pago, pago_min, key=lambda e: e[0]) if pago_min is not None else 0
+            hasta = bisect_right(grupo.por_pago, pago_max, key=lambda e: e[0]) if pago_max is not None else len(grupo.por_pago)
+            total = max(hasta - desde, 0)
+            con_rango = pago_min is not None or pago_max is not None
+
+            if nombre_lista == 'por_pago' or not con_rango:
+                # Un corte de la lista: no depende del número de trabajos
+                lista = grupo.por_pago if nombre_lista == 'por_pago' else grupo.por_fecha
+                if nombre_lista == 'por_fecha':
+                    desde, hasta = 0, len(lista)
+                if descendente:
+                    fin = hasta - inicio
+                    claves = lista[max(fin - tam_pagina, desde):max(fin, desde)][::-1]
+                else:
+                    claves = lista[desde + inicio:min(desde + inicio + tam_pagina, hasta)]
+                ids = [id_registro for _, id_registro in claves]
+            else:
+                # Orden por fecha con rango de pago: se recorre desde lo más reciente
+                ids, saltados = [], 0
+                for _, id_registro in reversed(grupo.por_fecha):
+                    pago = pago_numerico(self.registros[id_registro].get('pago'))
+                    if (pago_min is not None and pago < pago_min) or (pago_max is not None and pago > pago_max):
+                        continue
+                    if saltados < inicio:
+                        saltados += 1
+                        continue
+                    ids.append(id_registro)
+                    if len(ids) == tam_pagina:
+                        break
+
+            return [self.registros[i] for i in ids], total
@@ -0,0 +1,198 @@
+"""Conversaciones y bandeja de entrada de la mensajería (/mensajes).
+
+``IndiceMensajes`` reparte los mensajes por conversación (el par de ids, sin
+importar quién escribió) y mantiene por usuario sus conversaciones y los mensajes
+recibidos de cada una. Se actualiza con cada mensaje enviado, así que la bandeja
+cuesta lo que el número de conversaciones del usuario y no el total de mensajes.
+
+Lo leído no se marca mensaje por mensaje: cada usuario tiene en la colección
+``lecturas`` una marca por conversación con la clave (fecha, id) del último mensaje
+que vio. Todo lo recibido hasta esa marca está leído; abrir un chat solo escribe
+si la marca avanza.
+
+``CentralEventos`` avisa en memoria a quien tenga abierta una conversación (por
+Server-Sent Events) cuando llega un mensaje nuevo, sin leer nada de disco mientras
+el chat está quieto.
+"""
+import queue
+import threading
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+
+from almacenamiento import IndiceDerivado
+
+TAM_PAGINA_MENSAJES = 30
+
+def clave_mensaje(mensaje):
+    """Posición del mensaje en su conversación: (fecha, id)"""
+    return (mensaje.get('fecha') or '', mensaje['id'])
+
+def marca_de(lectura):
+    """La marca de lectura de un registro de ``lecturas`` (o None)"""
+    return (lectura['fecha'], lectura['mensaje_id']) if lectura else None
+
+def clave_conversacion(user_a, user_b):
+    """La misma clave para los dos sentidos de una conversación"""
+    return (user_a, user_b) if user_a <= user_b else (user_b, user_a)
+
+class CentralEventos:
+    """Publicar/suscribir en memoria, dentro del proceso. Cada suscriptor tiene su cola
+    y publicar nunca bloquea: si la cola está llena el aviso se pierde, así que los
+    suscriptores deben usar el aviso para releer desde su cursor, no como el dato."""
+
+    def __init__(self, tam_cola=100):
+        self.tam_cola = tam_cola
+        self._lock = threading.Lock()
+        self._suscriptores = {}  # canal -> {colas}
+
+    @contextmanager
+    def suscribir(self, canal):
+        """``with central.suscribir(canal) as cola:`` recibe en ``cola`` lo publicado en el canal"""
+        cola = queue.Queue(maxsize=self.tam_cola)
+        with self._lock:
+            self._suscriptores.setdefault(canal, set()).add(cola)
+        try:
+            yield cola
+        finally:
+            with self._lock:
+                colas = self._suscriptores.get(canal)
+                colas.discard(cola)
+                if not colas:
+                    del self._suscriptores[canal]
+
+    def publicar(self, canal, evento):
+        with self._lock:
+            colas = list(self._suscriptores.get(canal, ()))
+        for cola in colas:
+            try:
+                cola.put_nowait(evento)
+            except queue.Full:
+                pass
+
+class IndiceMensajes(IndiceDerivado):
+    """Mensajes por conversación, ordenados por fecha, y resumen de la bandeja de cada usuario.
+    Con ``central``, cada mensaje nuevo se publica en el canal de su conversación."""
+
+    coleccion = 'mensajes'
+
+    def __init__(self, central=None):
+        super().__init__()
+        self.central = central
+        self.registros = {}       # id -> mensaje tal como se indexó
+        self.conversaciones = {}  # (id, id) -> [(fecha, id)] ordenada
+        self.por_usuario = {}     # id usuario -> {claves de sus conversaciones}
+        self.recibidos = {}       # (para_user_id, de_user_id) -> [(fecha, id)] ordenada, sin los ya leídos
+
+    def _agregar(self, mensaje, ordenar=True):
+        self.registros[mensaje['id']] = mensaje
+        de, para = mensaje['de_user_id'], mensaje['para_user_id']
+        clave = clave_conversacion(de, para)
+        lista = self.conversaciones.setdefault(clave, [])
+        if ordenar:
+            insort(lista, clave_mensaje(mensaje))
+        else:
+            lista.append(clave_mensaje(mensaje))
+        self.por_usuario.setdefault(de, set()).add(clave)
+        self.por_usuario.setdefault(para, set()).add(clave)
+        if not mensaje.get('leido'):
+            # Los mensajes viejos traen su propio campo 'leido'; los marcados así no cuentan
+            recibidos = self.recibidos.setdefault((para, de), [])
+            if ordenar:
+                insort(recibidos, clave_mensaje(mensaje))
+            else:
+                recibidos.append(clave_mensaje(mensaje))
+
+    def _quitar(self, mensaje):
+        de, para = mensaje['de_user_id'], mensaje['para_user_id']
+        clave = clave_conversacion(de, para)
+        lista = self.conversaciones[clave]
+        del lista[bisect_left(lista, clave_mensaje(mensaje))]
+        if not lista:
+            del self.conversaciones[clave]
+            for user_id in set(clave):
+                self.por_usuario[user_id].discard(clave)
+                if not self.por_usuario[user_id]:
+                    del self.por_usuario[user_id]
+        if not mensaje.get('leido'):
+            recibidos = self.recibidos[(para, de)]
+            del recibidos[bisect_left(recibidos, clave_mensaje(mensaje))]
+            if not recibidos:
+                del self.recibidos[(para, de)]
+
+    def reconstruir(self, registros):
+        self.registros, self.conversaciones, self.por_usuario, self.recibidos = {}, {}, {}, {}
+        for mensaje in registros:
+            if mensaje['id'] not in self.registros:
+                self._agregar(mensaje, ordenar=False)
+        for lista in list(self.conversaciones.values()) + list(self.recibidos.values()):
+            lista.sort()
+
+    def aplicar(self, antes, despues):
+        anterior = self.registros.pop((despues or antes)['id'], None)
+        if anterior is not None:
+            self._quitar(anterior)
+        if despues is not None:
+            self._agregar(despues)
+            if anterior is None and self.central is not None:
+                self.central.publicar(clave_conversacion(despues['de_user_id'], despues['para_user_id']), despues['id'])
+
+    # --- Consultas ---
+
+    def bandeja(self, user_id, marcas=None):
+        """Conversaciones del usuario, la más reciente primero: [{'user_id', 'ultimo_mensaje',
+        'fecha_ultimo', 'sin_leer'}] (``user_id`` es el de la otra persona).
+        ``marcas``: {otro user_id: marca de lectura} del usuario."""
+        marcas = marcas or {}
+        with self._lock:
+            resumenes = []
+            for clave in self.por_usuario.get(user_id, ()):
+                otro = clave[1] if clave[0] == user_id else clave[0]
+                ultimo = self.registros[self.conversaciones[clave][-1][1]]
+                resumenes.append({
+                    'user_id': otro,
+                    'ultimo_mensaje': ultimo['mensaje'],
+                    'fecha_ultimo': ultimo['fecha'],
+                    'sin_leer': self._no_leidos(user_id, otro, marcas.get(otro)),
+                })
+            resumenes.sort(key=lambda r: r['fecha_ultimo'], reverse=True)
+            return resumenes
+
+    def pagina(self, user_a, user_b, antes=None, limite=TAM_PAGINA_MENSAJES):
+        """Hasta ``limite`` mensajes de la conversación anteriores a la clave ``antes``
+        (o los últimos), del más antiguo al más reciente. Devuelve (mensajes, hay_anteriores)."""
+        with self._lock:
+            lista = self.conversaciones.get(clave_conversacion(user_a, user_b), [])
+            fin = bisect_left(lista, antes) if antes is not None else len(lista)
+            inicio = max(fin - limite, 0)
+            return [self.registros[i] for _, i in lista[inicio:fin]], inicio > 0
+
+    def posteriores(self, user_a, user_b, despues=None, limite=TAM_PAGINA_MENSAJES):
+        """Hasta ``limite`` mensajes de la conversación posteriores a la clave ``despues``,
+        del más antiguo al más reciente"""
+        with self._lock:
+            lista = self.conversaciones.get(clave_conversacion(user_a, user_b), [])
+            inicio = bisect_right(lista, despues) if despues is not None else 0
+            return [self.registros[i] for _, i in lista[inicio:inicio + limite]]
+
+    def clave(self, id_mensaje):
+        """(fecha, id) de un mensaje indexado, para usarlo como cursor"""
+        with self._lock:
+            mensaje = self.registros.get(id_mensaje)
+            return clave_mensaje(mensaje) if mensaje else None
+
+    def _no_leidos(self, para_user_id, de_user_id, marca):
+        recibidos = self.recibidos.get((para_user_id, de_user_id), [])
+        return len(recibidos) - (bisect_right(recibidos, marca) if marca else 0)
+
+    def no_leidos(self, para_user_id, de_user_id, marca=None):
+        """Mensajes de ``de_user_id`` posteriores a la marca de lectura de ``para_user_id``"""
+        with self._lock:
+            return self._no_leidos(para_user_id, de_user_id, marca)
+
+    def ultimo_recibido(self, para_user_id, de_user_id, marca=None):
+        """Clave del último mensaje no leído de ``de_user_id`` a ``para_user_id``, o None"""
+        with self._lock:
+            recibidos = self.recibidos.get((para_user_id, de_user_id))
+            if recibidos and (marca is None or recibidos[-1] > marca):
+                return recibidos[-1]
+            return None
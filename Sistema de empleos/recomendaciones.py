@@ -0,0 +1,434 @@
+"""Recomendaciones de trabajos para estudiantes según sus habilidades y su horario de clases.
+
+- Las habilidades del estudiante y el texto de cada trabajo pasan por el mismo
+  analizador que la búsqueda (busqueda.tokenizar). El puntaje es la similitud
+  entre ambos vectores de términos (ponderados por idf).
+- Los horarios en texto libre ("Lunes a viernes de 9 am - 2 pm") se convierten en
+  una máscara de bits por media hora de la semana; un trabajo cuyo horario se cruza
+  con las clases se descarta con un AND de máscaras.
+- Se guarda el top de cada estudiante, con los idf fijados al calcularlo (se recalcula
+  si el número de trabajos cambia más de un 20%, como la media de BM25). Al publicar,
+  editar o cerrar un trabajo solo se actualizan los estudiantes que comparten algún
+  término con él o lo tenían en su top; al editar un perfil se recalcula solo ese
+  estudiante, la próxima vez que se pide.
+
+Con NumPy el recálculo de un estudiante se vectoriza sobre todos los trabajos;
+sin NumPy se hace en Python sobre los trabajos que comparten términos.
+"""
+import math
+import re
+import threading
+from bisect import insort
+
+from almacenamiento import IndiceDerivado
+from busqueda import plegar, tokenizar
+
+try:
+    import numpy as np
+except ImportError:  # Sin NumPy se usa el cálculo en Python puro
+    np = None
+
+TOP_K = 10
+RESERVA = 2 * TOP_K  # Se guardan de más para no recalcular cada vez que uno sale del top
+
+# Desvío en el número de trabajos a partir del cual se recalculan los idf de un estudiante
+MAX_DESVIO_TOTAL = 0.2
+DECIMALES = 9  # Los puntajes se redondean para que NumPy y Python ordenen igual
+
+# ===== HORARIOS =====
+DIAS = {
+    'lunes': 0, 'lun': 0, 'martes': 1, 'miercoles': 2, 'mie': 2, 'jueves': 3, 'jue': 3,
+    'viernes': 4, 'vie': 4, 'sabado': 5, 'sabados': 5, 'sab': 5, 'domingo': 6, 'domingos': 6, 'dom': 6,
+}
+FRANJAS = {'manana': (6, 12), 'mananas': (6, 12), 'tarde': (12, 18), 'tardes': (12, 18), 'noche': (18, 24), 'noches': (18, 24)}
+CONECTORES_RANGO = {'a', 'al', 'hasta', '-'}
+BLOQUES_DIA = 48  # medias horas
+PALABRAS_MASCARA = 6  # 7 días * 48 bloques = 336 bits = 6 enteros de 64 bits
+
+def _minutos(hora, minutos, sufijo):
+    if sufijo == 'pm' and hora < 12:
+        hora += 12
+    elif sufijo == 'am' and hora == 12:
+        hora = 0
+    return hora * 60 + minutos
+
+def _intervalo(inicio, fin):
+    """(minuto inicial, minuto final) del día a partir de dos horas (h, m, am/pm o None)"""
+    (h1, m1, s1), (h2, m2, s2) = inicio, fin
+    if s2 and not s1:
+        # "7 a 10 am": el sufijo vale para las dos, salvo que quede al revés ("10 - 2 pm")
+        s1 = s2 if _minutos(h1, m1, s2) <= _minutos(h2, m2, s2) else 'am'
+    desde, hasta = _minutos(h1, m1, s1), _minutos(h2, m2, s2)
+    if hasta <= desde and not s2 and h2 < 12:
+        hasta += 12 * 60  # "8-2" se entiende hasta las 2 pm
+    if hasta <= desde:
+        hasta = 24 * 60  # Termina de madrugada: se cuenta hasta medianoche
+    return desde, min(hasta, 24 * 60)
+
+def _tokens_horario(texto):
+    texto = re.sub(r'\b([ap])\.?\s?m\b\.?', r'\1m', plegar(texto))
+    tokens = []
+    for hora, minutos, palabra, signo in re.findall(r'(\d{1,2})(?:[:.h](\d{2}))?|([a-z]+)|([-;\n])', texto):
+        if hora:
+            tokens.append(['hora', int(hora), int(minutos or 0), None])
+        elif palabra in ('am', 'pm') and tokens and tokens[-1][0] == 'hora':
+            tokens[-1][3] = palabra
+        elif palabra in DIAS:
+            tokens.append(['dia', DIAS[palabra]])
+        elif palabra in FRANJAS:
+            tokens.append(['franja', *FRANJAS[palabra]])
+        elif palabra in ('diario', 'diariamente'):
+            tokens.append(['todos'])
+        elif palabra == 'semana' and tokens and tokens[-1][0] == 'fin':
+            tokens[-1] = ['finde']
+        elif palabra in ('fin', 'fines'):
+            tokens.append(['fin'])
+        elif palabra in CONECTORES_RANGO or signo == '-':
+            tokens.append(['hasta'])
+        elif signo:
+            tokens.append(['corte'])
+    return tokens
+
+def mascara_horario(texto):
+    """Bits ocupados de la semana (un bit por media hora) o None si el texto no se entiende.
+    Sin días se asume toda la semana; sin horas, el día completo."""
+    if not texto:
+        return None
+    dias, intervalos, mascara, entendido = [], [], 0, False
+
+    def cerrar():
+        nonlocal dias, intervalos, mascara
+        if dias or intervalos:
+            for dia in (dias or range(7)):
+                for desde, hasta in (intervalos or [(0, 24 * 60)]):
+                    primero, ultimo = desde // 30, -(-hasta // 30)
+                    mascara |= ((1 << (ultimo - primero)) - 1) << (dia * BLOQUES_DIA + primero)
+        dias, intervalos = [], []
+
+    tokens = _tokens_horario(texto)
+    i = 0
+    while i < len(tokens):
+        tipo = tokens[i][0]
+        siguiente = tokens[i + 1][0] if i + 1 < len(tokens) else None
+        if tipo == 'dia':
+            if intervalos:
+                cerrar()  # Empieza otro grupo: "lunes 8-10, martes 14-18"
+            if siguiente == 'hasta' and i + 2 < len(tokens) and tokens[i + 2][0] == 'dia':
+                desde, hasta = tokens[i][1], tokens[i + 2][1]
+                dias += [(desde + k) % 7 for k in range((hasta - desde) % 7 + 1)]
+                i += 3
+                entendido = True
+                continue
+            dias.append(tokens[i][1])
+            entendido = True
+        elif tipo in ('finde', 'todos'):
+            if intervalos:
+                cerrar()
+            dias += [5, 6] if tipo == 'finde' else list(range(7))
+            entendido = True
+        elif tipo == 'hora' and siguiente == 'hasta' and i + 2 < len(tokens) and tokens[i + 2][0] == 'hora':
+            intervalos.append(_intervalo(tokens[i][1:], tokens[i + 2][1:]))
+            i += 3
+            entendido = True
+            continue
+        elif tipo == 'franja':
+            intervalos.append((tokens[i][1] * 60, tokens[i][2] * 60))
+            entendido = True
+        elif tipo == 'corte' and intervalos:
+            cerrar()
+        i += 1
+    cerrar()
+    return mascara if entendido else None
+
+def _palabras(mascara):
+    """La máscara como 6 enteros de 64 bits, para operar con NumPy"""
+    return [(mascara >> (64 * k)) & 0xFFFFFFFFFFFFFFFF for k in range(PALABRAS_MASCARA)]
+
+# ===== MOTOR =====
+def _vector_trabajo(registro):
+    """Frecuencias de términos del trabajo normalizadas a longitud 1 (el título cuenta doble)"""
+    frecuencias = {}
+    texto = ' '.join([registro.get('titulo') or ''] * 2 + [registro.get(c) or '' for c in ('descripcion', 'requisitos', 'categoria')])
+    for termino in tokenizar(texto):
+        frecuencias[termino] = frecuencias.get(termino, 0) + 1
+    norma = math.sqrt(sum(f * f for f in frecuencias.values())) or 1.0
+    return {t: f / norma for t, f in frecuencias.items()}
+
+def _clave_orden(par):
+    """(puntaje, id) de mayor a menor puntaje y, a igual puntaje, id menor primero"""
+    puntaje, id_trabajo = par
+    return (-puntaje, int(id_trabajo) if id_trabajo.isdigit() else 0, id_trabajo)
+
+class Recomendador:
+    """Top de trabajos por estudiante. Se alimenta de dos índices derivados, uno sobre
+    trabajos y otro sobre usuarios, que hay que registrar en el almacenamiento."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.trabajos = _IndiceRecomendador(self, 'trabajos')
+        self.usuarios = _IndiceRecomendador(self, 'usuarios')
+        self._vaciar_trabajos()
+        self._vaciar_usuarios()
+
+    # --- Trabajos ---
+
+    def _vaciar_trabajos(self):
+        self.registros = {}   # id -> trabajo disponible
+        self.vectores = {}    # id -> {término: peso}
+        self.mascaras = {}    # id -> máscara de horario o None
+        self.postings = {}    # término -> {id trabajo: peso}
+        self.en_top = {}      # id trabajo -> {ids de usuario que lo tienen en su top}
+        # Para NumPy: cada trabajo ocupa una posición fija en los arreglos
+        self.posiciones, self.ids_en_posicion, self.libres = {}, [], []
+        self._columnas = {}   # término -> (posiciones, pesos) como arreglos, se invalida al cambiar
+        self._matriz_mascaras = None
+
+    def _agregar_trabajo(self, registro):
+        id_trabajo = registro['id']
+        vector = _vector_trabajo(registro)
+        self.registros[id_trabajo] = registro
+        self.vectores[id_trabajo] = vector
+        self.mascaras[id_trabajo] = mascara_horario(registro.get('horario'))
+        for termino, peso in vector.items():
+            self.postings.setdefault(termino, {})[id_trabajo] = peso
+            self._columnas.pop(termino, None)
+        if self.libres:
+            posicion = self.libres.pop()
+            self.ids_en_posicion[posicion] = id_trabajo
+        else:
+            posicion = len(self.ids_en_posicion)
+            self.ids_en_posicion.append(id_trabajo)
+        self.posiciones[id_trabajo] = posicion
+        self._fijar_fila(posicion, self.mascaras[id_trabajo])
+
+    def _quitar_trabajo(self, id_trabajo):
+        if id_trabajo not in self.registros:
+            return
+        for termino in self.vectores.pop(id_trabajo):
+            lista = self.postings[termino]
+            del lista[id_trabajo]
+            if not lista:
+                del self.postings[termino]
+            self._columnas.pop(termino, None)
+        del self.registros[id_trabajo]
+        del self.mascaras[id_trabajo]
+        posicion = self.posiciones.pop(id_trabajo)
+        self.ids_en_posicion[posicion] = None
+        self.libres.append(posicion)
+        self._fijar_fila(posicion, None)
+
+    def _fijar_fila(self, posicion, mascara):
+        """Actualizar en su lugar la fila de la matriz de máscaras (si ya se armó)"""
+        matriz = self._matriz_mascaras
+        if matriz is None:
+            return
+        if posicion >= len(matriz):
+            matriz = np.concatenate([matriz, np.zeros((max(len(matriz), 1), PALABRAS_MASCARA), dtype=np.uint64)])
+            self._matriz_mascaras = matriz
+        matriz[posicion] = _palabras(mascara or 0)
+
+    def cambio_trabajo(self, antes, despues):
+        id_trabajo = (despues or antes)['id']
+        afectados = set(self.en_top.get(id_trabajo, ()))
+        self._quitar_trabajo(id_trabajo)
+        if despues is not None and despues.get('estado') == 'disponible':
+            self._agregar_trabajo(despues)
+            for termino in self.vectores[id_trabajo]:
+                afectados |= self.usuarios_por_termino.get(termino, set())
+        for id_usuario in afectados:
+            self._actualizar_top(id_usuario, id_trabajo)
+
+    # --- Usuarios ---
+
+    def _vaciar_usuarios(self):
+        self.terminos_usuario = {}   # id -> {término}
+        self.mascaras_usuario = {}   # id -> máscara de clases o None
+        self.usuarios_por_termino = {}
+        self.top = {}                # id usuario -> [(puntaje, id trabajo)] de mayor a menor
+        self.pesos = {}              # id usuario -> ({término: idf normalizado}, total de trabajos) con que se calculó
+        self.truncado = {}           # id usuario -> si quedaron candidatos fuera de la reserva
+        self.pendientes = set()      # usuarios cuyo top hay que recalcular
+        self.en_top = {}
+
+    def _quitar_usuario(self, id_usuario):
+        for termino in self.terminos_usuario.pop(id_usuario, ()):
+            usuarios = self.usuarios_por_termino[termino]
+            usuarios.discard(id_usuario)
+            if not usuarios:
+                del self.usuarios_por_termino[termino]
+        self.mascaras_usuario.pop(id_usuario, None)
+        self._fijar_top(id_usuario, None)
+        self.pendientes.discard(id_usuario)
+
+    def cambio_usuario(self, antes, despues):
+        id_usuario = (despues or antes)['id']
+        self._quitar_usuario(id_usuario)
+        if despues is None:
+            return
+        terminos = set(tokenizar(despues.get('habilidades')))
+        self.terminos_usuario[id_usuario] = terminos
+        self.mascaras_usuario[id_usuario] = mascara_horario(despues.get('horario_clases'))
+        for termino in terminos:
+            self.usuarios_por_termino.setdefault(termino, set()).add(id_usuario)
+        self.pendientes.add(id_usuario)
+
+    # --- Puntajes ---
+
+    def _pesos_usuario(self, id_usuario):
+        """{término: idf normalizado} del estudiante. Un término sin trabajos todavía recibe
+        el idf más alto, para puntuar bien al primero que lo tenga."""
+        total = len(self.registros)
+        pesos = {t: math.log(1 + total / (len(self.postings.get(t, ())) or 1)) for t in self.terminos_usuario.get(id_usuario, ())}
+        norma = math.sqrt(sum(p * p for p in pesos.values())) or 1.0
+        return {t: p / norma for t, p in pesos.items()}
+
+    def _compatible(self, id_usuario, id_trabajo):
+        clases, horario = self.mascaras_usuario.get(id_usuario), self.mascaras.get(id_trabajo)
+        return clases is None or horario is None or not (clases & horario)
+
+    def _puntaje(self, pesos, id_trabajo):
+        vector = self.vectores[id_trabajo]
+        return round(sum(peso * vector.get(termino, 0.0) for termino, peso in pesos.items()), DECIMALES)
+
+    def _calcular_top(self, id_usuario):
+        pesos = self._pesos_usuario(id_usuario)
+        self.pesos[id_usuario] = (pesos, len(self.registros))
+        if not pesos:
+            return [], False
+        if np is not None:
+            candidatos = self._candidatos_numpy(id_usuario, pesos)
+        else:
+            candidatos = []
+            for id_trabajo in set().union(*(self.postings.get(t, {}).keys() for t in pesos)):
+                if self._compatible(id_usuario, id_trabajo):
+                    candidatos.append((self._puntaje(pesos, id_trabajo), id_trabajo))
+        candidatos.sort(key=_clave_orden)
+        return candidatos[:RESERVA], len(candidatos) > RESERVA
+
+    def _columna(self, termino):
+        columna = self._columnas.get(termino)
+        if columna is None:
+            lista = self.postings[termino]
+            columna = (np.fromiter((self.posiciones[i] for i in lista), dtype=np.intp, count=len(lista)),
+                       np.fromiter(lista.values(), dtype=np.float64, count=len(lista)))
+            self._columnas[termino] = columna
+        return columna
+
+    def _candidatos_numpy(self, id_usuario, pesos):
+        """Puntajes de todos los trabajos a la vez: una suma por término del estudiante
+        y un AND de máscaras por bloques de 64 bits para los cruces de horario"""
+        puntajes = np.zeros(len(self.ids_en_posicion))
+        for termino, peso in pesos.items():
+            if termino not in self.postings:
+                continue
+            posiciones, valores = self._columna(termino)
+            puntajes[posiciones] += peso * valores
+
+        clases = self.mascaras_usuario.get(id_usuario)
+        if clases is not None:
+            if self._matriz_mascaras is None:
+                self._matriz_mascaras = np.array(
+                    [_palabras(self.mascaras.get(i) or 0) if i is not None else [0] * PALABRAS_MASCARA for i in self.ids_en_posicion],
+                    dtype=np.uint64).reshape(-1, PALABRAS_MASCARA)
+            cruces = (self._matriz_mascaras[:len(puntajes)] & np.array(_palabras(clases), dtype=np.uint64)).any(axis=1)
+            puntajes[cruces] = 0.0
+
+        positivos = np.flatnonzero(puntajes > 0)
+        if len(positivos) > RESERVA + 1:
+            # Solo hace falta ordenar los mejores (más uno para saber si hubo más)
+            mejores = np.argpartition(-puntajes[positivos], RESERVA)[:RESERVA + 1]
+            positivos = positivos[mejores]
+        return [(round(float(puntajes[p]), DECIMALES), self.ids_en_posicion[p]) for p in positivos]
+
+    # --- Top por usuario ---
+
+    def _fijar_top(self, id_usuario, top, truncado=False):
+        for _, id_trabajo in self.top.get(id_usuario, ()):
+            self._sacar_de_top(id_usuario, id_trabajo)
+        if top is None:
+            self.top.pop(id_usuario, None)
+            self.truncado.pop(id_usuario, None)
+            self.pesos.pop(id_usuario, None)
+            return
+        self.top[id_usuario] = top
+        self.truncado[id_usuario] = truncado
+        for _, id_trabajo in top:
+            self.en_top.setdefault(id_trabajo, set()).add(id_usuario)
+
+    def _actualizar_top(self, id_usuario, id_trabajo):
+        """Reubicar un trabajo en el top guardado del estudiante sin recalcular todo.
+
+        Si la reserva está truncada, todo trabajo fuera de ella vale a lo sumo lo que el
+        último de la reserva; un trabajo solo entra si supera a ese último."""
+        if id_usuario in self.pendientes or id_usuario not in self.top:
+            return
+        top = self.top[id_usuario]
+        estaba = id_usuario in self.en_top.get(id_trabajo, ())
+        puntaje = 0.0
+        if id_trabajo in self.registros and self._compatible(id_usuario, id_trabajo):
+            puntaje = self._puntaje(self.pesos[id_usuario][0], id_trabajo)
+        if not estaba and puntaje <= 0:
+            return  # Lo más común: el trabajo no le interesa a este estudiante
+
+        if estaba:
+            top[:] = [par for par in top if par[1] != id_trabajo]
+            self._sacar_de_top(id_usuario, id_trabajo)
+        if puntaje > 0:
+            clave = _clave_orden((puntaje, id_trabajo))
+            if (not self.truncado[id_usuario] and len(top) < RESERVA) or (top and clave < _clave_orden(top[-1])):
+                insort(top, (puntaje, id_trabajo), key=_clave_orden)
+                self.en_top.setdefault(id_trabajo, set()).add(id_usuario)
+                if len(top) > RESERVA:
+                    self._sacar_de_top(id_usuario, top.pop()[1])
+                    self.truncado[id_usuario] = True
+            else:
+                self.truncado[id_usuario] = True  # Queda como candidato fuera de la reserva
+        if self.truncado[id_usuario] and len(top) < TOP_K:
+            # Afuera de la reserva puede haber uno mejor que los que quedan
+            self.pendientes.add(id_usuario)
+
+    def _sacar_de_top(self, id_usuario, id_trabajo):
+        usuarios = self.en_top.get(id_trabajo)
+        if usuarios:
+            usuarios.discard(id_usuario)
+            if not usuarios:
+                del self.en_top[id_trabajo]
+
+    def para_usuario(self, id_usuario, k=TOP_K):
+        """Los ``k`` trabajos recomendados para el estudiante, del más afín al menos"""
+        with self._lock:
+            total = self.pesos.get(id_usuario, (None, 0))[1]
+            if (id_usuario in self.pendientes or id_usuario not in self.top
+                    or abs(len(self.registros) - total) > MAX_DESVIO_TOTAL * max(total, 1)):
+                self._fijar_top(id_usuario, *self._calcular_top(id_usuario))
+                self.pendientes.discard(id_usuario)
+            return [self.registros[i] for _, i in self.top[id_usuario][:k]]
+
+class _IndiceRecomendador(IndiceDerivado):
+    """Índice derivado que pasa los cambios de una colección al Recomendador"""
+
+    def __init__(self, recomendador, coleccion):
+        super().__init__()
+        self.recomendador = recomendador
+        self.coleccion = coleccion
+        self._lock = recomendador._lock
+
+    def reconstruir(self, registros):
+        r = self.recomendador
+        if self.coleccion == 'trabajos':
+            r._vaciar_trabajos()
+            for registro in registros:
+                if registro.get('estado') == 'disponible' and registro['id'] not in r.registros:
+                    r._agregar_trabajo(registro)
+        else:
+            r._vaciar_usuarios()
+            for registro in registros:
+                r.cambio_usuario(None, registro)
+        # Todos los tops quedan viejos
+        r.pendientes.update(r.terminos_usuario)
+
+    def aplicar(self, antes, despues):
+        if self.coleccion == 'trabajos':
+            self.recomendador.cambio_trabajo(antes, despues)
+        else:
+            self.recomendador.cambio_usuario(antes, despues)
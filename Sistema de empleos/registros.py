@@ -0,0 +1,182 @@
+"""Registros compactos para las colecciones que el almacenamiento JSON guarda en memoria.
+
+Un dict por registro ocupa cientos de bytes solo en su tabla hash; con ``__slots__``
+cada campo es una referencia en un arreglo fijo. Además:
+
+- los campos tipo enumeración (estado, tipo, destinatario...) y los ids se internan:
+  todos los registros comparten el mismo objeto de texto;
+- en trabajos y trabajos activos también el título, la descripción, el horario y la
+  ubicación, así la copia que guarda el trabajo activo no ocupa memoria aparte;
+- ``pago`` se guarda como número; si en el JSON era texto (p. ej. '150.49') el
+  registro recuerda que lo era y lo devuelve y escribe como texto.
+
+Para el resto del código un registro se comporta como un dict de solo lectura
+(``r['campo']``, ``r.get``, ``dict(r)``, ``{**r}``, ``r.copy()``) con los valores en
+el formato del JSON: ``r['pago']`` es '150.49' si se leyó '150.49' y 150 si se leyó
+150. Como atributo el valor es siempre el número (``r.pago`` es 150.49). Los campos
+que la clase no declara se guardan aparte, así que leer y volver a escribir un registro (``a_dict``) no pierde nada.
+"""
+import sys
+from collections.abc import Mapping
+
+def _numero(texto):
+    """'150.49' -> 150.49 y '50' -> 50, solo si al volver a texto queda igual; si no, el texto"""
+    if not isinstance(texto, str):
+        return texto
+    for tipo in (int, float):
+        try:
+            numero = tipo(texto)
+        except ValueError:
+            continue
+        return numero if str(numero) == texto else texto
+    return texto
+
+class Registro(Mapping):
+    """Base de los registros: ``CAMPOS`` en orden, los que se internan y los numéricos"""
+
+    __slots__ = ('_extra', '_de_texto')
+
+    CAMPOS = ()
+    INTERNADOS = frozenset()
+    NUMERICOS = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._declarados = frozenset(cls.CAMPOS)
+        cls._conjuntos = {}  # Los frozenset de ``_de_texto``, compartidos entre registros
+
+    @classmethod
+    def desde_dict(cls, datos):
+        registro = cls.__new__(cls)
+        extra = None
+        de_texto = None  # Campos numéricos que en el JSON eran texto
+        for campo, valor in datos.items():
+            if campo not in cls._declarados:
+                if extra is None:
+                    extra = {}
+                extra[campo] = valor
+                continue
+            if campo in cls.NUMERICOS:
+                numero = _numero(valor)
+                if numero is not valor:
+                    de_texto = (de_texto or frozenset()) | {campo}
+                valor = numero
+            elif type(valor) is str and campo in cls.INTERNADOS:
+                valor = sys.intern(valor)
+            setattr(registro, campo, valor)
+        registro._extra = extra
+        registro._de_texto = de_texto and cls._conjuntos.setdefault(de_texto, de_texto)
+        return registro
+
+    def a_dict(self):
+        """El registro en el formato de los archivos JSON"""
+        return dict(self)
+
+    copy = a_dict
+
+    # --- Interfaz de dict de solo lectura ---
+
+    def __getitem__(self, campo):
+        if campo in self._declarados:
+            try:
+                valor = getattr(self, campo)
+            except AttributeError:
+                raise KeyError(campo) from None
+            if self._de_texto and campo in self._de_texto:
+                return str(valor)
+            return valor
+        if self._extra is not None and campo in self._extra:
+            return self._extra[campo]
+        raise KeyError(campo)
+
+    def __iter__(self):
+        for campo in self.CAMPOS:
+            if hasattr(self, campo):
+                yield campo
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict(self)!r})'
+
+class Usuario(Registro):
+    CAMPOS = ('id', 'nombres', 'apellidos', 'email', 'password', 'codigo_estudiante', 'dni', 'telefono',
+              'universidad', 'carrera', 'horario_clases', 'habilidades', 'fecha_registro')
+    INTERNADOS = frozenset({'id', 'universidad', 'carrera'})
+    __slots__ = CAMPOS
+
+class Empleador(Registro):
+    CAMPOS = ('id', 'empresa', 'ruc', 'dni_representante', 'nombre_representante', 'email', 'password',
+              'telefono', 'direccion', 'rubro', 'fecha_registro')
+    INTERNADOS = frozenset({'id', 'rubro'})
+    __slots__ = CAMPOS
+
+class Trabajo(Registro):
+    CAMPOS = ('id', 'empleador_id', 'titulo', 'descripcion', 'categoria', 'pago', 'horario', 'ubicacion',
+              'requisitos', 'estado', 'fecha_publicacion')
+    INTERNADOS = frozenset({'id', 'empleador_id', 'titulo', 'descripcion', 'categoria', 'horario',
+                            'ubicacion', 'estado'})
+    NUMERICOS = frozenset({'pago'})
+    __slots__ = CAMPOS
+
+class Postulacion(Registro):
+    CAMPOS = ('id', 'trabajo_id', 'usuario_id', 'empleador_id', 'estado', 'fecha_postulacion', 'mensaje',
+              'fecha_respuesta')
+    INTERNADOS = frozenset({'id', 'trabajo_id', 'usuario_id', 'empleador_id', 'estado'})
+    __slots__ = CAMPOS
+
+class TrabajoActivo(Registro):
+    CAMPOS = ('id', 'postulacion_id', 'trabajo_id', 'usuario_id', 'empleador_id', 'titulo', 'descripcion',
+              'pago', 'horario_trabajo', 'ubicacion', 'estado', 'fecha_inicio', 'fecha_finalizacion')
+    # Título, descripción, horario y ubicación son copias de los del trabajo: internados, se comparten
+    INTERNADOS = frozenset({'id', 'postulacion_id', 'trabajo_id', 'usuario_id', 'empleador_id', 'titulo',
+                            'descripcion', 'horario_trabajo', 'ubicacion', 'estado'})
+    NUMERICOS = frozenset({'pago'})
+    __slots__ = CAMPOS
+
+class Mensaje(Registro):
+    CAMPOS = ('id', 'de_user_id', 'para_user_id', 'mensaje', 'fecha', 'leido')
+    INTERNADOS = frozenset({'id', 'de_user_id', 'para_user_id'})
+    __slots__ = CAMPOS
+
+class Calificacion(Registro):
+    CAMPOS = ('id', 'trabajo_activo_id', 'empleador_id', 'usuario_id', 'puntuacion', 'comentario',
+              'fecha_calificacion', 'trabajo_titulo')
+    INTERNADOS = frozenset({'id', 'trabajo_activo_id', 'empleador_id', 'usuario_id', 'trabajo_titulo'})
+    __slots__ = CAMPOS
+
+class Reporte(Registro):
+    CAMPOS = ('id', 'reportador_id', 'reportador_tipo', 'reportado_id', 'reportado_tipo', 'reportado_nombre',
+              'titulo', 'descripcion', 'categoria', 'prioridad', 'estado', 'fecha_reporte', 'respuesta_admin',
+              'fecha_respuesta', 'admin_id')
+    INTERNADOS = frozenset({'id', 'reportador_id', 'reportador_tipo', 'reportado_id', 'reportado_tipo',
+                            'categoria', 'prioridad', 'estado', 'admin_id'})
+    __slots__ = CAMPOS
+
+class Alerta(Registro):
+    CAMPOS = ('id', 'titulo', 'mensaje', 'tipo', 'prioridad', 'destinatario', 'fecha_expiracion',
+              'fecha_envio', 'admin_id', 'estado')
+    INTERNADOS = frozenset({'id', 'tipo', 'prioridad', 'destinatario', 'admin_id', 'estado'})
+    __slots__ = CAMPOS
+
+# Clase de registro de cada colección; las demás se guardan como dict
+CLASES = {
+    'usuarios': Usuario,
+    'empleadores': Empleador,
+    'trabajos': Trabajo,
+    'postulaciones': Postulacion,
+    'trabajos_activos': TrabajoActivo,
+    'mensajes': Mensaje,
+    'calificaciones': Calificacion,
+    'reportes': Reporte,
+    'alertas': Alerta,
+}
+
+def a_json(objeto):
+    """``default`` para json.dump/jsonify: un registro se escribe como su dict"""
+    if isinstance(objeto, Registro):
+        return objeto.a_dict()
+    raise TypeError(f'{type(objeto).__name__} no se puede convertir a JSON')
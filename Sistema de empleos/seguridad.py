@@ -0,0 +1,103 @@
+"""Protección del inicio de sesión: límite de intentos y cálculo de contraseñas acotado.
+
+- ``LimiteIntentos``: cubeta de tokens por clave (IP, cuenta). Cada intento gasta un
+  token y los tokens se recargan a ritmo constante; sin tokens el intento se rechaza
+  antes de calcular ningún hash. El estado vive en un backend intercambiable con el
+  método ``tomar``; ``CubetasMemoria`` lo guarda en el proceso.
+- ``PoolContrasenas``: los hashes (scrypt/PBKDF2, caros a propósito) se calculan en un
+  grupo fijo de hilos con una cola limitada. Con la cola llena se rechaza en el acto,
+  así un ataque no acumula peticiones esperando CPU y el resto de la aplicación sigue
+  respondiendo.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+class Ocupado(Exception):
+    """La cola de cálculo de contraseñas está llena"""
+
+class CubetasMemoria:
+    """Backend de ``LimiteIntentos`` en memoria del proceso. Guarda como mucho
+    ``max_claves`` cubetas; al pasarse olvida las que llevan más tiempo sin usarse."""
+
+    def __init__(self, max_claves=100000):
+        self.max_claves = max_claves
+        self._cubetas = OrderedDict()  # clave -> (tokens, momento de la última recarga)
+        self._lock = threading.Lock()
+
+    def tomar(self, clave, capacidad, por_segundo, ahora):
+        """Gastar un token de la cubeta. Devuelve 0 si se pudo, o los segundos que faltan
+        para que haya uno."""
+        with self._lock:
+            tokens, momento = self._cubetas.pop(clave, (capacidad, ahora))
+            tokens = min(capacidad, tokens + (ahora - momento) * por_segundo)
+            if tokens >= 1:
+                self._cubetas[clave] = (tokens - 1, ahora)
+                espera = 0
+            else:
+                self._cubetas[clave] = (tokens, ahora)
+                espera = (1 - tokens) / por_segundo
+            while len(self._cubetas) > self.max_claves:
+                self._cubetas.popitem(last=False)
+            return espera
+
+    def reiniciar(self, clave):
+        with self._lock:
+            self._cubetas.pop(clave, None)
+
+class LimiteIntentos:
+    """``capacidad`` intentos seguidos por clave, recargando uno cada ``periodo`` segundos"""
+
+    def __init__(self, nombre, capacidad, periodo, backend=None):
+        self.nombre = nombre
+        self.capacidad = capacidad
+        self.por_segundo = 1 / periodo
+        self.backend = backend or CubetasMemoria()
+
+    def intentar(self, clave):
+        """Gastar un intento; 0 si está permitido o los segundos que hay que esperar"""
+        return self.backend.tomar(f'{self.nombre}:{clave}', self.capacidad, self.por_segundo, time.monotonic())
+
+    def reiniciar(self, clave):
+        """Devolver todos los intentos a la clave (p. ej. tras un inicio de sesión correcto)"""
+        self.backend.reiniciar(f'{self.nombre}:{clave}')
+
+class PoolContrasenas:
+    """Cálculo de hashes de contraseña en ``hilos`` hilos con a lo sumo ``max_en_cola``
+    esperando. Con una cuenta inexistente se compara igual contra un hash ficticio, así
+    el tiempo de respuesta no revela si el email está registrado."""
+
+    def __init__(self, hilos=None, max_en_cola=32):
+        hilos = hilos or os.cpu_count() or 2
+        self._ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='contrasenas')
+        self._plazas = threading.BoundedSemaphore(hilos + max_en_cola)
+        self._hash_ficticio = None
+
+    def _ejecutar(self, funcion, *argumentos):
+        if not self._plazas.acquire(blocking=False):
+            raise Ocupado()
+        try:
+            return self._ejecutor.submit(funcion, *argumentos).result()
+        finally:
+            self._plazas.release()
+
+    def generar(self, password):
+        """Hash para guardar una contraseña nueva"""
+        return self._ejecutar(generate_password_hash, password)
+
+    def verificar(self, cuentas, password):
+        """La primera de ``cuentas`` cuyo hash ('password') corresponde a la contraseña, o None.
+        Sin cuentas (email no registrado) se hace el mismo trabajo contra un hash ficticio."""
+        if not cuentas:
+            if self._hash_ficticio is None:
+                self._hash_ficticio = generate_password_hash(os.urandom(16).hex())
+            self._ejecutar(check_password_hash, self._hash_ficticio, password)
+            return None
+        for cuenta in cuentas:
+            if self._ejecutar(check_password_hash, cuenta['password'], password):
+                return cuenta
+        return None
@@ -0,0 +1,183 @@
+"""Sesiones guardadas en el servidor, con la cuenta que inició sesión en caché.
+
+La cookie solo lleva un identificador aleatorio; el contenido de la sesión (user_id,
+user_type, mensajes flash...) vive en un backend del servidor:
+
+- ``SesionesMemoria`` (por defecto): en el proceso, olvidando las sesiones usadas hace
+  más tiempo cuando hay demasiadas. Con varios workers cada uno tiene las suyas.
+- ``SesionesSQLite``: un archivo local compartido por todos los workers.
+
+Cada sesión puede llevar además el registro de su cuenta (sin la contraseña) con un
+vencimiento, ``cuenta_en_cache``. Las páginas autenticadas lo leen de ahí en vez de
+buscar el perfil en cada petición; ``olvidar_cuenta`` lo descarta en todas las
+sesiones de esa cuenta (al editar el perfil o eliminar la cuenta).
+"""
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from werkzeug.datastructures import CallbackDict
+
+def clave_cuenta(datos):
+    """'tipo:id' de la cuenta con la sesión iniciada, o None"""
+    if datos.get('user_id') is None:
+        return None
+    return f"{datos.get('user_type')}:{datos['user_id']}"
+
+class SesionServidor(CallbackDict, SessionMixin):
+    """Diccionario de la sesión; ``sid`` es su identificador en el backend"""
+
+    def __init__(self, datos=None, sid=None, cuenta_en_cache=None):
+        def al_cambiar(sesion):
+            sesion.modified = True
+        super().__init__(datos, al_cambiar)
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self.cuenta_inicial = clave_cuenta(self)
+        self.cuenta_en_cache = cuenta_en_cache  # {'clave', 'registro', 'vence'} o None
+
+class SesionesMemoria:
+    """Backend en memoria del proceso con a lo sumo ``max_sesiones`` sesiones"""
+
+    def __init__(self, max_sesiones=10000):
+        self.max_sesiones = max_sesiones
+        self._sesiones = OrderedDict()  # sid -> [datos, cuenta, cache, vence]
+        self._por_cuenta = {}           # cuenta -> {sid}
+        self._lock = threading.Lock()
+
+    def cargar(self, sid, ahora):
+        """(datos, cache) de la sesión, o None si no existe o venció"""
+        with self._lock:
+            entrada = self._sesiones.get(sid)
+            if entrada is None:
+                return None
+            if entrada[3] <= ahora:
+                self._quitar(sid)
+                return None
+            self._sesiones.move_to_end(sid)
+            return entrada[0], entrada[2]
+
+    def guardar(self, sid, datos, cuenta, cache, vence):
+        with self._lock:
+            self._quitar(sid)
+            self._sesiones[sid] = [datos, cuenta, cache, vence]
+            if cuenta:
+                self._por_cuenta.setdefault(cuenta, set()).add(sid)
+            while len(self._sesiones) > self.max_sesiones:
+                self._quitar(next(iter(self._sesiones)))
+
+    def eliminar(self, sid):
+        with self._lock:
+            self._quitar(sid)
+
+    def olvidar_cuenta(self, cuenta):
+        """Descartar la cuenta en caché de todas sus sesiones"""
+        with self._lock:
+            for sid in self._por_cuenta.get(cuenta, ()):
+                self._sesiones[sid][2] = None
+
+    def _quitar(self, sid):
+        entrada = self._sesiones.pop(sid, None)
+        if entrada is not None and entrada[1]:
+            sids = self._por_cuenta[entrada[1]]
+            sids.discard(sid)
+            if not sids:
+                del self._por_cuenta[entrada[1]]
+
+class SesionesSQLite:
+    """Backend en una base SQLite (modo WAL), válido entre varios workers. Las sesiones
+    vencidas se borran como mucho una vez por hora, al guardar."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._ultima_limpieza = None
+
+    def _conexion(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            con.execute('PRAGMA journal_mode=WAL')
+            con.execute('PRAGMA synchronous=NORMAL')
+            con.execute('CREATE TABLE IF NOT EXISTS sesiones (sid TEXT PRIMARY KEY, datos TEXT NOT NULL, '
+                        'cuenta TEXT, cache TEXT, vence REAL NOT NULL)')
+            con.execute('CREATE INDEX IF NOT EXISTS idx_sesiones_cuenta ON sesiones (cuenta)')
+            self._local.con = con
+        return con
+
+    def cargar(self, sid, ahora):
+        fila = self._conexion().execute('SELECT datos, cache FROM sesiones WHERE sid = ? AND vence > ?',
+                                        (sid, ahora)).fetchone()
+        return tuple(fila) if fila else None
+
+    def guardar(self, sid, datos, cuenta, cache, vence):
+        con = self._conexion()
+        con.execute('INSERT OR REPLACE INTO sesiones (sid, datos, cuenta, cache, vence) VALUES (?, ?, ?, ?, ?)',
+                    (sid, datos, cuenta, cache, vence))
+        if self._ultima_limpieza is None or time.monotonic() - self._ultima_limpieza > 3600:
+            self._ultima_limpieza = time.monotonic()
+            con.execute('DELETE FROM sesiones WHERE vence <= ?', (time.time(),))
+
+    def eliminar(self, sid):
+        self._conexion().execute('DELETE FROM sesiones WHERE sid = ?', (sid,))
+
+    def olvidar_cuenta(self, cuenta):
+        self._conexion().execute('UPDATE sesiones SET cache = NULL WHERE cuenta = ?', (cuenta,))
+
+class InterfazSesiones(SessionInterface):
+    """``app.session_interface`` que guarda las sesiones en ``backend``.
+
+    Solo se escribe en el backend si la sesión cambió. Al iniciar o cerrar sesión
+    (cambia la cuenta) se le da un identificador nuevo y se borra el anterior."""
+
+    serializer = session_json_serializer
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            guardada = self.backend.cargar(sid, time.time())
+            if guardada is not None:
+                datos, cache = guardada
+                return SesionServidor(self.serializer.loads(datos), sid, json.loads(cache) if cache else None)
+        return SesionServidor()
+
+    def save_session(self, app, session, response):
+        nombre = self.get_cookie_name(app)
+        dominio = self.get_cookie_domain(app)
+        ruta = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not session:
+            if session.sid is not None:
+                self.backend.eliminar(session.sid)
+                response.delete_cookie(nombre, domain=dominio, path=ruta,
+                                       secure=self.get_cookie_secure(app), httponly=self.get_cookie_httponly(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+        if not session.modified:
+            return
+
+        cuenta = clave_cuenta(session)
+        if cuenta != session.cuenta_inicial:
+            session.cuenta_en_cache = None
+            if session.sid is not None:
+                # Identificador nuevo al cambiar de cuenta: uno conocido antes del login no sirve después
+                self.backend.eliminar(session.sid)
+                session.sid = None
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        cache = session.cuenta_en_cache
+        self.backend.guardar(session.sid, self.serializer.dumps(dict(session)), cuenta,
+                             json.dumps(cache) if cache else None,
+                             time.time() + app.permanent_session_lifetime.total_seconds())
+        response.set_cookie(nombre, session.sid, expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app), domain=dominio, path=ruta,
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
@@ -0,0 +1,173 @@
+"""Cola de tareas en segundo plano para el trabajo lento que no tiene que esperar la respuesta.
+
+Las tareas se guardan en la colección ``tareas`` (así sobreviven a un reinicio y las ve
+cualquier worker) con su estado: 'pendiente', 'en_curso', 'completada' o 'fallida'.
+Un grupo de hilos toma las pendientes con una transacción, de modo que cada tarea la
+ejecuta un solo hilo aunque haya varios procesos. Lo encolado en el propio proceso
+despierta a un hilo en el acto; lo que encolan otros procesos lo busca un solo hilo
+cada ``ESPERA`` segundos. Los hilos se arrancan con ``iniciar`` solo en los procesos
+que atienden peticiones; un comando de consola puede encolar sin ejecutar nada.
+
+Una tarea que falla se reintenta con espera creciente hasta ``MAX_INTENTOS``; una
+'en_curso' cuyo plazo venció (el proceso murió a mitad) vuelve a tomarse.
+
+Las funciones se registran por nombre con ``@cola.tarea('nombre')``; sus argumentos y
+su resultado tienen que poder guardarse como JSON y, como una tarea puede ejecutarse
+más de una vez, repetirla no debe causar daño.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+class ColaTareas:
+    """Tareas persistidas en ``almacen`` y ejecutadas por ``hilos`` hilos de este proceso"""
+
+    MAX_INTENTOS = 3
+    REINTENTO = 5         # segundos de espera tras el primer fallo; se duplica en cada intento
+    PLAZO = 300           # segundos que una tarea puede estar 'en_curso' antes de volver a tomarse
+    ESPERA = 30           # cada cuánto se buscan tareas encoladas por otros procesos
+    RETENCION = timedelta(days=1)  # cuánto se conservan las terminadas para consultar su estado
+
+    def __init__(self, almacen, hilos=2):
+        self.almacen = almacen
+        self.hilos = hilos
+        self.funciones = {}
+        self._despertar = threading.Condition()
+        self._pendientes_locales = 0
+        self._proximo_reintento = None  # time.monotonic() del reintento programado más próximo
+        self._lock = threading.Lock()
+        self._hilos = []
+        self._pid = None  # Proceso donde corren los hilos (tras un fork no existen)
+        self._ultima_limpieza = None
+
+    def tarea(self, nombre):
+        """Decorador que registra la función con ese nombre"""
+        def registrar(funcion):
+            self.funciones[nombre] = funcion
+            return funcion
+        return registrar
+
+    def encolar(self, nombre, *argumentos):
+        """Guardar la tarea y despertar a un hilo; devuelve su id para consultar el estado"""
+        if nombre not in self.funciones:
+            raise ValueError(f'Tarea desconocida: {nombre}')
+        tarea = {
+            'id': self.almacen.siguiente_id('tareas'),
+            'nombre': nombre,
+            'argumentos': list(argumentos),
+            'estado': 'pendiente',
+            'intentos': 0,
+            'ejecutar_desde': datetime.now().isoformat(),
+            'fecha_creacion': datetime.now().isoformat(),
+            'error': None,
+            'resultado': None
+        }
+        self.almacen.insertar('tareas', tarea)
+        self._avisar()
+        return tarea['id']
+
+    def _avisar(self):
+        """Despertar a un hilo para que busque una tarea"""
+        with self._despertar:
+            self._pendientes_locales += 1
+            self._despertar.notify()
+
+    def estado(self, id_tarea):
+        return self.almacen.obtener('tareas', id_tarea)
+
+    def iniciar(self):
+        """Arrancar los hilos si todavía no corren en este proceso. El primero es el único que
+        busca periódicamente tareas de otros procesos."""
+        if self._pid == os.getpid() and len(self._hilos) >= self.hilos:
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._hilos, self._pid = [], os.getpid()
+            while len(self._hilos) < self.hilos:
+                hilo = threading.Thread(target=self._ejecutar, args=(not self._hilos,),
+                                        name=f'tareas-{len(self._hilos) + 1}', daemon=True)
+                self._hilos.append(hilo)
+                hilo.start()
+
+    # --- Ejecución ---
+
+    def _tomar(self):
+        """Marcar como 'en_curso' la próxima tarea lista (o None), en una transacción"""
+        ahora = datetime.now()
+        momento = ahora.isoformat()
+        def tomar(tx):
+            pendientes = tx.buscar('tareas', estado='pendiente')
+            listas = [t for t in pendientes if t['ejecutar_desde'] <= momento]
+            listas += [t for t in tx.buscar('tareas', estado='en_curso') if t['plazo'] <= momento]
+            if not listas:
+                return None
+            tarea = min(listas, key=lambda t: (t['ejecutar_desde'], t['fecha_creacion']))
+            cambios = {
+                'estado': 'en_curso',
+                'intentos': tarea['intentos'] + 1,
+                'plazo': (ahora + timedelta(seconds=self.PLAZO)).isoformat()
+            }
+            tx.actualizar('tareas', tarea['id'], cambios)
+            return dict(tarea, **cambios)
+        return self.almacen.en_transaccion(tomar)
+
+    def _correr(self, tarea):
+        try:
+            resultado = self.funciones[tarea['nombre']](*tarea['argumentos'])
+        except Exception as e:
+            print(f"⚠️ Tarea {tarea['id']} ({tarea['nombre']}) falló en el intento {tarea['intentos']}: {e}")
+            if tarea['intentos'] < self.MAX_INTENTOS:
+                espera = self.REINTENTO * 2 ** (tarea['intentos'] - 1)
+                cambios = {'estado': 'pendiente', 'error': str(e),
+                           'ejecutar_desde': (datetime.now() + timedelta(seconds=espera)).isoformat()}
+                with self._despertar:
+                    momento = time.monotonic() + espera
+                    if self._proximo_reintento is None or momento < self._proximo_reintento:
+                        self._proximo_reintento = momento
+            else:
+                cambios = {'estado': 'fallida', 'error': str(e), 'fecha_fin': datetime.now().isoformat()}
+        else:
+            cambios = {'estado': 'completada', 'error': None, 'resultado': resultado,
+                       'fecha_fin': datetime.now().isoformat()}
+            print(f"✅ Tarea {tarea['id']} ({tarea['nombre']}) completada")
+        self.almacen.actualizar('tareas', tarea['id'], cambios)
+
+    def _limpiar(self):
+        """Eliminar las tareas terminadas hace más de RETENCION"""
+        limite = (datetime.now() - self.RETENCION).isoformat()
+        for estado in ('completada', 'fallida'):
+            for tarea in self.almacen.buscar('tareas', estado=estado):
+                if tarea.get('fecha_fin', '') < limite:
+                    self.almacen.eliminar('tareas', tarea['id'])
+
+    def _ejecutar(self, sondear):
+        while True:
+            try:
+                tarea = self._tomar()
+                if tarea is not None:
+                    self._avisar()  # Puede haber más: que otro hilo busque en paralelo
+                    if tarea['nombre'] in self.funciones:
+                        self._correr(tarea)
+                    else:
+                        self.almacen.actualizar('tareas', tarea['id'], {
+                            'estado': 'fallida', 'error': 'Tarea desconocida',
+                            'fecha_fin': datetime.now().isoformat()})
+                    continue
+                ultima = self._ultima_limpieza
+                if sondear and (ultima is None or time.monotonic() - ultima > 3600):
+                    self._ultima_limpieza = time.monotonic()
+                    self._limpiar()
+            except Exception as e:
+                print(f"⚠️ Error en la cola de tareas: {e}")
+            with self._despertar:
+                if not self._pendientes_locales:
+                    # Los demás hilos duermen hasta que los despierten (o hasta un reintento)
+                    espera = self.ESPERA if sondear else None
+                    if self._proximo_reintento is not None:
+                        hasta_reintento = max(self._proximo_reintento - time.monotonic(), 0)
+                        if espera is None or hasta_reintento <= espera:
+                            espera = hasta_reintento
+                            self._proximo_reintento = None
+                    self._despertar.wait(espera)
+                self._pendientes_locales = max(self._pendientes_locales - 1, 0)
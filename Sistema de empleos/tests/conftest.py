@@ -0,0 +1,28 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# Los módulos de la aplicación se importan como en app.py, desde su carpeta
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from almacenamiento import AlmacenamientoJSON
+
+@pytest.fixture
+def directorio(tmp_path):
+    return str(tmp_path / 'data')
+
+@pytest.fixture
+def almacen(directorio):
+    """Almacenamiento JSON vacío en un directorio temporal"""
+    almacen = AlmacenamientoJSON(directorio)
+    almacen.inicializar()
+    return almacen
+
+@pytest.fixture
+def app_modulo(tmp_path, monkeypatch):
+    # app crea data/ en el directorio actual al importarse
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('ALMACENAMIENTO', 'json')
+    return importlib.import_module('app')
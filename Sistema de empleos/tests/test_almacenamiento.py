@@ -0,0 +1,57 @@
+"""Diario de operaciones y contadores de ids del almacenamiento JSON"""
+import os
+
+from almacenamiento import AlmacenamientoJSON
+
+def ids(almacen, coleccion):
+    return sorted(r['id'] for r in almacen.todos(coleccion))
+
+def test_el_diario_se_reproduce_al_abrir(almacen, directorio):
+    almacen.insertar('trabajos', {'id': '1', 'titulo': 'Mesero', 'estado': 'disponible'})
+    almacen.insertar('trabajos', {'id': '2', 'titulo': 'Tutor', 'estado': 'disponible'})
+    almacen.actualizar('trabajos', '1', {'estado': 'ocupado'})
+    almacen.eliminar('trabajos', '2')
+
+    # Las instantáneas siguen vacías: todo sale del diario
+    assert os.path.getsize(os.path.join(directorio, 'operaciones.log')) > 0
+    otro = AlmacenamientoJSON(directorio)
+    assert ids(otro, 'trabajos') == ['1']
+    assert otro.obtener('trabajos', '1')['estado'] == 'ocupado'
+
+def test_escritura_cortada_no_se_come_la_siguiente(almacen, directorio):
+    diario = os.path.join(directorio, 'operaciones.log')
+    almacen.insertar('trabajos', {'id': '1', 'titulo': 'Mesero'})
+    with open(diario, 'ab') as f:
+        f.write(b'{"origen": "muerto", "ops": [{"op": "insertar", "col": "trab')  # Proceso muerto a mitad
+
+    segundo = AlmacenamientoJSON(directorio)
+    assert ids(segundo, 'trabajos') == ['1']
+    # Leer no trunca: la cola puede ser una escritura en curso de otro proceso
+    tamano = os.path.getsize(diario)
+    segundo.insertar('trabajos', {'id': '2', 'titulo': 'Tutor'})
+    assert os.path.getsize(diario) > tamano
+
+    tercero = AlmacenamientoJSON(directorio)
+    assert ids(tercero, 'trabajos') == ['1', '2']
+
+    # Compactar descarta la cola rota y deja las instantáneas completas
+    tercero.compactar()
+    assert os.path.getsize(diario) == 0
+    assert ids(AlmacenamientoJSON(directorio), 'trabajos') == ['1', '2']
+
+def test_ids_unicos_entre_instancias(almacen, directorio, monkeypatch):
+    monkeypatch.setattr(AlmacenamientoJSON, 'TAM_BLOQUE_IDS', 3)  # Muchas reservas
+    almacen.insertar('trabajos', {'id': '7', 'titulo': 'Existente'})
+    otro = AlmacenamientoJSON(directorio)
+
+    generados = []
+    for _ in range(50):
+        generados.append(almacen.siguiente_id('trabajos'))
+        generados.append(otro.siguiente_id('trabajos'))
+
+    assert len(set(generados)) == len(generados)
+    assert min(int(i) for i in generados) > 7
+
+    # Un proceso nuevo sigue después de todo lo reservado
+    nuevo = AlmacenamientoJSON(directorio).siguiente_id('trabajos')
+    assert int(nuevo) > max(int(i) for i in generados)
@@ -0,0 +1,29 @@
+"""Analítica: el resumen guarda lo compactado y el log solo lo que vino después"""
+import os
+from datetime import date
+
+from analitica import RegistroAnalitica
+
+def _por_dia(registro):
+    periodos, series = registro.consultar(date(2025, 1, 1), date(2025, 1, 3), eventos=('postulacion',))
+    return series['postulacion']['total']
+
+def test_compactar_y_leer_desde_el_resumen(tmp_path):
+    ruta = str(tmp_path / 'analitica.log')
+    registro = RegistroAnalitica(ruta, max_log=200)
+    pasos = [registro.registrar('postulacion', f'2025-01-0{1 + i % 3}T10:00:00') for i in range(6)]
+    assert pasos.count(True) == 1  # Solo el evento con el que el log pasa de max_log
+
+    assert _por_dia(registro) == [2, 2, 2]
+    # La consulta vio el log largo y lo compactó: queda vacío y las series en el resumen
+    assert os.path.getsize(ruta) == 0
+    registro.registrar('postulacion', '2025-01-03T11:00:00')
+
+    # Otro proceso arranca: carga el resumen y suma solo el evento nuevo
+    otro = RegistroAnalitica(ruta, max_log=200)
+    assert _por_dia(otro) == _por_dia(registro) == [2, 2, 3]
+
+    # Reconstruir reemplaza el log por los datos y descarta el resumen
+    assert otro.reconstruir(lambda: [('postulacion', '2025-01-02T09:00:00', None, None)]) == 1
+    assert not os.path.exists(f'{ruta}.resumen')
+    assert _por_dia(registro) == _por_dia(RegistroAnalitica(ruta)) == [0, 1, 0]
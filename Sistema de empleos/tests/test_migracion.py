@@ -0,0 +1,26 @@
+"""Migración de data/*.json a SQLite"""
+from almacenamiento import AlmacenamientoJSON, crear_almacenamiento
+
+def test_migracion_con_escrituras_solo_en_el_diario(app_modulo, directorio):
+    origen = AlmacenamientoJSON(directorio)
+    origen.inicializar()
+    for i in range(1, 6):
+        origen.insertar('usuarios', {'id': str(i), 'nombres': f'U{i}', 'email': f'u{i}@x.com'})
+        origen.insertar('empleadores', {'id': str(i), 'empresa': f'E{i}', 'email': f'e{i}@x.com'})
+        origen.insertar('trabajos', {'id': str(i), 'empleador_id': str(i), 'titulo': f'T{i}', 'estado': 'disponible'})
+        origen.insertar('postulaciones', {'id': str(i), 'trabajo_id': str(i), 'usuario_id': str(i),
+                                          'empleador_id': str(i), 'estado': 'pendiente'})
+    origen.actualizar('trabajos', '1', {'estado': 'ocupado'})
+    origen.eliminar('postulaciones', '5')
+
+    destino = crear_almacenamiento('sqlite', directorio)
+    totales = app_modulo.migrar_datos(destino, tam_lote=2, directorio=directorio)
+
+    for coleccion in ('usuarios', 'empleadores', 'trabajos', 'postulaciones'):
+        assert totales[coleccion] == origen.contar(coleccion) == destino.contar(coleccion)
+    assert totales['postulaciones'] == 4
+    assert destino.obtener('trabajos', '1')['estado'] == 'ocupado'
+    assert app_modulo.verificar_migracion(destino, totales)
+
+    # Repetirla reemplaza por id: los conteos no cambian
+    assert app_modulo.migrar_datos(destino, tam_lote=3, directorio=directorio) == totales
@@ -0,0 +1,68 @@
+"""Transacciones optimistas: conflicto al confirmar y reintento"""
+import pytest
+
+from almacenamiento import AlmacenamientoJSON, Conflicto
+
+@pytest.fixture
+def con_trabajo(almacen):
+    almacen.insertar('trabajos', {'id': '1', 'titulo': 'Mesero', 'estado': 'disponible', 'vacantes': 2})
+    return almacen
+
+def test_conflicto_y_reintento(con_trabajo, directorio):
+    otro = AlmacenamientoJSON(directorio)  # Otro proceso sobre los mismos datos
+    llamadas = []
+
+    def ocupar_vacante(tx):
+        trabajo = tx.obtener('trabajos', '1')
+        llamadas.append(trabajo['vacantes'])
+        if len(llamadas) == 1:
+            # Otro proceso cambia el trabajo entre la lectura y la confirmación
+            otro.actualizar('trabajos', '1', {'vacantes': trabajo['vacantes'] - 1})
+        tx.actualizar('trabajos', '1', {'vacantes': trabajo['vacantes'] - 1})
+        return trabajo['vacantes'] - 1
+
+    assert con_trabajo.en_transaccion(ocupar_vacante) == 0
+    # El primer intento chocó y el segundo partió de lo que escribió el otro proceso
+    assert llamadas == [2, 1]
+    assert con_trabajo.obtener('trabajos', '1')['vacantes'] == 0
+    assert AlmacenamientoJSON(directorio).obtener('trabajos', '1')['vacantes'] == 0
+
+def test_sin_reintentos_el_conflicto_no_escribe_nada(con_trabajo, directorio):
+    otro = AlmacenamientoJSON(directorio)
+
+    def cambiar(tx):
+        tx.obtener('trabajos', '1')
+        otro.actualizar('trabajos', '1', {'titulo': 'Cambiado por otro'})
+        tx.actualizar('trabajos', '1', {'estado': 'ocupado'})
+        tx.insertar('trabajos_activos', {'id': '1', 'trabajo_id': '1'})
+
+    with pytest.raises(Conflicto):
+        con_trabajo.en_transaccion(cambiar, intentos=1)
+    assert con_trabajo.obtener('trabajos', '1')['estado'] == 'disponible'
+    assert con_trabajo.contar('trabajos_activos') == 0
+
+def test_dos_aceptaciones_simultaneas_crean_un_solo_trabajo_activo(app_modulo, con_trabajo, directorio):
+    """gestionar_postulacion: al reintentar ve que ya se aceptó y no repite"""
+    con_trabajo.actualizar('trabajos', '1', {'descripcion': '', 'pago': 150, 'horario': 'Noche',
+                                             'ubicacion': 'Lima'})
+    con_trabajo.insertar('postulaciones', {'id': '1', 'trabajo_id': '1', 'usuario_id': '7',
+                                           'estado': 'pendiente'})
+    otro = AlmacenamientoJSON(directorio)
+    otra_pestana = []
+
+    def aceptar(almacen, id_activo, antes_de_confirmar=None):
+        def transaccion(tx):
+            resultado = app_modulo.responder_postulacion(tx, '1', '1', 'aceptar', '3', id_activo)
+            if antes_de_confirmar:
+                antes_de_confirmar()
+            return resultado
+        return almacen.en_transaccion(transaccion)
+
+    # La otra pestaña acepta justo después de que esta leyó la postulación
+    resultado = aceptar(con_trabajo, 'a', lambda: otra_pestana or otra_pestana.append(aceptar(otro, 'b')))
+
+    assert otra_pestana == ['ok']
+    assert resultado == 'procesada'
+    activos = con_trabajo.todos('trabajos_activos')
+    assert [(t['id'], t['usuario_id'], t['pago']) for t in activos] == [('b', '7', 150)]
+    assert con_trabajo.obtener('trabajos', '1')['estado'] == 'ocupado'
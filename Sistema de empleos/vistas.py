@@ -0,0 +1,108 @@
+"""Modelos de vista: exactamente las filas que muestra cada página, ya unidas.
+
+Cada constructor arma lo que la plantilla recorre con búsquedas por campos indexados
+(``empleador_id``, ``id``...) en lugar de pasar colecciones enteras para filtrarlas y
+cruzarlas en Jinja. Así el costo de renderizar depende de lo que la página muestra y
+no del tamaño de la base.
+
+La plantilla recibe los campos del modelo como variables (``modelo.contexto()``).
+"""
+from dataclasses import dataclass, fields
+
+def nombre_completo(usuario, si_no_existe='N/A'):
+    """'Nombres Apellidos' del usuario, o ``si_no_existe`` si la cuenta ya no existe"""
+    if not usuario:
+        return si_no_existe
+    return f"{usuario['nombres']} {usuario['apellidos']}"
+
+class ModeloVista:
+    def contexto(self):
+        """Variables para ``render_template`` (sin copiar los registros)"""
+        return {campo.name: getattr(self, campo.name) for campo in fields(self)}
+
+# ===== DASHBOARD DEL EMPLEADOR =====
+@dataclass
+class FilaTrabajoActivo:
+    id: str
+    titulo: str
+    usuario_id: str
+    horario_trabajo: str
+    pago: object
+    estudiante: str
+
+@dataclass
+class DashboardEmpleador(ModeloVista):
+    empleador: dict
+    trabajos: list                              # publicados por el empleador
+    trabajos_activos: list[FilaTrabajoActivo]   # solo los 'activo'
+    alertas_no_leidas: list                     # las primeras que se muestran
+    total_alertas_no_leidas: int
+    total_trabajos: int
+    total_activos: int
+    total_solicitudes: int
+    trabajos_completados: int
+
+def dashboard_empleador(almacen, empleador, alertas_no_leidas, total_alertas_no_leidas):
+    empleador_id = empleador['id']
+    trabajos = almacen.buscar('trabajos', empleador_id=empleador_id)
+    activos = []
+    for trabajo in almacen.buscar('trabajos_activos', empleador_id=empleador_id, estado='activo'):
+        usuario = almacen.obtener('usuarios', trabajo['usuario_id'])
+        activos.append(FilaTrabajoActivo(
+            id=trabajo['id'],
+            titulo=trabajo.get('titulo'),
+            usuario_id=trabajo['usuario_id'],
+            horario_trabajo=trabajo.get('horario_trabajo'),
+            pago=trabajo.get('pago'),
+            estudiante=nombre_completo(usuario)
+        ))
+    return DashboardEmpleador(
+        empleador=empleador,
+        trabajos=trabajos,
+        trabajos_activos=activos,
+        alertas_no_leidas=alertas_no_leidas,
+        total_alertas_no_leidas=total_alertas_no_leidas,
+        total_trabajos=len(trabajos),
+        total_activos=len(activos),
+        total_solicitudes=almacen.contar('postulaciones', empleador_id=empleador_id),
+        trabajos_completados=almacen.contar('trabajos_activos', empleador_id=empleador_id, estado='finalizado')
+    )
+
+# ===== DETALLE DEL EMPLEADOR (ADMINISTRADOR) =====
+@dataclass
+class FilaPostulacion:
+    trabajo_id: str
+    usuario_nombre: str
+    estado: str
+    fecha: str
+
+@dataclass
+class DetalleEmpleador(ModeloVista):
+    empleador: dict
+    trabajos: list
+    postulaciones_empleador: list[FilaPostulacion]  # las primeras ``limite``
+    total_postulaciones: int
+    postulaciones_aceptadas: int
+
+def detalle_empleador(almacen, empleador, limite=5):
+    empleador_id = empleador['id']
+    filas = []
+    for postulacion in almacen.buscar('postulaciones', empleador_id=empleador_id):
+        usuario = almacen.obtener('usuarios', postulacion['usuario_id'])
+        if not usuario:
+            continue  # Postulación de una cuenta eliminada
+        filas.append(FilaPostulacion(
+            trabajo_id=postulacion['trabajo_id'],
+            usuario_nombre=nombre_completo(usuario),
+            estado=postulacion.get('estado'),
+            fecha=postulacion.get('fecha_postulacion') or ''
+        ))
+        if len(filas) == limite:
+            break
+    return DetalleEmpleador(
+        empleador=empleador,
+        trabajos=almacen.buscar('trabajos', empleador_id=empleador_id),
+        postulaciones_empleador=filas,
+        total_postulaciones=almacen.contar('postulaciones', empleador_id=empleador_id),
+        postulaciones_aceptadas=almacen.contar('postulaciones', empleador_id=empleador_id, estado='aceptado')
+    )